@@ -0,0 +1,130 @@
+"""
+Compares the db backends on a synthetic db shaped like the bot's
+
+Usage (from the bot directory, config.yaml needs to exist):
+    python scripts/bench_db.py [num cmd_stats rows] [num ops]
+"""
+import sys
+import os
+import json
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import tinydb
+from tinydb.table import Document
+
+from core.db_table import DbTinyDB
+from core.db_middleware import DbThreadSafeMiddleware
+from core.db_storage import DbAtomicJsonStorage
+from core.db_sqlite import DbSqlite
+
+
+NUM_CMDS = 50
+
+INDEXES = {
+    'cmd_stats' : [ ('cmd', 'server'), ('cmd',) ],
+    'reminders' : [ ('server_id', 'user_id'), ('due_at',) ],
+}
+
+
+def make_data(num_rows: int) -> dict:
+    num_servers = max(1, num_rows // NUM_CMDS)
+
+    cmd_stats = {}
+    for i in range(num_rows):
+        cmd_stats[str(i + 1)] = { 'cmd' : f'cmd{i % NUM_CMDS}', 'server' : 10**17 + i // NUM_CMDS, 'count' : random.randint(1, 1000) }
+
+    reminders = {}
+    for i in range(num_rows // 10):
+        reminders[str(10**17 + i)] = {
+            'user_id'    : 10**17 + random.randint(0, 100),
+            'channel_id' : 10**17 + random.randint(0, 1000),
+            'server_id'  : 10**17 + random.randint(0, num_servers - 1),
+            'created_at' : time.time(),
+            'due_at'     : time.time() + random.randint(0, 10**6),
+            'text'       : 'Reminder text',
+        }
+
+    return { 'cmd_stats' : cmd_stats, 'reminders' : reminders }
+
+
+def open_json(path: str, write_behind: bool, indexes: dict = None):
+    return DbTinyDB(path, indexes=indexes, storage=DbThreadSafeMiddleware(DbAtomicJsonStorage, write_behind=write_behind, flush_interval=5))
+
+
+def bench(name: str, db, num_rows: int, num_ops: int) -> dict:
+    results = {}
+    num_servers = max(1, num_rows // NUM_CMDS)
+
+    cmd_stats = db.table('cmd_stats')
+    reminders = db.table('reminders')
+
+    def timed(label: str, fn, n: int):
+        start = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        results[label] = (time.perf_counter() - start) / n
+
+    Q = tinydb.Query()
+
+    timed('first read', lambda i: cmd_stats.get(doc_id=1), 1)
+    timed('get (cmd, server)', lambda i: cmd_stats.get(Q.fragment({ 'cmd' : f'cmd{i % NUM_CMDS}', 'server' : 10**17 + i % num_servers })), num_ops)
+    timed('get doc_id', lambda i: cmd_stats.get(doc_id=i % num_rows + 1), num_ops)
+    timed('search cmd total', lambda i: cmd_stats.search(Q.fragment({ 'cmd' : f'cmd{i % NUM_CMDS}' })), max(1, num_ops // 10))
+    timed('search (server_id, user_id)', lambda i: reminders.search(Q.fragment({ 'server_id' : 10**17 + i % num_servers, 'user_id' : 10**17 + i % 100 })), num_ops)
+    timed('update count', lambda i: cmd_stats.update({ 'count' : i }, doc_ids=[ i % num_rows + 1 ]), num_ops)
+    timed('insert reminder', lambda i: reminders.insert(Document({ 'server_id' : 1, 'user_id' : 1, 'due_at' : i }, doc_id=i + 1)), num_ops)
+    timed('remove reminder', lambda i: reminders.remove(doc_ids=[ i + 1 ]), num_ops)
+
+    start = time.perf_counter()
+    db.close()
+    results['close'] = time.perf_counter() - start
+
+    return results
+
+
+def main():
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    num_ops  = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    random.seed(0)
+    data = make_data(num_rows)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, 'db.json')
+        with open(json_path, 'w') as f:
+            json.dump(data, f)
+
+        print(f'{num_rows} cmd_stats rows, {num_rows // 10} reminders, {os.path.getsize(json_path) / 1024**2:.2f} MB json, {num_ops} ops per test\n')
+
+        all_results = {}
+
+        for name, write_behind, indexes in [ ('json', False, None), ('json write-behind', True, None), ('json wb + indexes', True, INDEXES) ]:
+            path = os.path.join(tmp_dir, f'{name.replace(" ", "_")}.json')
+            with open(path, 'w') as f:
+                json.dump(data, f)
+
+            all_results[name] = bench(name, open_json(path, write_behind, indexes), num_rows, num_ops)
+
+        sqlite_path = os.path.join(tmp_dir, 'db.sqlite')
+        db = DbSqlite(sqlite_path, indexes=INDEXES)
+
+        start = time.perf_counter()
+        db.migrate_from_json(json_path)
+        print(f'sqlite migration: {(time.perf_counter() - start)*1000:.2f} ms\n')
+
+        all_results['sqlite'] = bench('sqlite', db, num_rows, num_ops)
+
+    names  = list(all_results.keys())
+    labels = list(all_results[names[0]].keys())
+
+    print(f'{"(ms per op)":<30}' + ''.join([ f'{name:>20}' for name in names ]))
+    for label in labels:
+        print(f'{label:<30}' + ''.join([ f'{all_results[name][label]*1000:>20.3f}' for name in names ]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Times the image kernels against the PIL split/merge path they replaced, and
+against NumPy (if installed), on the frames of a synthetic animated GIF.
+The kernel column is PIL alone; for invert that's the lookup table path.
+
+Usage (from the bot directory):
+    python scripts/bench_image.py [num frames] [width] [height]
+
+Defaults to 100 frames of 1000x800.
+"""
+import sys
+import os
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from PIL import Image, ImageOps
+from io import BytesIO
+
+try: import numpy
+except ImportError:
+    numpy = None
+
+from cmds.image_modules import ops, kernels
+
+
+def make_gif(num_frames: int, width: int, height: int) -> bytes:
+    frames = []
+    for i in range(num_frames):
+        frame = Image.effect_noise((width, height), 64 + i % 64).convert('RGB')
+        frames.append(frame.quantize(64))
+
+    data = BytesIO()
+    frames[0].save(data, format='gif', save_all=True, append_images=frames[1:], duration=10)
+    return data.getvalue()
+
+
+def invert_split(frame: Image.Image) -> Image.Image:
+    # What img.inv did before the kernels
+    if frame.mode == 'RGBA':
+        r,g,b,a = frame.split()
+
+        frame = Image.merge('RGB', (r,g,b))
+        frame = ImageOps.invert(frame)
+        r,g,b = frame.split()
+
+        return Image.merge('RGBA', (r,g,b,a))
+
+    return ImageOps.invert(frame)
+
+
+def channel_split(frame: Image.Image, ch: str) -> Image.Image:
+    # What img.chan did before the kernels
+    bands = frame.split() if frame.mode == 'RGBA' else frame.convert('RGB').split()
+    return bands[ 'rgba'.index(ch) ]
+
+
+def invert_numpy(frame: Image.Image) -> Image.Image:
+    # Getting the pixels into numpy copies them, PIL has no zero-copy export
+    pixels = numpy.asarray(frame)
+
+    if frame.mode == 'RGBA':
+        # Whole pixels at once rather than per band
+        mask = numpy.array([ 255, 255, 255, 0 ], dtype=numpy.uint8).view(numpy.uint32)[0]
+        return Image.frombuffer('RGBA', frame.size, pixels.view(numpy.uint32) ^ mask, 'raw', 'RGBA', 0, 1)
+
+    return Image.fromarray(pixels ^ numpy.array([ 255, 255, 255, 0 ][:len(frame.getbands())], dtype=numpy.uint8))
+
+
+def channel_numpy(frame: Image.Image, ch: str) -> Image.Image:
+    pixels = numpy.asarray(frame)
+    return Image.fromarray(numpy.ascontiguousarray(pixels[..., 'rgba'.index(ch)]))
+
+
+def best_of(fn, n: int = 3) -> float:
+    times = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def main():
+    num_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    width      = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    height     = int(sys.argv[3]) if len(sys.argv) > 3 else 800
+
+    random.seed(0)
+    rgb_frames  = [ frame for frame, _, _ in ops.iter_frames(ops.open_image(make_gif(num_frames, width, height))) ]
+    rgba_frames = [ frame.convert('RGBA') for frame in rgb_frames ]
+    for frame in rgba_frames:
+        frame.putalpha(random.randint(0, 255))
+
+    # ( op, split/merge path, kernel, numpy )
+    cases = [
+        ( 'invert',    invert_split,                    kernels.invert,                     invert_numpy ),
+        ( 'channel r', lambda f: channel_split(f, 'r'), lambda f: kernels.channel(f, 'r'),  lambda f: channel_numpy(f, 'r') ),
+        ( 'channel a', lambda f: channel_split(f, 'a'), lambda f: kernels.channel(f, 'a'),  lambda f: channel_numpy(f, 'a') ),
+    ]
+
+    if isinstance(numpy, type(None)):
+        print('numpy not installed, skipping it')
+
+    print(f'\n{num_frames} frames of {width}x{height}')
+    print(f'{"op":>10} {"mode":>6} {"split (ms)":>12} {"kernel (ms)":>12} {"numpy (ms)":>12} {"kernel speedup":>16}')
+
+    for mode, frames in [ ( 'RGB', rgb_frames ), ( 'RGBA', rgba_frames ) ]:
+        for name, split, kernel, vectorized in cases:
+            if name == 'channel a' and mode != 'RGBA':
+                continue
+
+            # Same pixels either way
+            assert split(frames[0]).tobytes() == kernel(frames[0]).tobytes()
+
+            split_time  = best_of(lambda: [ split(frame) for frame in frames ])
+            kernel_time = best_of(lambda: [ kernel(frame) for frame in frames ])
+
+            numpy_str = 'n/a'
+            if not isinstance(numpy, type(None)):
+                assert vectorized(frames[0]).tobytes() == kernel(frames[0]).tobytes()
+                numpy_str = f'{best_of(lambda: [ vectorized(frame) for frame in frames ])*1000:.2f}'
+
+            print(f'{name:>10} {mode:>6} {split_time*1000:>12.2f} {kernel_time*1000:>12.2f} {numpy_str:>12} {split_time/kernel_time:>15.2f}x')
+
+
+if __name__ == '__main__':
+    main()
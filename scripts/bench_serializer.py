@@ -0,0 +1,86 @@
+"""
+Times loading and dumping synthetic dbs with each available db serializer
+
+Usage (from the bot directory, config.yaml needs to exist):
+    python scripts/bench_serializer.py [num rows ...]
+
+Defaults to 10k, 100k and 1M rows each of cmd_stats and reminders.
+"""
+import sys
+import os
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from core.db_serializer import DbSerializer
+
+
+NUM_CMDS = 50
+
+
+def make_data(num_rows: int) -> dict:
+    num_servers = max(1, num_rows // NUM_CMDS)
+
+    cmd_stats = {}
+    for i in range(num_rows):
+        cmd_stats[str(i + 1)] = { 'cmd' : f'cmd{i % NUM_CMDS}', 'server' : 10**17 + i // NUM_CMDS, 'count' : random.randint(1, 1000) }
+
+    reminders = {}
+    for i in range(num_rows):
+        reminders[str(10**17 + i)] = {
+            'user_id'    : 10**17 + random.randint(0, 100),
+            'channel_id' : 10**17 + random.randint(0, 1000),
+            'server_id'  : 10**17 + random.randint(0, num_servers - 1),
+            'created_at' : time.time(),
+            'due_at'     : time.time() + random.randint(0, 10**6),
+            'text'       : 'Reminder text ✓',
+        }
+
+    return { 'cmd_stats' : cmd_stats, 'reminders' : reminders }
+
+
+def best_of(fn, n: int = 3) -> float:
+    times = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def main():
+    sizes = [ int(arg) for arg in sys.argv[1:] ] if len(sys.argv) > 1 else [ 10**4, 10**5, 10**6 ]
+
+    serializers = []
+    for name in [ 'json', 'orjson', 'msgspec' ]:
+        try: serializers.append(DbSerializer.get(name))
+        except ValueError:
+            print(f'{name} not installed, skipping')
+
+    random.seed(0)
+    reference = DbSerializer.get('json')
+
+    print(f'\n{"rows":>10} {"serializer":>12} {"size (MB)":>12} {"dump (ms)":>12} {"load (ms)":>12} {"load stdlib output (ms)":>24}')
+
+    for num_rows in sizes:
+        data = make_data(num_rows)
+        json_bytes = reference.dumps(data)
+
+        for serializer in serializers:
+            dumped = serializer.dumps(data)
+
+            # Files written by any serializer have to read back the same everywhere
+            assert serializer.loads(json_bytes) == data
+            assert reference.loads(dumped) == data
+
+            dump_time = best_of(lambda: serializer.dumps(data))
+            load_time = best_of(lambda: serializer.loads(dumped))
+            json_time = best_of(lambda: serializer.loads(json_bytes))
+
+            print(f'{num_rows:>10} {serializer.name:>12} {len(dumped) / 1024**2:>12.2f} {dump_time*1000:>12.2f} {load_time*1000:>12.2f} {json_time*1000:>24.2f}')
+
+
+if __name__ == '__main__':
+    main()
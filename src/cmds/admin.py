@@ -2,7 +2,6 @@ import discord
 
 import aiohttp
 import asyncio
-import warnings
 import logging
 import time
 import random
@@ -10,7 +9,7 @@ import inspect
 import psutil
 import datetime
 
-from core import DiscordCmdBase, DiscordBot
+from core import DiscordCmdBase, DiscordBot, Diagnostics
 
 
 class CmdsAdmin:
@@ -45,12 +44,12 @@ class CmdsAdmin:
                 api_port = DiscordBot.get_cfg('Core', 'api_port')
                 async with session.put(f'http://127.0.0.1:{api_port}/internal', timeout=1, json=data) as response:
                     if response.status != 200:
-                        warnings.warn('Could not contact feed relay server')
+                        Diagnostics.warn('Could not contact feed relay server')
                         return
 
                     data = await response.json()
                     if data['status'] != 'ok':
-                        warnings.warn('Feed server shutdown failed')
+                        Diagnostics.warn('Feed server shutdown failed')
                         return
             except asyncio.TimeoutError:
                 await msg.channel.send('Feed server not responding: Timed out')
@@ -146,8 +145,7 @@ class CmdsAdmin:
             await msg.channel.send(None, embed=status)
             return
 
-        table = self.db.table('bot_stats')
-        entry = table.get(doc_id=msg.guild.id)
+        entry = self.db_get_bot_stats(msg.guild.id)
 
         if isinstance(entry, type(None)):
             status = discord.Embed(title='Bot has no stats saved', color=0x008000)
@@ -206,6 +204,141 @@ class CmdsAdmin:
         await msg.channel.send(None, embed=reply)
 
 
+    @staticmethod
+    @DiscordCmdBase.DiscordCmd(
+        perm    = DiscordCmdBase.ADMINISTRATOR,
+        example = f'{DiscordBot.cmd_prefix}db.stats',
+        help    =
+            'Prints database storage stats'
+    )
+    async def db_stats(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
+        if msg.author.id != DiscordBot.get_cfg('Core', 'admin_user_id'):
+            status = discord.Embed(title='You must be the bot admin to use this command', color=0x800000)
+            await msg.channel.send(None, embed=status)
+            return
+
+        stats = self.db_get_storage_stats()
+
+        # Times are in seconds
+        stats_str = ''.join([
+            f'{name + ":":<14} {value*1000:.2f} ms\n' if isinstance(value, float) else f'{name + ":":<14} {value}\n'
+            for name, value in stats.items()
+        ])
+
+        adb_stats = self.adb.stats
+
+        queue_str = (
+            f'{"queued:":<14} {adb_stats["queued"]} (max {adb_stats["queued_max"]})\n'
+            f'{"waiting:":<14} {adb_stats["waiting"]}\n'
+        ) + ''.join([
+            f'{name + ":":<14} {op["count"]} ops, avg {op["time"]/op["count"]*1000:.2f} ms, max {op["max"]*1000:.2f} ms\n'
+            for name, op in adb_stats['ops'].items() if op['count'] > 0
+        ])
+
+        reply = discord.Embed(color=0x1abc9c)
+        reply.add_field(name=f'DB Stats', value=f'```yaml\n{stats_str}```', inline=False)
+        reply.add_field(name=f'DB Queue', value=f'```yaml\n{queue_str}```', inline=False)
+        await msg.channel.send(None, embed=reply)
+
+
+    @staticmethod
+    @DiscordCmdBase.DiscordCmd(
+        perm    = DiscordCmdBase.ADMINISTRATOR,
+        example = f'{DiscordBot.cmd_prefix}cmd.queue',
+        help    =
+            'Prints how many commands are running and waiting to run, how many got rate limited, and command lookup stats'
+    )
+    async def cmd_queue(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
+        if msg.author.id != DiscordBot.get_cfg('Core', 'admin_user_id'):
+            status = discord.Embed(title='You must be the bot admin to use this command', color=0x800000)
+            await msg.channel.send(None, embed=status)
+            return
+
+        stats = self.executor_stats
+
+        stats_str = (
+            f'Running:  {stats["running"]} / {stats["max_running"]}\n'
+            f'Queued:   {stats["queued"]} / {stats["max_queued"]}\n'
+            f'Started:  {stats["started"]}\n'
+            f'Deferred: {stats["deferred"]}\n'
+            f'Rejected: {stats["rejected"]}\n'
+        ) + ''.join([
+            f'{cls + ":":<10}{cls_stats["running"]} / {cls_stats["max_running"]} running, {cls_stats["queued"]} queued\n'
+            for cls, cls_stats in stats['classes'].items()
+        ])
+
+        limit_stats = self.rate_limiter_stats
+
+        limit_str = (
+            f'Allowed:  {limit_stats["allowed"]}\n'
+            f'Rejected: {limit_stats["rejected"]}\n'
+            f'Buckets:  {limit_stats["buckets"]}\n'
+        )
+
+        router_stats = self.router_stats
+        num_lookups  = max(1, router_stats['lookups'])
+        num_loads    = max(1, router_stats['loads'])
+
+        router_str = (
+            f'Lookups:    {router_stats["lookups"]} ({router_stats["lookup_time"]/num_lookups*1e6:.1f} µs avg)\n'
+            f'Built-in:   {router_stats["builtin_hits"]}\n'
+            f'Custom:     {router_stats["guild_hits"]}\n'
+            f'Not found:  {router_stats["misses"]}\n'
+            f'Guilds:     {router_stats["loaded"]} loaded, {router_stats["evictions"]} evicted\n'
+            f'Loads:      {router_stats["loads"]} ({router_stats["load_time"]/num_loads*1000:.2f} ms avg, {router_stats["max_load_time"]*1000:.2f} ms max, {router_stats["load_errors"]} failed)\n'
+        )
+
+        reply = discord.Embed(color=0x1abc9c)
+        reply.add_field(name=f'Command Queue', value=f'```yaml\n{stats_str}```', inline=False)
+        reply.add_field(name=f'Rate Limits', value=f'```yaml\n{limit_str}```', inline=False)
+        reply.add_field(name=f'Command Lookups', value=f'```yaml\n{router_str}```', inline=False)
+        await msg.channel.send(None, embed=reply)
+
+
+    @staticmethod
+    @DiscordCmdBase.DiscordCmd(
+        perm    = DiscordCmdBase.ADMINISTRATOR,
+        example = f'{DiscordBot.cmd_prefix}loop.lag',
+        help    =
+            'Prints how late the event loop has been running things and what blocked it'
+    )
+    async def loop_lag(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
+        if msg.author.id != DiscordBot.get_cfg('Core', 'admin_user_id'):
+            status = discord.Embed(title='You must be the bot admin to use this command', color=0x800000)
+            await msg.channel.send(None, embed=status)
+            return
+
+        stats = self.loop_stats
+
+        lag_str = (
+            f'Samples:  {stats["samples"]} (last {stats["window_s"]//60} min)\n'
+            f'Avg lag:  {stats["lag_avg_ms"]:.2f} ms\n'
+            f'Max lag:  {stats["lag_max_ms"]:.2f} ms\n'
+        )
+
+        histogram_str = ''.join([
+            f'{bucket + ":":<10}{count}\n'
+            for bucket, count in stats['histogram'].items() if count > 0
+        ])
+
+        stalls_str = ''.join([
+            f'{name}: {stall["count"]}x, {stall["total_ms"]:.0f} ms total, {stall["max_ms"]:.0f} ms max\n'
+            for name, stall in list(stats['stalls'].items())[:10]
+        ])
+
+        recent_str = ''.join([
+            f'{stall["lag_ms"]:.0f} ms | {stall["name"]} {stall["where"]}\n'
+            for stall in stats['recent'][-5:]
+        ])
+
+        reply = discord.Embed(color=0x1abc9c)
+        reply.add_field(name=f'Event Loop Lag', value=f'```yaml\n{lag_str}```', inline=False)
+        reply.add_field(name=f'Histogram', value=f'```yaml\n{histogram_str or "None"}```', inline=False)
+        reply.add_field(name=f'Stalls over {stats["threshold_ms"]:g} ms', value=f'```yaml\n{stalls_str or "None"}```', inline=False)
+        reply.add_field(name=f'Recent Stalls', value=f'```\n{recent_str or "None"}```', inline=False)
+        await msg.channel.send(None, embed=reply)
+
+
     @staticmethod
     @DiscordCmdBase.DiscordCmd(
         perm    = DiscordCmdBase.ADMINISTRATOR,
@@ -220,8 +353,8 @@ class CmdsAdmin:
             return
 
         cmd_counts = {}
-        for cmd in self._cmds:
-            if self._cmds[cmd]['perm'] == DiscordCmdBase.ADMINISTRATOR:
+        for cmd, cmd_data in self._router.builtins.items():
+            if cmd_data['perm'] == DiscordCmdBase.ADMINISTRATOR:
                 # Don't give stats for admin commands
                 continue
 
@@ -252,7 +385,7 @@ class CmdsAdmin:
             await msg.channel.send(None, embed=status)
             return
 
-        self.db_set_info_msg(' '.join(args))
+        await self.db_set_info_msg(' '.join(args))
 
         status = discord.Embed(title='✅ Info message set', color=0x66CC66)
         await msg.channel.send(None, embed=status)
@@ -294,8 +427,7 @@ class CmdsAdmin:
 
             logger.debug(f'tick @ {time.time()}')
 
-            table = self.db.table('bot_ch')
-            for entry in table:
+            for entry in await self.adb.all('bot_ch'):
                 guild = self.get_guild(entry.doc_id)
                 if isinstance(guild, type(None)):
                     guild = await self.fetch_guild(entry.doc_id)
@@ -309,7 +441,7 @@ class CmdsAdmin:
                         continue
 
                 while True:
-                    cmd_name, cmd_data = random.choice(list(self._cmds.items()))
+                    cmd_name, cmd_data = random.choice(list(self._router.builtins.items()))
                     if cmd_data['perm'] == DiscordCmdBase.ANYONE:
                         break
 
@@ -1,6 +1,4 @@
-import warnings
-
-from core import DiscordCmdBase, DiscordBot
+from core import DiscordCmdBase, DiscordBot, Diagnostics
 from core import FeedServer
 
 from .api_modules.osu import CmdsOsu
@@ -14,7 +12,7 @@ class CmdsApi:
 
     @DiscordCmdBase.DiscordEvent()
     async def api_server(self: DiscordBot):
-        await FeedServer.init(lambda route, data: CmdsApi.__handle_data(self, route, data))
+        await FeedServer.init(lambda route, data: CmdsApi.__handle_data(self, route, data), self)
 
 
     @staticmethod
@@ -22,8 +20,11 @@ class CmdsApi:
         """
         Forwards to a DiscordBot capable destination based on what the BotApi endpoint is
         """
-        match endpoint:
-            case '/osu/post':   await CmdsOsu.post(bot, data)
-            case '/admin/post': await CmdsAdmin.post(bot, data)
-            case _:
-                warnings.warn(f'Invalid BotApi endpoint: "{endpoint}"')
+        with Diagnostics.capture() as w:
+            match endpoint:
+                case '/osu/post':   await CmdsOsu.post(bot, data)
+                case '/admin/post': await CmdsAdmin.post(bot, data)
+                case _:
+                    Diagnostics.warn(f'Invalid BotApi endpoint: "{endpoint}"')
+
+        await bot.report_warnings(f'BotApi {endpoint}', w)
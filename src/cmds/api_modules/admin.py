@@ -1,7 +1,6 @@
 import discord
-import warnings
 
-from core import DiscordBot
+from core import DiscordBot, Diagnostics
 
 
 class CmdsAdmin:
@@ -16,7 +15,7 @@ class CmdsAdmin:
             'contents',
         ))
         if not required_keys.issubset(data):
-            warnings.warn(
+            Diagnostics.warn(
                 f'Data is incomplete!\n'
                 f'Data: {data.keys()}\n'
                 f'Required: {required_keys}'
@@ -35,15 +34,15 @@ class CmdsAdmin:
                 await bot.get_channel(channel_id).send(chunk)
                 return
             except discord.errors.Forbidden as e:
-                warnings.warn(f'Error posting forum post to admin channel ID {channel_id}: {e}')
+                Diagnostics.warn(f'Error posting forum post to admin channel ID {channel_id}: {e}')
             except discord.errors.HTTPException as e:
-                warnings.warn(f'Error posting forum post: {e} | Contents:\n{contents}')
+                Diagnostics.warn(f'Error posting forum post: {e} | Contents:\n{contents}')
             except Exception as e:
-                warnings.warn(
+                Diagnostics.warn(
                     f'Unable to send message to admin ch id "{channel_id}";\n'
                     f'{data}\n'
                     f'{e}\n'
                 )
                 return
 
-            warnings.warn(f'No admin by id "{channel_id}" found!')
+            Diagnostics.warn(f'No admin by id "{channel_id}" found!')
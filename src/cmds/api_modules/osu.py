@@ -1,7 +1,6 @@
 import discord
-import warnings
 
-from core import DiscordBot
+from core import DiscordBot, Diagnostics
 
 
 class CmdsOsu:
@@ -28,7 +27,7 @@ class CmdsOsu:
                 'contents',
         ))
         if not required_keys.issubset(data):
-            warnings.warn(f'Comment data is incomplete!\nData: {data.keys()}\nRequired: {required_keys}')
+            Diagnostics.warn(f'Comment data is incomplete!\nData: {data.keys()}\nRequired: {required_keys}')
             return
 
         # Embed character limit
@@ -76,15 +75,15 @@ class CmdsOsu:
                         await channel.send(embed=embed)
                         return
         except discord.errors.Forbidden as e:
-            warnings.warn(f'Error posting forum post to channel {channel.name}: {e}')
+            Diagnostics.warn(f'Error posting forum post to channel {channel.name}: {e}')
         except discord.errors.HTTPException as e:
-            warnings.warn(f'Error posting forum post: {e} | Contents:\n{contents}')
+            Diagnostics.warn(f'Error posting forum post: {e} | Contents:\n{contents}')
         except Exception as e:
-            warnings.warn(
+            Diagnostics.warn(
                 f'Unable to send message to #"{ot_feed_channel}";\n'
                 f'{data}\n'
                 f'{e}\n'
             )
             return
 
-        warnings.warn(f'No #"{ot_feed_channel}" channel found!')
+        Diagnostics.warn(f'No #"{ot_feed_channel}" channel found!')
@@ -1,9 +1,8 @@
 import discord
 import aiohttp
 import asyncio
-import warnings
 
-from core import DiscordCmdBase, DiscordBot
+from core import DiscordCmdBase, DiscordBot, Diagnostics
 
 
 class CmdsBots:
@@ -54,12 +53,12 @@ class CmdsBots:
 
         # Parse reply from OT Feed Server
         if isinstance(reply, type(None)):
-            warnings.warn('Received invalid reply from OT Feed Server: None')
+            Diagnostics.warn('Received invalid reply from OT Feed Server: None')
             await msg.channel.send('Received invalid reply from OT Feed Server')
             return
 
         if not 'status' in reply:
-            warnings.warn(f'Received invalid reply from OT Feed Server: {reply}')
+            Diagnostics.warn(f'Received invalid reply from OT Feed Server: {reply}')
             await msg.channel.send('Received invalid reply from OT Feed Server')
             return
 
@@ -26,6 +26,7 @@ class CmdsFun:
     @staticmethod
     @DiscordCmdBase.DiscordCmd(
         perm    = DiscordCmdBase.ANYONE,
+        cost    = 2,
         example = f'{DiscordBot.cmd_prefix}xkcd 2',
         help    =
             'Outputs the specified xkcd or a random xkcd if number not specified.'
@@ -1,15 +1,20 @@
-from typing import Optional
+from typing import Callable, Optional
 
+import os
+import math
 import discord
-import requests
-import warnings
 import validators
 
-import PIL
-from PIL import Image, ImageOps, ImageSequence
+from PIL import Image
 from io import BytesIO
 
-from core import DiscordCmdBase, DiscordBot
+from core import DiscordCmdBase, DiscordBot, Diagnostics
+
+from .image_modules import ops
+from .image_modules.ops import ImageOpError
+from .image_modules.fetch import ImageFetcher, ImageFetchError
+from .image_modules.cache import ImageCache
+from .image_modules.pool import ImagePool
 
 
 
@@ -18,14 +23,27 @@ class CmdsImage:
     __RET_FAIL = 0
     __RET_PASS = 1
 
+    # How many messages back to look for an image when none is given
+    __IMG_LOOKBACK = 10
+
+    # Max edits in one `img.pipe`
+    __MAX_PIPE_STEPS = 8
+
+    # Made on first use, see `__get_pool` and `__get_fetcher`
+    __pool    = None
+    __fetcher = None
+    __cache   = None
+
     @staticmethod
     @DiscordCmdBase.DiscordCmd(
-        perm    = DiscordCmdBase.ANYONE,
-        example =
+        perm        = DiscordCmdBase.ANYONE,
+        concurrency = 'image',
+        cost        = 4,
+        example     =
             '\n'
             f'{DiscordBot.cmd_prefix}img.zoom 2.3\n'
             f'{DiscordBot.cmd_prefix}img.zoom https://imgur.com/43ssfs 2.3',
-        help    =
+        help        =
             'Changes image zoom. Max zoom allowed: 4.0x'
     )
     async def img_zoom(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
@@ -34,40 +52,30 @@ class CmdsImage:
             return
 
         # Process and extract args
-        ret, frames, args = await CmdsImage.__parse_cmd(self, msg, len(args) == 1, args)
+        ret, data, args = await CmdsImage.__parse_cmd(self, msg, len(args) == 1, args)
         if ret == CmdsImage.__RET_FAIL:
             return
 
         zoom = float(args[0])
 
-        # Perform edit
-        for i in range(len(frames)):
-            new_w = int(frames[i].width*zoom)
-            new_h = int(frames[i].height*zoom)
-
-            if (new_h > 4000) or (new_w > 4000):
-                if (new_h > 1000000) or (new_w > 100000):
-                    if i == 0:
-                        warnings.warn(f'Image dimensions waaay too large ({new_w}x{new_h}), zoom: {zoom}. Old dimensions: {frames[i].width}x{frames[i].height}')
-
-                embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
-                embed.add_field(name='Image resize', value=f'New image will be too large')
-                await msg.channel.send(None, embed=embed)
-                return
-
-            frames[i] = frames[i].resize((new_w, new_h))
+        # Check the new size before doing any work
+        width, height = Image.open(BytesIO(data)).size
+        if isinstance(await CmdsImage.__check_zoom(msg, width, height, zoom), type(None)):
+            return
 
-        await CmdsImage.__send_img(self, msg, frames)
+        await CmdsImage.__run_op(self, msg, 'Image resize', ops.zoom, data, zoom)
 
 
     @staticmethod
     @DiscordCmdBase.DiscordCmd(
-        perm    = DiscordCmdBase.ANYONE,
-        example =
+        perm        = DiscordCmdBase.ANYONE,
+        concurrency = 'image',
+        cost        = 4,
+        example     =
             '\n'
             f'{DiscordBot.cmd_prefix}img.inv\n'
             f'{DiscordBot.cmd_prefix}img.inv https://imgur.com/43ssfs',
-        help    =
+        help        =
             'Inverts image colors'
     )
     async def img_inv(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
@@ -76,138 +84,264 @@ class CmdsImage:
             return
 
         # Process and extract args
-        ret, frames, args = await CmdsImage.__parse_cmd(self, msg, len(args) == 0, args)
+        ret, data, args = await CmdsImage.__parse_cmd(self, msg, len(args) == 0, args)
         if ret == CmdsImage.__RET_FAIL:
             return
 
-        for i in range(len(frames)):
-            if frames[i].mode == 'RGBA':
-                r,g,b,a = frames[i].split()
-
-                frames[i] = Image.merge('RGB', (r,g,b))
-                frames[i] = ImageOps.invert(frames[i])
-                r,g,b = frames[i].split()
-
-                frames[i] = Image.merge('RGBA', (r,g,b,a))
-            else:
-                frames[i] = ImageOps.invert(frames[i])
-
-        await CmdsImage.__send_img(self, msg, frames)
+        await CmdsImage.__run_op(self, msg, 'Image invert', ops.invert, data)
 
 
     @staticmethod
     @DiscordCmdBase.DiscordCmd(
-        perm    = DiscordCmdBase.ANYONE,
-        example =
+        perm        = DiscordCmdBase.ANYONE,
+        concurrency = 'image',
+        cost        = 4,
+        example     =
             '\n'
             f'{DiscordBot.cmd_prefix}img.chan r\n'
             f'{DiscordBot.cmd_prefix}img.chan https://imgur.com/43ssfs r',
-        help    =
+        help        =
             'Extracts the red (r), green (g), blue (b), or alpha (a) channel from the image'
     )
     async def img_chan(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
         if len(args) not in [ 1, 2 ]:
-            await self.run_help_cmd(msg, 'img.r')
+            await self.run_help_cmd(msg, 'img.chan')
             return
 
         # Process and extract args
-        ret, frames, args = await CmdsImage.__parse_cmd(self, msg, len(args) == 0, args)
+        ret, data, args = await CmdsImage.__parse_cmd(self, msg, len(args) == 1, args)
         if ret == CmdsImage.__RET_FAIL:
             return
 
-        ch = args[0]
-
-        for i in range(len(frames)):
-            if frames[i].mode == 'RGBA':
-                r,g,b,a = frames[i].split()
-
-                if   ch == 'r': frames[i] = r
-                elif ch == 'g': frames[i] = g
-                elif ch == 'b': frames[i] = b
-                elif ch == 'a': frames[i] = a
-                else:
-                    embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
-                    embed.add_field(name='Channel extract', value=f'Invalid channel provided')
-                    await msg.channel.send(None, embed=embed)
-                    return
-            else:
-                r,g,b = frames[i].split()
-
-                if   ch == 'r': frames[i] = r
-                elif ch == 'g': frames[i] = g
-                elif ch == 'b': frames[i] = b
-                elif ch == 'a':
-                    embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
-                    embed.add_field(name='Channel extract', value=f'Provided image does not have an alpha channel')
-                    await msg.channel.send(None, embed=embed)
-                    return
-                else:
-                    embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
-                    embed.add_field(name='Channel extract', value=f'Invalid channel provided')
-                    await msg.channel.send(None, embed=embed)
-                    return
-
-        await CmdsImage.__send_img(self, msg, frames)
+        await CmdsImage.__run_op(self, msg, 'Channel extract', ops.channel, data, args[0])
 
 
     @staticmethod
     @DiscordCmdBase.DiscordCmd(
-        perm    = DiscordCmdBase.ANYONE,
-        example =
+        perm        = DiscordCmdBase.ANYONE,
+        concurrency = 'image',
+        cost        = 4,
+        example     =
             '\n'
             f'{DiscordBot.cmd_prefix}img.r\n'
             f'{DiscordBot.cmd_prefix}img.r https://imgur.com/43ssfs',
-        help    =
+        help        =
             'Extracts the red channel out of the image'
     )
     async def img_r(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
-        await CmdsImage.img_chan['func'](self, msg, *(args[0], 'r'))
+        await CmdsImage.img_chan['func'](self, msg, *args, 'r')
 
 
     @staticmethod
     @DiscordCmdBase.DiscordCmd(
-        perm    = DiscordCmdBase.ANYONE,
-        example =
+        perm        = DiscordCmdBase.ANYONE,
+        concurrency = 'image',
+        cost        = 4,
+        example     =
             '\n'
             f'{DiscordBot.cmd_prefix}img.g\n'
             f'{DiscordBot.cmd_prefix}img.g https://imgur.com/43ssfs',
-        help    =
+        help        =
             'Extracts the green channel out of the image'
     )
     async def img_g(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
-        await CmdsImage.img_chan['func'](self, msg, *(args[0], 'g'))
+        await CmdsImage.img_chan['func'](self, msg, *args, 'g')
 
 
     @staticmethod
     @DiscordCmdBase.DiscordCmd(
-        perm    = DiscordCmdBase.ANYONE,
-        example =
+        perm        = DiscordCmdBase.ANYONE,
+        concurrency = 'image',
+        cost        = 4,
+        example     =
             '\n'
             f'{DiscordBot.cmd_prefix}img.b\n'
             f'{DiscordBot.cmd_prefix}img.b https://imgur.com/43ssfs',
-        help    =
+        help        =
             'Extracts the blue channel out of the image'
     )
     async def img_b(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
-        await CmdsImage.img_chan['func'](self, msg, *(args[0], 'b'))
+        await CmdsImage.img_chan['func'](self, msg, *args, 'b')
 
 
     @staticmethod
     @DiscordCmdBase.DiscordCmd(
-        perm    = DiscordCmdBase.ANYONE,
-        example =
+        perm        = DiscordCmdBase.ANYONE,
+        concurrency = 'image',
+        cost        = 4,
+        example     =
             '\n'
             f'{DiscordBot.cmd_prefix}img.a\n'
             f'{DiscordBot.cmd_prefix}img.a https://imgur.com/43ssfs',
-        help    =
+        help        =
             'Extracts the alpha channel out of the image'
     )
     async def img_a(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
-        await CmdsImage.img_chan['func'](self, msg, *(args[0], 'a'))
+        await CmdsImage.img_chan['func'](self, msg, *args, 'a')
+
+
+    @staticmethod
+    @DiscordCmdBase.DiscordCmd(
+        perm        = DiscordCmdBase.ANYONE,
+        concurrency = 'image',
+        cost        = 4,
+        example     =
+            '\n'
+            f'{DiscordBot.cmd_prefix}img.pipe zoom 2 | inv | chan r\n'
+            f'{DiscordBot.cmd_prefix}img.pipe https://imgur.com/43ssfs inv | zoom 0.5',
+        help        =
+            'Runs image edits one after another, in one go. Edits: zoom <x>, inv, chan <r/g/b/a>, r, g, b, a'
+    )
+    async def img_pipe(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
+        if len(args) == 0:
+            await self.run_help_cmd(msg, 'img.pipe')
+            return
+
+        # Image from prev message unless the first arg is a link
+        prev_msg = not validators.url(args[0])
+
+        steps = await CmdsImage.__parse_pipe(msg, ' '.join(args if prev_msg else args[1:]))
+        if isinstance(steps, type(None)):
+            return
+
+        # Process and extract args
+        ret, data, args = await CmdsImage.__parse_cmd(self, msg, prev_msg, args)
+        if ret == CmdsImage.__RET_FAIL:
+            return
+
+        # Check the size after each step before doing any work
+        size = Image.open(BytesIO(data)).size
+        for name, *step_args in steps:
+            if name != 'zoom':
+                continue
+
+            size = await CmdsImage.__check_zoom(msg, *size, step_args[0])
+            if isinstance(size, type(None)):
+                return
+
+        await CmdsImage.__run_op(self, msg, 'Image pipe', ops.pipe, data, steps)
+
+
+    @staticmethod
+    @DiscordCmdBase.DiscordCmd(
+        perm    = DiscordCmdBase.ADMINISTRATOR,
+        example = f'{DiscordBot.cmd_prefix}img.cache',
+        help    =
+            'Prints how often image commands got their image from the download cache'
+    )
+    async def img_cache(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
+        if msg.author.id != DiscordBot.get_cfg('Core', 'admin_user_id'):
+            status = discord.Embed(title='You must be the bot admin to use this command', color=0x800000)
+            await msg.channel.send(None, embed=status)
+            return
+
+        CmdsImage.__get_fetcher()
+        if isinstance(CmdsImage.__cache, type(None)):
+            status = discord.Embed(title='Image cache is disabled', color=0x800000)
+            await msg.channel.send(None, embed=status)
+            return
+
+        stats = CmdsImage.__cache.stats
+        num_lookups = max(1, stats['hits'] + stats['revalidated'] + stats['misses'])
+
+        stats_str = (
+            f'Hits:        {stats["hits"]} ({stats["hits"]/num_lookups*100:.1f}%)\n'
+            f'Revalidated: {stats["revalidated"]}\n'
+            f'Misses:      {stats["misses"]}\n'
+            f'Evictions:   {stats["evictions"]}\n'
+            f'Stored:      {stats["images"]} images, {stats["urls"]} urls\n'
+            f'Size:        {stats["bytes"]/(1024*1024):.1f} / {stats["max_bytes"]/(1024*1024):.0f} MB\n'
+        )
+
+        reply = discord.Embed(color=0x1abc9c)
+        reply.add_field(name=f'Image Cache', value=f'```yaml\n{stats_str}```', inline=False)
+        await msg.channel.send(None, embed=reply)
+
+
+    @DiscordCmdBase.DiscordShutdown()
+    async def image_shutdown(self: DiscordBot):
+        if not isinstance(CmdsImage.__pool, type(None)):
+            CmdsImage.__pool.close()
+
+        if not isinstance(CmdsImage.__fetcher, type(None)):
+            await CmdsImage.__fetcher.close()
+
+
+    @staticmethod
+    async def __parse_pipe(msg: discord.Message, text: str) -> "Optional[list[tuple]]":
+        """
+        Turns 'zoom 2 | inv | chan r' into `ops.pipe` steps
+        """
+        steps = []
+        error = None
+
+        for step in text.split('|'):
+            name, *args = step.split() or [ '' ]
+
+            match ( name.lower(), args ):
+                case ( 'zoom', [ zoom ] ):
+                    try: value = float(zoom)
+                    except ValueError:
+                        value = math.nan
+
+                    if math.isfinite(value) and value > 0:
+                        steps.append(( 'zoom', value ))
+                    else:
+                        error = f'Invalid zoom: {zoom}'
+                case ( 'inv', [] ):
+                    steps.append(( 'invert', ))
+                case ( 'chan', [ ch ] ) if ch in [ 'r', 'g', 'b', 'a' ]:
+                    steps.append(( 'channel', ch ))
+                case ( 'r' | 'g' | 'b' | 'a', [] ):
+                    steps.append(( 'channel', name.lower() ))
+                case ( '', _ ):
+                    error = 'Missing edit between "|"'
+                case _:
+                    error = f'Invalid edit: {step.strip()}'
+
+            if not isinstance(error, type(None)):
+                break
+
+        if isinstance(error, type(None)) and len(steps) > CmdsImage.__MAX_PIPE_STEPS:
+            error = f'Too many edits (max {CmdsImage.__MAX_PIPE_STEPS})'
+
+        if not isinstance(error, type(None)):
+            embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
+            embed.add_field(name='Image pipe', value=error)
+            await msg.channel.send(None, embed=embed)
+            return None
+
+        return steps
 
 
     @staticmethod
-    async def __parse_cmd(self: DiscordBot, msg: discord.Message, prev_msg: bool, args: str) -> "tuple[int, Optional[list[Image.Image]], tuple[str]]":
+    async def __check_zoom(msg: discord.Message, width: int, height: int, zoom: float) -> "Optional[tuple[int, int]]":
+        """
+        Returns the size after the zoom, or None if it's not allowed
+        """
+        new_w = int(width*zoom)
+        new_h = int(height*zoom)
+
+        if (new_h > 4000) or (new_w > 4000):
+            if (new_h > 1000000) or (new_w > 100000):
+                Diagnostics.warn(f'Image dimensions waaay too large ({new_w}x{new_h}), zoom: {zoom}. Old dimensions: {width}x{height}')
+
+            embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
+            embed.add_field(name='Image resize', value=f'New image will be too large')
+            await msg.channel.send(None, embed=embed)
+            return None
+
+        if (new_h < 1) or (new_w < 1):
+            embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
+            embed.add_field(name='Image resize', value=f'New image will be too small')
+            await msg.channel.send(None, embed=embed)
+            return None
+
+        return ( new_w, new_h )
+
+
+    @staticmethod
+    async def __parse_cmd(self: DiscordBot, msg: discord.Message, prev_msg: bool, args: str) -> "tuple[int, Optional[bytes], tuple[str]]":
         img_url = None
         arg_start = 0
 
@@ -234,74 +368,93 @@ class CmdsImage:
 
     @staticmethod
     async def __extract_from_prev_msg(self: DiscordBot, msg: discord.Message) -> str:
-        data = self.get_prev_msg(msg.channel.id)
-        if isinstance(data, type(None)):
+        data = self.find_recent_images(msg.channel.id, CmdsImage.__IMG_LOOKBACK)
+        if len(data) == 0:
             embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
             embed.add_field(name='Image fetch', value=f'Image not provided')
             await msg.channel.send(None, embed=embed)
             return None
 
-        data = data.attachments
         if len(data) != 1:
             embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
             embed.add_field(name='Image fetch', value=f'Unable to resolve which image from prev message')
             await msg.channel.send(None, embed=embed)
             return None
 
-        data = data[0]
-        if 'image/' not in data.content_type:
-            embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
-            embed.add_field(name='Image fetch', value=f'Unable to resolve image from prev message')
-            await msg.channel.send(None, embed=embed)
-            return None
-
-        return data.proxy_url
+        return data[0].proxy_url
 
 
     @staticmethod
-    async def __extract_from_url(self: DiscordBot, msg: discord.Message, url: str) -> Image:
+    async def __extract_from_url(self: DiscordBot, msg: discord.Message, url: str) -> Optional[bytes]:
         if not validators.url(url):
             embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
             embed.add_field(name='Image fetch', value=f'Invalid image url')
             await msg.channel.send(None, embed=embed)
             return None
 
-        reply = requests.get(url)
-        if reply.status_code != 200:
+        try: return await CmdsImage.__get_fetcher().fetch(url)
+        except ImageFetchError as e:
             embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
-            embed.add_field(name='Image fetch', value=f'Unable to fetch image')
+            embed.add_field(name='Image fetch', value=f'{e}')
             await msg.channel.send(None, embed=embed)
             return None
 
-        try: img = Image.open(BytesIO(reply.content))
-        except PIL.UnidentifiedImageError:
+
+    @staticmethod
+    async def __run_op(self: DiscordBot, msg: discord.Message, title: str, fn: Callable, *args):
+        """
+        Runs an `ops` function in the image pool and sends the result
+        """
+        try: data, ext = await CmdsImage.__get_pool().run(fn, *args)
+        except ImageOpError as e:
             embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
-            embed.add_field(name='Image fetch', value=f'Not an image')
+            embed.add_field(name=title, value=f'{e}')
             await msg.channel.send(None, embed=embed)
-            return None
+            return
+
+        await CmdsImage.__send_img(self, msg, data, ext)
 
-        if img.mode == 'P':
-            frames = [ frame.copy() for frame in ImageSequence.Iterator(img) ]
-        else:
-            frames = [ img ]
 
-        for i in range(len(frames)):
-            if frames[i].mode == 'P':
-                frames[i] = frames[i].convert('RGB')
+    @staticmethod
+    def __get_pool() -> ImagePool:
+        if isinstance(CmdsImage.__pool, type(None)):
+            max_memory = DiscordBot.get_cfg('Image', 'max_memory_mb', 1024)
+
+            CmdsImage.__pool = ImagePool(
+                workers    = DiscordBot.get_cfg('Image', 'workers', 2),
+                timeout    = DiscordBot.get_cfg('Image', 'job_timeout', 30),
+                max_memory = max_memory*1024*1024 if not isinstance(max_memory, type(None)) else None,
+            )
+
+        return CmdsImage.__pool
 
-        return frames
+
+    @staticmethod
+    def __get_fetcher() -> ImageFetcher:
+        if isinstance(CmdsImage.__fetcher, type(None)):
+            cache_mb = DiscordBot.get_cfg('Image', 'cache_mb', 256)
+            if cache_mb > 0:
+                CmdsImage.__cache = ImageCache(
+                    path      = os.path.join('cache', 'images'),
+                    max_bytes = cache_mb*1024*1024,
+                    max_age   = DiscordBot.get_cfg('Image', 'cache_max_age', 3600),
+                )
+
+            CmdsImage.__fetcher = ImageFetcher(
+                max_bytes       = DiscordBot.get_cfg('Image', 'max_fetch_mb', 8)*1024*1024,
+                max_pixels      = DiscordBot.get_cfg('Image', 'max_pixels', 25_000_000),
+                connect_timeout = DiscordBot.get_cfg('Image', 'connect_timeout', 5),
+                read_timeout    = DiscordBot.get_cfg('Image', 'read_timeout', 10),
+                total_timeout   = DiscordBot.get_cfg('Image', 'total_timeout', 30),
+                cache           = CmdsImage.__cache,
+            )
+
+        return CmdsImage.__fetcher
 
 
     @staticmethod
-    async def __send_img(self: DiscordBot, msg: discord.Message, frames: "list[Image.Image]"):
-        img_out = BytesIO()
-        if len(frames) == 1:
-            ext = 'png'
-            frames[0].save(img_out, format=ext)
-        else:
-            ext = 'gif'
-            frames[0].save(img_out, format=ext, save_all=True, append_images=frames[1:], duration=10)
-        img_out.seek(0)
+    async def __send_img(self: DiscordBot, msg: discord.Message, data: bytes, ext: str):
+        img_out = BytesIO(data)
 
         # Send
         await msg.channel.send(file=discord.File(img_out, f'image.{ext}'))
@@ -0,0 +1,289 @@
+from typing import Optional
+
+import os
+import json
+import time
+import asyncio
+import logging
+import hashlib
+import collections
+import urllib.parse
+
+
+class ImageCache():
+    """
+    On-disk cache of downloaded images
+
+    Image data is stored by its sha256, so the same image posted under
+    different urls is stored once. Urls map to the data they were last
+    served with, along with the ETag and Last-Modified they came with.
+
+    An entry younger than `max_age` seconds is used without going to the
+    network. Older ones are revalidated with a conditional request, and a
+    304 reply makes them fresh again. Once the stored data goes over
+    `max_bytes`, the least recently used images are deleted.
+
+    Usage:
+        data, headers = await cache.get(url)
+        if isinstance(data, type(None)):
+            # Not fresh; fetch with `headers` (conditional if there's an old copy)
+            ...
+            if status == 304: data = await cache.revalidated(url)
+            else:             await cache.put(url, data, etag, last_modified)
+    """
+
+    # Discord's cdn and media proxy serve the same attachments
+    __HOST_ALIASES = {
+        'media.discordapp.net' : 'cdn.discordapp.com',
+    }
+
+    # Query params that only sign Discord's attachment urls; they change without the image changing.
+    # Other hosts are left alone, the same names could mean something else there.
+    __SIGNATURE_PARAMS = { 'ex', 'is', 'hm' }
+    __SIGNED_HOSTS     = { 'cdn.discordapp.com' }
+
+    def __init__(self, path: str = 'cache/images', max_bytes: int = 256*1024*1024, max_age: float = 3600):
+        """
+        Params
+        ======
+        path: str
+            Directory the images and index are stored in
+
+        max_bytes: int
+            Max bytes of image data stored
+
+        max_age: float
+            Seconds an entry is used for before it's revalidated
+        """
+        self.__logger = logging.getLogger(__class__.__name__)
+
+        self.__path      = path
+        self.__max_bytes = max_bytes
+        self.__max_age   = max_age
+
+        # Normalized url -> [ digest, etag, last modified, time stored or revalidated ]
+        self.__urls = {}
+
+        # Digest -> size, least recently used first
+        self.__blobs = collections.OrderedDict()
+        self.__size  = 0
+
+        self.__write_lock = asyncio.Lock()
+
+        # Loaded on first use, off the event loop; there could be lots of images to go through
+        self.__load_lock = asyncio.Lock()
+        self.__loaded    = False
+
+        self.__stats = {
+            'hits'        : 0,
+            'revalidated' : 0,
+            'misses'      : 0,
+            'evictions'   : 0,
+        }
+
+
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        parts = urllib.parse.urlsplit(url.strip())
+
+        host  = parts.netloc.lower()
+        host  = ImageCache.__HOST_ALIASES.get(host, host)
+        query = sorted([
+            ( key, value ) for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+            if host not in ImageCache.__SIGNED_HOSTS or key not in ImageCache.__SIGNATURE_PARAMS
+        ])
+
+        return urllib.parse.urlunsplit(( parts.scheme.lower(), host, parts.path, urllib.parse.urlencode(query), '' ))
+
+
+    async def get(self, url: str) -> "tuple[Optional[bytes], dict]":
+        """
+        Returns the cached data if it's fresh, otherwise None and the headers
+        that make the request conditional on the cached copy having changed
+        """
+        await self.__ensure_loaded()
+
+        entry = self.__urls.get(ImageCache.normalize_url(url), None)
+        if isinstance(entry, type(None)):
+            return None, {}
+
+        digest, etag, last_modified, stored = entry
+        if time.time() - stored < self.__max_age:
+            data = await self.__read(digest)
+            if not isinstance(data, type(None)):
+                self.__stats['hits'] += 1
+                return data, {}
+
+        headers = {}
+        if not isinstance(etag, type(None)):
+            headers['If-None-Match'] = etag
+        if not isinstance(last_modified, type(None)):
+            headers['If-Modified-Since'] = last_modified
+
+        return None, headers
+
+
+    async def revalidated(self, url: str) -> Optional[bytes]:
+        """
+        Marks the cached copy as fresh after a 304 and returns it
+        """
+        await self.__ensure_loaded()
+
+        entry = self.__urls.get(ImageCache.normalize_url(url), None)
+        if isinstance(entry, type(None)):
+            return None
+
+        data = await self.__read(entry[0])
+        if isinstance(data, type(None)):
+            return None
+
+        entry[3] = time.time()
+        self.__stats['revalidated'] += 1
+        return data
+
+
+    async def put(self, url: str, data: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        await self.__ensure_loaded()
+        self.__stats['misses'] += 1
+
+        if len(data) > self.__max_bytes:
+            return
+
+        digest = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+
+        # One writer at a time, they share the temp files
+        async with self.__write_lock:
+            if digest not in self.__blobs:
+                try: await asyncio.to_thread(self.__write_blob, digest, data)
+                except OSError as e:
+                    self.__logger.warning(f'Unable to cache image | {type(e)}: {e}')
+                    return
+
+                self.__blobs[digest] = len(data)
+                self.__size += len(data)
+
+            self.__blobs.move_to_end(digest)
+            self.__urls[ImageCache.normalize_url(url)] = [ digest, etag, last_modified, time.time() ]
+
+            self.__evict()
+            await asyncio.to_thread(self.__save_index, dict(self.__urls))
+
+
+    @property
+    def stats(self) -> dict:
+        return {
+            **self.__stats,
+            'urls'      : len(self.__urls),
+            'images'    : len(self.__blobs),
+            'bytes'     : self.__size,
+            'max_bytes' : self.__max_bytes,
+        }
+
+
+    async def __ensure_loaded(self):
+        if self.__loaded:
+            return
+
+        async with self.__load_lock:
+            if self.__loaded:
+                return
+
+            await asyncio.to_thread(self.__load)
+            self.__loaded = True
+
+
+    async def __read(self, digest: str) -> Optional[bytes]:
+        if digest not in self.__blobs:
+            return None
+
+        try: data = await asyncio.to_thread(self.__read_blob, digest)
+        except OSError:
+            # Deleted from under us
+            self.__remove_blob(digest)
+            return None
+
+        # Could've been evicted while reading
+        if digest in self.__blobs:
+            self.__blobs.move_to_end(digest)
+
+        return data
+
+
+    def __evict(self):
+        while self.__size > self.__max_bytes and len(self.__blobs) > 0:
+            digest = next(iter(self.__blobs))
+            self.__remove_blob(digest)
+            self.__stats['evictions'] += 1
+
+            try: os.remove(self.__blob_path(digest))
+            except OSError:
+                pass
+
+
+    def __remove_blob(self, digest: str):
+        self.__size -= self.__blobs.pop(digest, 0)
+
+        for url in [ url for url, entry in self.__urls.items() if entry[0] == digest ]:
+            del self.__urls[url]
+
+
+    def __blob_path(self, digest: str) -> str:
+        return os.path.join(self.__path, digest[:2], digest)
+
+
+    def __read_blob(self, digest: str) -> bytes:
+        with open(self.__blob_path(digest), 'rb') as f:
+            return f.read()
+
+
+    def __write_blob(self, digest: str, data: bytes):
+        path = self.__blob_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(f'{path}.tmp', 'wb') as f:
+            f.write(data)
+
+        os.replace(f'{path}.tmp', path)
+
+
+    def __save_index(self, urls: dict):
+        path = os.path.join(self.__path, 'index.json')
+
+        try:
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(urls, f)
+
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            self.__logger.warning(f'Unable to save image cache index | {type(e)}: {e}')
+
+
+    def __load(self):
+        os.makedirs(self.__path, exist_ok=True)
+
+        # Images on disk, oldest written first as a guess at least recently used
+        blobs = []
+        for entry in os.scandir(self.__path):
+            if not entry.is_dir() or len(entry.name) != 2:
+                continue
+
+            for blob in os.scandir(entry.path):
+                if blob.name.endswith('.tmp'):
+                    continue
+
+                stat = blob.stat()
+                blobs.append(( stat.st_mtime, blob.name, stat.st_size ))
+
+        for _, digest, size in sorted(blobs):
+            self.__blobs[digest] = size
+            self.__size += size
+
+        try:
+            with open(os.path.join(self.__path, 'index.json')) as f:
+                urls = json.load(f)
+        except (OSError, ValueError):
+            urls = {}
+
+        self.__urls = { url : entry for url, entry in urls.items() if entry[0] in self.__blobs }
+        self.__evict()
@@ -0,0 +1,184 @@
+from typing import Optional
+
+import asyncio
+import logging
+import aiohttp
+
+from PIL import Image
+from io import BytesIO
+
+from .cache import ImageCache
+
+
+class ImageFetchError(Exception):
+    """
+    Fetch failed in a way the user should be told about
+    """
+    pass
+
+
+class ImageFetcher():
+    """
+    Downloads images for image commands
+
+    Downloads are streamed on one shared session and given up on as soon as
+    it's clear the image is over budget: by its Content-Length, by the bytes
+    read so far, or by the dimensions in its header. The header is parsed
+    once the first chunk is in, and again at doubling sizes only if it wasn't
+    all there yet.
+
+    With a `cache`, images fetched before are served from it, or revalidated
+    if they're no longer fresh.
+    """
+
+    __CHUNK_SIZE = 64*1024
+
+    # How far into the data to keep looking for the header
+    __MAX_HEADER_BYTES = 1024*1024
+
+    def __init__(self, max_bytes: int = 8*1024*1024, max_pixels: int = 25_000_000, connect_timeout: float = 5, read_timeout: float = 10, total_timeout: float = 30, cache: Optional[ImageCache] = None):
+        """
+        Params
+        ======
+        max_bytes: int
+            Max size of the image file
+
+        max_pixels: int
+            Max width*height of the image
+
+        connect_timeout: float
+            Seconds to wait for the connection
+
+        read_timeout: float
+            Max seconds to wait on any one read
+
+        total_timeout: float
+            Max seconds for the whole download, so a host trickling in data
+            can't hold on to a command
+
+        cache: ImageCache
+            Where downloaded images are kept, None to not keep them
+        """
+        self.__logger = logging.getLogger(__class__.__name__)
+
+        self.__max_bytes  = max_bytes
+        self.__max_pixels = max_pixels
+
+        self.__timeout = aiohttp.ClientTimeout(total=total_timeout, sock_connect=connect_timeout, sock_read=read_timeout)
+        self.__cache   = cache
+
+        # Made on first use, it needs the running event loop
+        self.__session = None
+
+
+    async def fetch(self, url: str) -> bytes:
+        """
+        Returns the image data, raises `ImageFetchError` if it can't or shouldn't
+        be had
+        """
+        headers = {}
+        if not isinstance(self.__cache, type(None)):
+            data, headers = await self.__cache.get(url)
+            if not isinstance(data, type(None)):
+                return data
+
+        if isinstance(self.__session, type(None)) or self.__session.closed:
+            self.__session = aiohttp.ClientSession(timeout=self.__timeout)
+
+        try:
+            data = await self.__download(url, headers)
+
+            # Not modified, but the cached copy is gone since; once more for the whole image
+            if isinstance(data, type(None)):
+                data = await self.__download(url, {})
+
+            return data
+        except asyncio.TimeoutError:
+            raise ImageFetchError('Timed out fetching image')
+        except aiohttp.ClientError as e:
+            self.__logger.debug(f'Fetch failed: {url} | {type(e)}: {e}')
+            raise ImageFetchError('Unable to fetch image')
+
+
+    async def close(self):
+        if isinstance(self.__session, type(None)):
+            return
+
+        await self.__session.close()
+        self.__session = None
+
+
+    async def __download(self, url: str, headers: dict) -> Optional[bytes]:
+        """
+        Returns None if the request was conditional and the server replied not
+        modified, but the cached copy is no longer there
+        """
+        async with self.__session.get(url, headers=headers) as reply:
+            if reply.status == 304 and len(headers) != 0:
+                return await self.__cache.revalidated(url)
+
+            if reply.status != 200:
+                raise ImageFetchError('Unable to fetch image')
+
+            self.__check_headers(reply)
+            data = await self.__read(reply)
+
+            if not isinstance(self.__cache, type(None)):
+                await self.__cache.put(url, data, reply.headers.get('ETag', None), reply.headers.get('Last-Modified', None))
+
+            return data
+
+
+    def __check_headers(self, reply: aiohttp.ClientResponse):
+        # Servers that don't know send no type or octet-stream; the header check catches those
+        content_type = reply.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in [ '', 'application/octet-stream' ] and not content_type.startswith('image/'):
+            raise ImageFetchError('Not an image')
+
+        if not isinstance(reply.content_length, type(None)) and reply.content_length > self.__max_bytes:
+            raise ImageFetchError(f'Image is too large (max {self.__max_bytes // (1024*1024)} MB)')
+
+
+    async def __read(self, reply: aiohttp.ClientResponse) -> bytes:
+        data = bytearray()
+        header_ok = False
+
+        # Parsing copies the data so far, so not on every chunk
+        header_check_size = ImageFetcher.__CHUNK_SIZE
+
+        async for chunk in reply.content.iter_chunked(ImageFetcher.__CHUNK_SIZE):
+            data += chunk
+
+            if len(data) > self.__max_bytes:
+                raise ImageFetchError(f'Image is too large (max {self.__max_bytes // (1024*1024)} MB)')
+
+            if not header_ok and header_check_size <= len(data) and header_check_size <= ImageFetcher.__MAX_HEADER_BYTES:
+                header_ok = self.__check_header(data, final=False)
+                header_check_size *= 2
+
+        if not header_ok:
+            self.__check_header(data, final=True)
+
+        return bytes(data)
+
+
+    def __check_header(self, data: bytearray, final: bool) -> bool:
+        """
+        Whether the header could be read yet. Raises if it's over budget, or if
+        it's `final` and there's no image header.
+        """
+        try: img = Image.open(BytesIO(data))
+        except Image.DecompressionBombError:
+            raise ImageFetchError('Image dimensions are too large')
+        except Exception:
+            # Possibly only not all there yet
+            if final:
+                raise ImageFetchError('Not an image')
+
+            return False
+
+        width, height = img.size
+        if width*height > self.__max_pixels:
+            raise ImageFetchError(f'Image dimensions are too large ({width}x{height})')
+
+        return True
@@ -0,0 +1,179 @@
+from typing import BinaryIO, Optional
+
+from PIL import Image, ImageChops, GifImagePlugin
+
+
+class GifWriteError(ValueError):
+    pass
+
+
+class GifWriter():
+    """
+    Writes a GIF a frame at a time
+
+    PIL's own GIF saving holds on to every frame until all of them are known.
+    This writes each frame as soon as the next one arrives, so only the last
+    frame and the one waiting to be written are held. Like PIL, a frame that
+    is the same as the one before only adds to its duration, and a frame
+    drawn over the one before only stores the part that changed.
+
+    Frames are given whole, ex: as PIL decodes them. PIL failing on a frame
+    raises `GifWriteError`.
+
+    Usage:
+        writer = GifWriter(fp, loop=0)
+        for frame in frames:
+            writer.add(frame, duration, disposal)
+        writer.close()
+    """
+
+    def __init__(self, fp: BinaryIO, loop: Optional[int] = None):
+        """
+        Params
+        ======
+        fp: BinaryIO
+            Where the GIF gets written to
+
+        loop: int
+            Times to loop, 0 is forever; None to play once
+        """
+        self.__fp   = fp
+        self.__loop = loop
+
+        # Last frame added, as given
+        self.__prev_frame    = None
+        self.__prev_disposal = 0
+
+        # [ palette image, offset, duration, disposal ] of the frame waiting to be written
+        self.__pending = None
+
+        self.__num_written = 0
+
+
+    def add(self, frame: Image.Image, duration: int, disposal: int = 0):
+        """
+        Params
+        ======
+        frame: Image.Image
+            Whole frame, all frames need to be the same size
+
+        duration: int
+            Time (ms) to show the frame for
+
+        disposal: int
+            GIF disposal method for after the frame is shown
+        """
+        try: self.__add(frame, duration, disposal)
+        except (ValueError, TypeError, OSError) as e:
+            raise GifWriteError(f'Unable to write GIF frame | {type(e)}: {e}') from e
+
+
+    def close(self):
+        try: self.__write_pending()
+        except (ValueError, TypeError, OSError) as e:
+            raise GifWriteError(f'Unable to write GIF frame | {type(e)}: {e}') from e
+
+        if self.__num_written > 0:
+            self.__fp.write(b';')
+
+        self.__prev_frame = None
+
+
+    def __add(self, frame: Image.Image, duration: int, disposal: int):
+        whole  = frame
+        offset = ( 0, 0 )
+
+        if self.__can_diff(frame):
+            bbox = ImageChops.difference(self.__prev_frame, frame).getbbox()
+            if isinstance(bbox, type(None)):
+                if disposal == self.__pending[3]:
+                    self.__pending[2] += duration
+                    return
+            else:
+                offset = bbox[:2]
+                frame  = frame.crop(bbox)
+
+        self.__write_pending()
+
+        self.__pending = [ GifWriter.__to_palette(frame), offset, duration, disposal ]
+        self.__prev_frame    = whole
+        self.__prev_disposal = disposal
+
+
+    def __can_diff(self, frame: Image.Image) -> bool:
+        """
+        Whether the frame can be stored as what changed since the last one
+        """
+        if isinstance(self.__prev_frame, type(None)):
+            return False
+
+        # Only if the last frame stays up to be drawn over
+        if self.__prev_disposal not in [ 0, 1 ]:
+            return False
+
+        # Parts left out would be see-through, not the last frame's
+        if 'A' in frame.getbands():
+            return False
+
+        return frame.mode == self.__prev_frame.mode and frame.size == self.__prev_frame.size
+
+
+    def __write_pending(self):
+        if isinstance(self.__pending, type(None)):
+            return
+
+        img, offset, duration, disposal = self.__pending
+        self.__pending = None
+
+        params = {
+            'duration'            : duration,
+            'disposal'            : disposal,
+            'include_color_table' : True,
+        }
+
+        if 'transparency' in img.info:
+            params['transparency'] = img.info['transparency']
+
+        if self.__num_written == 0:
+            # Frames have their own palettes; this one goes in the header since there has to be one
+            img.info['version'] = b'89a'
+            header, _ = GifImagePlugin.getheader(img, None, { 'loop' : self.__loop } if not isinstance(self.__loop, type(None)) else {})
+            self.__fp.write(b''.join(header))
+
+        for data in GifImagePlugin.getdata(img, offset, **params):
+            self.__fp.write(data)
+
+        self.__num_written += 1
+
+
+    @staticmethod
+    def __to_palette(frame: Image.Image) -> Image.Image:
+        if frame.mode == 'P':
+            return frame
+
+        if frame.mode not in [ 'L', 'RGB', 'RGBA' ]:
+            frame = frame.convert('RGBA' if 'A' in frame.getbands() else 'RGB')
+
+        # PIL carries an L value or an RGB color over to the palette. Anything else, ex: the
+        # RGB color left on a band split off an RGB frame, makes it raise
+        transparency = frame.info.get('transparency', None)
+        if not isinstance(transparency, type(None)) and not (
+            (frame.mode == 'L'   and isinstance(transparency, int)) or
+            (frame.mode == 'RGB' and isinstance(transparency, tuple) and len(transparency) == 3)
+        ):
+            frame = frame.copy()
+            del frame.info['transparency']
+
+        if frame.mode == 'L':
+            return frame.convert('P')
+
+        img = frame.convert('P', palette=Image.Palette.ADAPTIVE)
+
+        # Same as PIL does when saving; a fully see-through color becomes the transparent one
+        if img.palette.mode == 'RGBA':
+            for rgba, index in img.palette.colors.items():
+                if rgba[3] == 0:
+                    img.info['transparency'] = index
+                    break
+
+        return img
@@ -0,0 +1,69 @@
+"""
+Per-pixel image kernels
+
+Each one is a single pass over the frame in PIL's C code, without splitting
+it into bands and merging them back. See scripts/bench_image.py for how they
+compare to the split/merge path and to NumPy.
+"""
+from PIL import Image
+
+
+class KernelError(ValueError):
+    pass
+
+
+# Lookup table per band; inverts color bands, keeps alpha as is
+_INVERT = [ 255 - i for i in range(256) ]
+_KEEP   = list(range(256))
+
+_INVERT_LUTS = {
+    'L'    : _INVERT,
+    'LA'   : _INVERT + _KEEP,
+    'RGB'  : _INVERT*3,
+    'RGBA' : _INVERT*3 + _KEEP,
+}
+
+
+def invert(frame: Image.Image) -> Image.Image:
+    """
+    Inverts the color bands, keeps alpha
+    """
+    if frame.mode not in _INVERT_LUTS:
+        frame = frame.convert('RGBA' if 'A' in frame.getbands() else 'RGB')
+
+    inverted = frame.point(_INVERT_LUTS[frame.mode])
+
+    # The transparent color, if there's one, gets inverted along with the pixels
+    transparency = inverted.info.get('transparency', None)
+    if frame.mode == 'L' and isinstance(transparency, int):
+        inverted.info['transparency'] = 255 - transparency
+    elif frame.mode == 'RGB' and isinstance(transparency, tuple):
+        inverted.info['transparency'] = tuple([ 255 - value for value in transparency ])
+    else:
+        inverted.info.pop('transparency', None)
+
+    return inverted
+
+
+def channel(frame: Image.Image, ch: str) -> Image.Image:
+    """
+    The r, g, b or a band as a greyscale image
+    """
+    if ch not in [ 'r', 'g', 'b', 'a' ]:
+        raise KernelError('Invalid channel provided')
+
+    if ch == 'a':
+        if 'A' not in frame.getbands():
+            raise KernelError('Provided image does not have an alpha channel')
+
+        band = frame.getchannel('A')
+    else:
+        if frame.mode not in [ 'RGB', 'RGBA' ]:
+            frame = frame.convert('RGB')
+
+        # Copies out only the one band, unlike `split`
+        band = frame.getchannel(ch.upper())
+
+    # The frame's transparent color doesn't map to a value of one band
+    band.info.pop('transparency', None)
+    return band
@@ -0,0 +1,133 @@
+"""
+Image operations run by `ImagePool`
+
+These run in worker processes, so they take and return encoded image bytes
+rather than `Image` objects, and only depend on PIL.
+"""
+from typing import Iterator
+
+import PIL
+from PIL import Image, ImageSequence
+from io import BytesIO
+
+from . import kernels
+from .gif import GifWriter, GifWriteError
+
+
+class ImageOpError(Exception):
+    """
+    Operation failed in a way the user should be told about
+    """
+    pass
+
+
+def open_image(data: bytes) -> Image.Image:
+    """
+    Opens the image without decoding it yet
+    """
+    try: return Image.open(BytesIO(data))
+    except PIL.UnidentifiedImageError:
+        raise ImageOpError('Not an image')
+    except Image.DecompressionBombError:
+        raise ImageOpError('Image is too large to process')
+
+
+def iter_frames(img: Image.Image) -> "Iterator[tuple[Image.Image, int, int]]":
+    """
+    Decodes the frames one at a time as ( frame, duration (ms), GIF disposal method )
+    """
+    is_gif = (img.format == 'GIF')
+
+    for frame in ImageSequence.Iterator(img):
+        # Decoding moves on to the next frame in place, this one has to be its own
+        frame_copy = from_palette(frame) if frame.mode == 'P' else frame.copy()
+
+        # Some formats only know the duration once the frame is loaded
+        duration = frame.info.get('duration', 0)
+        disposal = getattr(frame, 'disposal_method', 0) if is_gif else 0
+
+        yield ( frame_copy, duration, disposal )
+
+
+def from_palette(img: Image.Image) -> Image.Image:
+    """
+    Palette image as RGB, or RGBA if it has transparent colors
+    """
+    return img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+
+
+def pipe(data: bytes, steps: "list[tuple]") -> "tuple[bytes, str]":
+    """
+    Runs each frame through all steps, decoding and encoding once. Animations
+    are handled a frame at a time, so only a few frames are held at once.
+
+    steps: list[tuple]
+        ( step name, *args ), ex: ( 'zoom', 2.0 ); see `STEPS`
+
+    Returns the image data and its file extension
+    """
+    img = open_image(data)
+    img_out = BytesIO()
+
+    if not getattr(img, 'is_animated', False):
+        frame = from_palette(img) if img.mode == 'P' else img
+        frame = apply_steps(frame, steps)
+
+        try: frame.save(img_out, format='png')
+        except (ValueError, TypeError, OSError):
+            raise ImageOpError('Unable to save the image')
+
+        return img_out.getvalue(), 'png'
+
+    try:
+        writer = GifWriter(img_out, loop=img.info.get('loop', None))
+        for frame, duration, disposal in iter_frames(img):
+            writer.add(apply_steps(frame, steps), duration, disposal)
+        writer.close()
+    except GifWriteError:
+        raise ImageOpError('Unable to save the image')
+
+    return img_out.getvalue(), 'gif'
+
+
+def apply_steps(frame: Image.Image, steps: "list[tuple]") -> Image.Image:
+    for name, *args in steps:
+        frame = STEPS[name](frame, *args)
+
+    return frame
+
+
+def zoom(data: bytes, zoom: float) -> "tuple[bytes, str]":
+    return pipe(data, [ ( 'zoom', zoom ) ])
+
+
+def invert(data: bytes) -> "tuple[bytes, str]":
+    return pipe(data, [ ( 'invert', ) ])
+
+
+def channel(data: bytes, ch: str) -> "tuple[bytes, str]":
+    return pipe(data, [ ( 'channel', ch ) ])
+
+
+def zoom_frame(frame: Image.Image, zoom: float) -> Image.Image:
+    new_w = int(frame.width*zoom)
+    new_h = int(frame.height*zoom)
+
+    return frame.resize((new_w, new_h))
+
+
+def invert_frame(frame: Image.Image) -> Image.Image:
+    return kernels.invert(frame)
+
+
+def channel_frame(frame: Image.Image, ch: str) -> Image.Image:
+    try: return kernels.channel(frame, ch)
+    except kernels.KernelError as e:
+        raise ImageOpError(str(e))
+
+
+STEPS = {
+    'zoom'    : zoom_frame,
+    'invert'  : invert_frame,
+    'channel' : channel_frame,
+}
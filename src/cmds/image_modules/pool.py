@@ -0,0 +1,182 @@
+from typing import Callable, Optional
+
+import asyncio
+import logging
+import functools
+import weakref
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+try: import resource
+except ImportError:
+    # Not on Windows; workers run without a memory cap there
+    resource = None
+
+from .ops import ImageOpError
+
+
+class ImagePool():
+    """
+    Runs image operations in worker processes
+
+    PIL work holds the GIL for most of its time, so it runs in other processes
+    to keep the event loop free. Jobs are functions from `ops` taking and
+    returning encoded image bytes, so no `Image` objects get pickled.
+
+    A job running past `timeout` seconds gets its workers killed and the pool
+    restarted. Workers have their address space capped at `max_memory` bytes;
+    a job going over fails with a `MemoryError`, and a worker that crashes
+    outright gets the pool restarted as well.
+
+    Killing workers takes down the jobs the other workers were running and
+    the ones queued, so those are run again on the new workers.
+
+    With 0 workers, or if worker processes can't be started, jobs run in a
+    thread of this process instead. That still keeps the event loop free, but
+    has no memory cap, and timed out jobs can't be stopped.
+    """
+
+    # Times a job is run if it keeps being lost to other jobs' workers getting killed
+    __MAX_ATTEMPTS = 3
+
+    def __init__(self, workers: int = 2, timeout: float = 30, max_memory: Optional[int] = None):
+        """
+        Params
+        ======
+        workers: int
+            Worker processes; 0 runs jobs in this process
+
+        timeout: float
+            Seconds a job gets to finish
+
+        max_memory: int
+            Max bytes of address space per worker, None for no cap
+        """
+        self.__logger = logging.getLogger(__class__.__name__)
+
+        self.__workers    = workers
+        self.__timeout    = timeout
+        self.__max_memory = max_memory
+
+        self.__executor = None
+        self.__fallback = (workers <= 0)
+
+        # Pools whose workers were killed
+        self.__killed = weakref.WeakSet()
+
+
+    async def run(self, fn: Callable, *args) -> "tuple[bytes, str]":
+        """
+        Runs `fn(*args)` in a worker, raises `ImageOpError` on failures the user
+        should be told about
+        """
+        loop = asyncio.get_running_loop()
+
+        executor = self.__get_executor()
+        if isinstance(executor, type(None)):
+            try: return await asyncio.wait_for(loop.run_in_executor(None, functools.partial(fn, *args)), self.__timeout)
+            except asyncio.TimeoutError:
+                raise ImageOpError('Took too long to process the image')
+            except MemoryError:
+                raise ImageOpError('Image is too large to process')
+
+        # Jobs lost to another job's workers getting killed run again, a few times at most
+        for attempt in range(ImagePool.__MAX_ATTEMPTS):
+            if attempt > 0:
+                executor = self.__get_executor()
+                if isinstance(executor, type(None)):
+                    return await self.run(fn, *args)
+
+            # Workers get started on submit
+            try: job = loop.run_in_executor(executor, functools.partial(fn, *args))
+            except OSError as e:
+                self.__logger.warning(f'Unable to start image workers, processing images in-process | {type(e)}: {e}')
+                self.__kill(executor)
+                self.__fallback = True
+                return await self.run(fn, *args)
+
+            try: return await asyncio.wait_for(job, self.__timeout)
+            except asyncio.TimeoutError:
+                self.__logger.warning(f'{fn.__name__} timed out after {self.__timeout}s, restarting workers')
+                self.__kill(executor)
+                raise ImageOpError('Took too long to process the image')
+            except MemoryError:
+                raise ImageOpError('Image is too large to process')
+            except BrokenProcessPool:
+                if executor in self.__killed:
+                    self.__logger.info(f'{fn.__name__} was lost to restarting workers, running it again')
+                    continue
+
+                self.__logger.warning(f'Worker died running {fn.__name__}, restarting workers')
+                self.__kill(executor)
+                raise ImageOpError('Unable to process the image')
+
+        raise ImageOpError('Unable to process the image')
+
+
+    def close(self):
+        if isinstance(self.__executor, type(None)):
+            return
+
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+        self.__executor = None
+
+
+    def __get_executor(self) -> Optional[concurrent.futures.ProcessPoolExecutor]:
+        if self.__fallback:
+            return None
+
+        if not isinstance(self.__executor, type(None)):
+            return self.__executor
+
+        try:
+            # Not forked; a fork would copy the whole bot, event loop and sockets included
+            self.__executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers = self.__workers,
+                mp_context  = multiprocessing.get_context('spawn'),
+                initializer = ImagePool._init_worker,
+                initargs    = ( self.__max_memory, ),
+            )
+        except (OSError, NotImplementedError) as e:
+            self.__logger.warning(f'Unable to start image workers, processing images in-process | {type(e)}: {e}')
+            self.__fallback = True
+            return None
+
+        return self.__executor
+
+
+    def __kill(self, executor: concurrent.futures.ProcessPoolExecutor):
+        # Jobs of this pool failing from here on didn't fail on their own
+        self.__killed.add(executor)
+
+        # A running job can't be cancelled, only its process killed. That breaks
+        # the pool, which fails the other running and queued jobs with
+        # `BrokenProcessPool` rather than cancelling them
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            try: process.kill()
+            except Exception:
+                pass
+
+        executor.shutdown(wait=False)
+
+        if self.__executor is executor:
+            self.__executor = None
+
+
+    @staticmethod
+    def _init_worker(max_memory: Optional[int]):
+        if isinstance(max_memory, type(None)):
+            return
+
+        # Lets PIL refuse images that can't fit before it starts decoding
+        Image.MAX_IMAGE_PIXELS = max_memory // 4
+
+        if isinstance(resource, type(None)):
+            return
+
+        try: resource.setrlimit(resource.RLIMIT_AS, ( max_memory, max_memory ))
+        except (ValueError, OSError):
+            pass
@@ -1,5 +1,4 @@
 import discord
-import warnings
 import logging
 
 from tinydb.table import Document
@@ -17,6 +16,27 @@ class CmdsModeration:
         await msg.channel.send(cmd_txt)
 
 
+    @staticmethod
+    async def __load_custom_commands(self: DiscordBot, guild_id: int) -> dict:
+        """
+        Loads the guild's custom commands for the command router
+        """
+        entry = await self.adb.get('custom_cmds', doc_id=guild_id)
+        if isinstance(entry, type(None)):
+            return {}
+
+        return {
+            cmd_txt : {
+                'func'     : lambda bot, msg, *args, cmd_msg=cmd_msg: CmdsModeration.__custom_command(bot, msg, cmd_server_id=guild_id, cmd_txt=cmd_msg),
+                'perm'     : DiscordCmdBase.ANYONE,
+                'anywhere' : True,
+                'example'  : None,
+                'help'     : None,
+            }
+            for cmd_txt, cmd_msg in entry.items()
+        }
+
+
     @DiscordCmdBase.DiscordCmd(
         perm    = DiscordCmdBase.MODERATOR,
         example = f'{DiscordBot.cmd_prefix}bot.en true',
@@ -48,11 +68,7 @@ class CmdsModeration:
             await self.run_help_cmd(msg, 'bot.en')
             return
 
-        table = self.db.table('bot_en')
-        if not table.contains(doc_id=msg.channel.id):
-            table.insert(Document({ 'chan_en' : en }, msg.channel.id))
-        else:
-            table.upsert(Document({ 'chan_en' : en }, msg.channel.id))
+        await self.adb.upsert('bot_en', Document({ 'chan_en' : en }, msg.channel.id))
 
         en_text = 'Enabled' if en else 'Disabled'
 
@@ -79,27 +95,22 @@ class CmdsModeration:
             embed.add_field(name='Insufficient permissions', value=f'You need the manage channel permission to use this command')
             await msg.channel.send(None, embed=embed)
 
-        table = self.db.table('bot_ch')
-        if not table.contains(doc_id=msg.guild.id):
-            table.insert(Document({ 'channel' : msg.channel.id }, msg.guild.id))
+        entry = await self.adb.get('bot_ch', doc_id=msg.guild.id)
+        if isinstance(entry, type(None)):
+            await self.adb.insert('bot_ch', Document({ 'channel' : msg.channel.id }, msg.guild.id))
 
             embed = discord.Embed(title=f'Set #{msg.channel.name} to be the bot channel', color=0x1ABC9C)
             await msg.channel.send(None, embed=embed)
             return
 
-        entry = table.get(doc_id=msg.guild.id)
-        if isinstance(entry, type(None)):
-            warnings.warn('Got none result despite having an entry')
-            raise Exception
-
         if entry['channel'] != msg.channel.id:
-            table.upsert(Document({ 'channel' : msg.channel.id }, msg.guild.id))
+            await self.adb.upsert('bot_ch', Document({ 'channel' : msg.channel.id }, msg.guild.id))
 
             embed = discord.Embed(title=f'Set #{msg.channel.name} to be the bot channel', color=0x1ABC9C)
             await msg.channel.send(None, embed=embed)
             return
 
-        table.remove(None, doc_ids=[ msg.guild.id ])
+        await self.adb.remove('bot_ch', None, doc_ids=[ msg.guild.id ])
 
         embed = discord.Embed(title=f'Set #{msg.channel.name} to no longer be the bot channel', color=0x1ABC9C)
         await msg.channel.send(None, embed=embed)
@@ -119,17 +130,12 @@ class CmdsModeration:
                 ...
             }
         """
-        table = self.db.table('bot_ch')
-        if not table.contains(doc_id=msg.guild.id):
+        entry = await self.adb.get('bot_ch', doc_id=msg.guild.id)
+        if isinstance(entry, type(None)):
             embed = discord.Embed(title=f'No bot channel set', color=0x1ABC9C)
             await msg.channel.send(None, embed=embed)
             return
 
-        entry = table.get(doc_id=msg.guild.id)
-        if isinstance(entry, type(None)):
-            warnings.warn('Got none result despite having an entry')
-            raise Exception
-
         channel = msg.guild.get_channel(entry['channel'])
         if isinstance(channel, type(None)):
             channel = await msg.guild.fetch_channel(entry['channel'])
@@ -173,31 +179,22 @@ class CmdsModeration:
         cmd_txt = args[0]
         cmd_msg = ' '.join(args[1:])
 
-        for module in self._modules.values():
-            if cmd_txt in module:
-                embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
-                embed.add_field(name='Unable to set command', value=f'Cannot set a default command')
-                await msg.channel.send(None, embed=embed)
-                return
+        if not isinstance(self._router.get(cmd_txt), type(None)):
+            embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
+            embed.add_field(name='Unable to set command', value=f'Cannot set a default command')
+            await msg.channel.send(None, embed=embed)
+            return
 
         # Add to db
-        table = self.db.table('custom_cmds')
-
-        entry = table.get(doc_id=msg.guild.id)
+        entry = await self.adb.get('custom_cmds', doc_id=msg.guild.id)
         if isinstance(entry, type(None)):
             entry = Document({ cmd_txt : cmd_msg }, doc_id=msg.guild.id)
 
         entry[cmd_txt] = cmd_msg
-        table.upsert(entry)
-
-        # Register command
-        self._cmds[f'{msg.guild.id}_{cmd_txt}'] = {
-            'func'     : lambda bot, msg: CmdsModeration.__custom_command(bot, msg, cmd_server_id=entry.doc_id, cmd_txt=cmd_msg),
-            'perm'     : DiscordCmdBase.ANYONE,
-            'anywhere' : True,
-            'example'  : None,
-            'help'     : None,
-        }
+        await self.adb.upsert('custom_cmds', entry)
+
+        # Register command; the guild's commands get reloaded on next use
+        self._router.invalidate(msg.guild.id)
 
         embed = discord.Embed(title=f'Set {DiscordBot.cmd_prefix}{cmd_txt} command', color=0x1ABC9C)
         await msg.channel.send(None, embed=embed)
@@ -232,28 +229,22 @@ class CmdsModeration:
 
         cmd_txt = args[0]
 
-        for module in self._modules.values():
-            if cmd_txt in module:
-                embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
-                embed.add_field(name='Unable to remove command', value=f'Cannot remove a default command')
-                await msg.channel.send(None, embed=embed)
-                return
+        if not isinstance(self._router.get(cmd_txt), type(None)):
+            embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
+            embed.add_field(name='Unable to remove command', value=f'Cannot remove a default command')
+            await msg.channel.send(None, embed=embed)
+            return
 
         # Remove from db
-        table = self.db.table('custom_cmds')
-
-        entry = table.get(doc_id=msg.guild.id)
+        entry = await self.adb.get('custom_cmds', doc_id=msg.guild.id)
         if isinstance(entry, type(None)):
             return
 
-        if cmd_txt in entry:
-            del entry[cmd_txt]
-
-        table.update(entry)
+        # Updating with the edited entry would only merge fields, the key has to be deleted in place
+        await self.adb.update('custom_cmds', lambda doc: doc.pop(cmd_txt, None), doc_ids=[ msg.guild.id ])
 
         # Unregister command
-        if f'{msg.guild.id}_{cmd_txt}' in self._cmds:
-            del self._cmds[f'{msg.guild.id}_{cmd_txt}']
+        self._router.invalidate(msg.guild.id)
 
         embed = discord.Embed(title=f'Removed {DiscordBot.cmd_prefix}{cmd_txt} command', color=0x1ABC9C)
         await msg.channel.send(None, embed=embed)
@@ -264,14 +255,5 @@ class CmdsModeration:
         logger = logging.getLogger('reg_cmds')
         logger.info(f'Registering custom cmds...')
 
-        table = self.db.table('custom_cmds')
-        for entry in table.all():
-            for cmd_txt, cmd_msg in entry.items():
-                logger.info(f'    {cmd_txt}')
-                self._cmds[f'{entry.doc_id}_{cmd_txt}'] = {
-                    'func'     : lambda bot, msg, cmd_server_id=entry.doc_id, cmd_text=cmd_msg: CmdsModeration.__custom_command(bot, msg, cmd_server_id=cmd_server_id, cmd_txt=cmd_text),
-                    'perm'     : DiscordCmdBase.ANYONE,
-                    'anywhere' : True,
-                    'example'  : None,
-                    'help'     : None,
-                }
+        # Each guild's custom commands get loaded when first used in it
+        self._router.set_loader(lambda guild_id: CmdsModeration.__load_custom_commands(self, guild_id))
@@ -1,9 +1,8 @@
 import discord
-import warnings
 
 import tinydb
 
-from core import DiscordCmdBase, DiscordBot
+from core import DiscordCmdBase, DiscordBot, Diagnostics
 
 
 
@@ -110,8 +109,7 @@ class CmdsRoles:
 
         role_name = args[0].lower()
 
-        table = self.db.table('self_roles')
-        results = table.search(tinydb.Query().fragment({ 'server' : msg.guild.id, 'role_name' : role_name }))
+        results = await self.adb.search('self_roles', tinydb.Query().fragment({ 'server' : msg.guild.id, 'role_name' : role_name }))
 
         # Find the role in DB
         roles = list([ role for role in results if role['role_name'] == role_name ])
@@ -123,7 +121,7 @@ class CmdsRoles:
 
         if len(roles) > 1:
             # NOTE: Shouldn't happen
-            warnings.warn('Found more than one role in DB')
+            Diagnostics.warn('Found more than one role in DB')
 
         # Find the role in server
         roles = list([ role for role in msg.guild.roles if role.name.lower() == role_name ])
@@ -135,7 +133,7 @@ class CmdsRoles:
 
         if len(roles) > 1:
             # NOTE: Shouldn't happen
-            warnings.warn('Found more than one role in server')
+            Diagnostics.warn('Found more than one role in server')
 
         server_role = roles[0]
         roles = list([ role for role in msg.author.roles if role.name.lower() == role_name ])
@@ -152,7 +150,7 @@ class CmdsRoles:
 
         if len(roles) > 1:
             # NOTE: Shouldn't happen
-            warnings.warn('Found more than one user role')
+            Diagnostics.warn('Found more than one user role')
 
         await msg.author.remove_roles(server_role)
 
@@ -201,12 +199,11 @@ class CmdsRoles:
 
         if len(role) > 1:
             # NOTE: Shouldn't happen
-            warnings.warn('Found more than one role in server')
+            Diagnostics.warn('Found more than one role in server')
 
         role = role[0]
 
-        table = self.db.table('self_roles')
-        table.upsert(
+        await self.adb.upsert('self_roles',
             { 'server' : msg.guild.id, 'role_id' : role.id, 'role_name' : role.name },
             tinydb.Query().fragment({ 'server' : msg.guild.id, 'role_id' : role.id })
         )
@@ -249,15 +246,13 @@ class CmdsRoles:
 
         if len(role) > 1:
             # NOTE: Shouldn't happen
-            warnings.warn('Found more than one role in server')
-
-        table = self.db.table('self_roles')
+            Diagnostics.warn('Found more than one role in server')
 
         if len(role) == 0:
             # Fallback to role name
-            removed = table.remove(tinydb.Query().fragment({ 'server' : msg.guild.id, 'role_name' : role_name }))
+            removed = await self.adb.remove('self_roles', tinydb.Query().fragment({ 'server' : msg.guild.id, 'role_name' : role_name }))
         else:
-            removed = table.remove(tinydb.Query().fragment({ 'server' : msg.guild.id, 'role_id' : role[0].id }))
+            removed = await self.adb.remove('self_roles', tinydb.Query().fragment({ 'server' : msg.guild.id, 'role_id' : role[0].id }))
 
         if len(removed) == 0:
             embed = discord.Embed(type='rich', color=0xFF9900, title=':check: Command failed successfully')
@@ -267,7 +262,7 @@ class CmdsRoles:
 
         if len(removed) > 1:
             # NOTE: Shouldn't happen
-            warnings.warn(f'Remove more than one role from db: {removed}')
+            Diagnostics.warn(f'Remove more than one role from db: {removed}')
 
         embed = discord.Embed(title=f'Removed {role_name} from self roles', color=0x1ABC9C)
         await msg.channel.send(None, embed=embed)
@@ -292,8 +287,7 @@ class CmdsRoles:
                 ...
             }
         """
-        table = self.db.table('self_roles')
-        results = table.search(tinydb.Query().fragment({ 'server' : msg.guild.id }))
+        results = await self.adb.search('self_roles', tinydb.Query().fragment({ 'server' : msg.guild.id }))
 
         role_list = '\n'.join([ role['role_name'] for role in results ])
 
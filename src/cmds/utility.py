@@ -14,12 +14,18 @@ import discord
 import tinydb
 from tinydb.table import Document
 
-from core import DiscordCmdBase, DiscordBot
+from core import DiscordCmdBase, DiscordBot, Scheduler
 
 
 
 class CmdsUtility:
 
+    # Pending reminders by doc id, ordered by due time
+    __reminders = Scheduler()
+
+    # Reminders being sent; the loop only keeps weak refs to tasks
+    __reminder_tasks = set()
+
     @staticmethod
     @DiscordCmdBase.DiscordCmd(
         perm     =  DiscordCmdBase.ANYONE,
@@ -70,18 +76,26 @@ class CmdsUtility:
             await msg.channel.send(None, embed=embed)
             return
 
-        if cmd not in self._cmds:
+        cmd_data = self._router.get(cmd)
+        if isinstance(cmd_data, type(None)):
             embed = discord.Embed(type='rich', color=0x696969, title='🔍 No such command was found...')
             await msg.channel.send(None, embed=embed)
             return
 
+        cmd = self._router.name(cmd)
+
+        aliases_txt = ''
+        if len(cmd_data.get('aliases', [])) > 0:
+            aliases_txt = f'Aliases: {", ".join([ f"`{alias}`" for alias in cmd_data["aliases"] ])}\n'
+
         embed = discord.Embed(title=f':book: HELP {cmd}', color=0x1B6F5F)
         embed.add_field(
             name = 'Command Usage Example and Information',
             value =
-                f'Example: `{self._cmds[cmd]["example"]}`\n'
+                f'Example: `{cmd_data["example"]}`\n'
+                f'{aliases_txt}'
                 '```\n'
-                f'{self._cmds[cmd]["help"]}\n'
+                f'{cmd_data["help"]}\n'
                 '```'
         )
 
@@ -92,6 +106,7 @@ class CmdsUtility:
     @DiscordCmdBase.DiscordCmd(
         perm     = DiscordCmdBase.ANYONE,
         anywhere = True,
+        aliases  = [ 'cmds' ],
         example  = f'{DiscordBot.cmd_prefix}commands Games',
         help     =
             'Shows the commands in a specific module group.'
@@ -156,8 +171,8 @@ class CmdsUtility:
             return
 
         cmd_counts = {}
-        for cmd in self._cmds:
-            if self._cmds[cmd]['perm'] == DiscordCmdBase.ADMINISTRATOR:
+        for cmd, cmd_data in self._router.builtins.items():
+            if cmd_data['perm'] == DiscordCmdBase.ADMINISTRATOR:
                 # Don't give stats for admin commands
                 continue
 
@@ -406,8 +421,8 @@ class CmdsUtility:
             'text'        : text
         }
 
-        table = self.db.table('reminders')
-        table.insert(Document(data, doc_id=msg.id))
+        await self.adb.insert('reminders', Document(data, doc_id=msg.id))
+        CmdsUtility.__reminders.add(msg.id, due_timestamp)
 
         embed = discord.Embed(color=0x66CC66, timestamp=arrow.get(due_timestamp).datetime)
         embed.set_author(name='New Reminder Set', icon_url=msg.author.avatar.url)
@@ -426,8 +441,7 @@ class CmdsUtility:
             'Input a number after the command to see more details about that reminder.'
     )
     async def reminders(self: DiscordBot, msg: discord.Message, *args: "list[str]"):
-        table = self.db.table('reminders')
-        entries = table.search(tinydb.Query().fragment({ 'server_id' : msg.guild.id, 'user_id' : msg.author.id }))
+        entries = await self.adb.search('reminders', tinydb.Query().fragment({ 'server_id' : msg.guild.id, 'user_id' : msg.author.id }))
 
         num_reminders = len(entries)
         if num_reminders == 0:
@@ -593,47 +607,52 @@ class CmdsUtility:
     async def reminder_task(self: DiscordBot):
         logger = logging.getLogger('reminder_task')
 
+        for entry in await self.adb.all('reminders'):
+            CmdsUtility.__reminders.add(entry.doc_id, entry['due_at'])
+
+        logger.info(f'Loaded {len(CmdsUtility.__reminders)} reminders')
+
         while True:
-            # Process reminders every second
-            await asyncio.sleep(1)
-            # logger.debug(f'tick @ {time.time()}')
-
-            table = self.db.table('reminders')
-            for guild in self.guilds:
-                # Sleep to yield db search
-                await asyncio.sleep(0.1)
-
-                entries = table.search(tinydb.Query().fragment({ 'server_id' : guild.id }))
-                if len(entries) == 0:
-                    continue
-
-                for entry in entries:
-                    due_at = arrow.get(entry['due_at']).timestamp()
-                    if arrow.now().timestamp() < due_at:
-                        continue
-
-                    # Sleep to yield db remove
-                    await asyncio.sleep(0.1)
-                    logger.debug(f'Executing reminder id {entry.doc_id} | due_at = {due_at}  now = {arrow.now().timestamp()}')
-
-                    data = entry.copy()
-                    table.remove(doc_ids=[ entry.doc_id ])
-
-                    channel = guild.get_channel(data['channel_id'])
-                    if isinstance(channel, type(None)):
-                        channel = await guild.fetch_channel(data['channel_id'])
-                        if isinstance(channel, type(None)):
-                            logger.debug(f'Channel id {data["channel_id"]} in server {guild.name} does not exist\n')
-                            continue
-
-                    user = guild.get_member(data['user_id'])
-                    if isinstance(user, type(None)):
-                        user = await guild.fetch_member(data['user_id'])
-                        if isinstance(user, type(None)):
-                            logger.debug(f'User id {data["user_id"]} in server {guild.name} does not exist\n')
-                            continue
-
-                    embed = discord.Embed(color=0x1ABC9C, timestamp=arrow.get(data['created_at']).datetime)
-                    embed.set_author(name=user.name, icon_url=user.avatar.url)
-                    embed.add_field(name='⏰ Reminder Message', value=f"```\n{data['text']}\n```")
-                    await channel.send(user.mention, embed=embed)
+            # Sleeps until the next reminder is due, or a sooner one gets added
+            doc_ids = await CmdsUtility.__reminders.wait_due()
+
+            for doc_id in doc_ids:
+                task = self.loop.create_task(CmdsUtility.__send_reminder(self, doc_id))
+                CmdsUtility.__reminder_tasks.add(task)
+                task.add_done_callback(CmdsUtility.__reminder_tasks.discard)
+
+
+    @staticmethod
+    async def __send_reminder(self: DiscordBot, doc_id: int):
+        logger = logging.getLogger('reminder_task')
+
+        data = await self.adb.get('reminders', doc_id=doc_id)
+        if isinstance(data, type(None)):
+            return
+
+        logger.debug(f'Executing reminder id {doc_id} | due_at = {data["due_at"]}  now = {arrow.now().timestamp()}')
+        await self.adb.remove('reminders', doc_ids=[ doc_id ])
+
+        try:
+            guild = self.get_guild(data['server_id'])
+            if isinstance(guild, type(None)):
+                guild = await self.fetch_guild(data['server_id'])
+
+            channel = guild.get_channel(data['channel_id'])
+            if isinstance(channel, type(None)):
+                channel = await guild.fetch_channel(data['channel_id'])
+
+            user = guild.get_member(data['user_id'])
+            if isinstance(user, type(None)):
+                user = await guild.fetch_member(data['user_id'])
+        except discord.HTTPException as e:
+            logger.debug(f'Unable to resolve reminder id {doc_id} target (server {data["server_id"]}, channel {data["channel_id"]}, user {data["user_id"]}) | {e}\n')
+            return
+
+        embed = discord.Embed(color=0x1ABC9C, timestamp=arrow.get(data['created_at']).datetime)
+        embed.set_author(name=user.name, icon_url=user.avatar.url)
+        embed.add_field(name='⏰ Reminder Message', value=f"```\n{data['text']}\n```")
+
+        try: await channel.send(user.mention, embed=embed)
+        except discord.HTTPException as e:
+            logger.debug(f'Unable to send reminder id {doc_id} to channel {data["channel_id"]} | {e}\n')
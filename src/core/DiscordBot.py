@@ -1,11 +1,12 @@
-from typing import Optional
+from typing import Coroutine, Optional
 
 import os
+import shutil
 import importlib
 import inspect
 import traceback
-import warnings
 import time
+import math
 
 import logging
 import asyncio
@@ -20,15 +21,32 @@ import tinydb
 from tinydb.table import Document
 
 from .db_middleware import DbThreadSafeMiddleware
+from .db_storage import DbAtomicJsonStorage
+from .db_counters import DbCounters
+from .db_sqlite import DbSqlite
+from .db_sharded import DbSharded
+from .db_journal import DbJournalStorage, DbJournalTinyDB
+from .db_serializer import DbSerializer
+from .cmd_executor import CmdExecutor
+from .cmd_router import CmdRouter
+from .rate_limiter import RateLimiter
+from .msg_history import MsgHistory, MsgRecord, MsgAttachment
+from .msg_ids import MsgIdCache
+from .report_coalescer import ReportCoalescer
+from .diagnostics import Diagnostics
+from .loop_monitor import LoopMonitor
+from .metrics import Metrics
+from .db_table import DbTinyDB
+from .db_async import DbAsync
 from .utils import Utils
 
 
 
 class DiscordBot(discord.Client):
 
-    __MSG_TYPE_TOTAL = 0
-    __MSG_TYPE_USERS = 1
-    __MSG_TYPE_CMDS  = 2
+    __MSG_TYPE_TOTAL = 'total_msgs'
+    __MSG_TYPE_USERS = 'user_msgs'
+    __MSG_TYPE_CMDS  = 'total_cmds'
 
     __DB_BOT_CFG_INFO_MSG = 0
 
@@ -38,6 +56,30 @@ class DiscordBot(discord.Client):
     __TABLE_BOT_EN    = 'bot_en'
     __TABLE_BOT_CH    = 'bot_ch'
 
+    # Fields commonly looked up together, used by backends that support indexes
+    __DB_INDEXES = {
+        'cmd_stats'  : [ ('cmd', 'server'), ('cmd',) ],
+        'reminders'  : [ ('server_id', 'user_id'), ('due_at',) ],
+        'self_roles' : [ ('server', 'role_name'), ('server',) ],
+    }
+
+    # How guild-scoped tables are split up by the sharded backend, see `DbSharded`
+    __DB_SHARDS = {
+        'bot_stats'   : 'doc_id',
+        'bot_ch'      : 'doc_id',
+        'custom_cmds' : 'doc_id',
+        'self_roles'  : 'server',
+        'reminders'   : 'server_id',
+        'bot_en'      : 64,  # Keyed by channel id
+    }
+
+    # Min seconds between "busy" replies in a channel
+    __BUSY_REPLY_INTERVAL = 10
+
+    __METRIC_CMD_TIME   = Metrics.histogram('sickle_cmd_duration_seconds', 'Time commands took to run', ( 'cmd', ))
+    __METRIC_CMD_ERRORS = Metrics.counter('sickle_cmd_errors_total', 'Commands that failed with an error', ( 'cmd', ))
+    __METRIC_SEND_TIME  = Metrics.histogram('sickle_send_duration_seconds', 'Time discord took to accept a sent message')
+
     with open('config.yaml', 'r') as f:
         CONFIG = yaml.safe_load(f)
 
@@ -52,26 +94,76 @@ class DiscordBot(discord.Client):
         self.__logger = logging.getLogger(__class__.__name__)
         self.__logger.info('DiscordBot initializing...')
 
+        self.__time_sends()
+
         self.is_debug = self.get_cfg('Core', 'is_debug')
         self.__logger.info(f'is_debug: {self.is_debug}')
 
         self.quit     = False
         self._cfg     = {}
 
-        self._cmds    = {}
-        self._events  = {}
-        self._modules = {}
+        # Set once `close` is done saving and disconnecting
+        self.__closed  = threading.Event()
+        self.__closing = False
+
+        self._router    = CmdRouter(max_loaded=self.get_cfg('Cmds', 'max_loaded_guilds', 1024))
+        self._events    = {}
+        self._shutdowns = {}
+        self._modules   = {}
+
+        # Warnings in commands get collected per command and reported
+        Diagnostics.install()
+
+        self.__loop_monitor = LoopMonitor(
+            interval  = self.get_cfg('Core', 'loop_monitor_interval', 0.05),
+            threshold = self.get_cfg('Core', 'loop_stall_threshold', 0.1),
+        )
 
         self.__dbg_ch = None
-        self.__curr_msg = {}
-        self.__prev_msg = {}
+        self.__reports = ReportCoalescer(self.__send_report,
+            interval       = self.get_cfg('Core', 'report_interval', 10),
+            max_per_minute = self.get_cfg('Core', 'report_max_per_minute', 10),
+        )
+
+        self.__msg_history = MsgHistory(
+            max_channels = self.get_cfg('Cmds', 'history_channels', 4096),
+            max_msgs     = self.get_cfg('Cmds', 'history_msgs', 16),
+        )
+
+        # Ids of messages sent by the bot, to tell if a reply is to the bot without fetching
+        self.__sent_msgs = MsgIdCache(self.get_cfg('Cmds', 'history_sent_msgs', 4096))
 
         self.__is_connected = False
-        self.__db = tinydb.TinyDB('db.json', storage=DbThreadSafeMiddleware(tinydb.JSONStorage))
+        self.__db  = self.__open_db()
+        self.__adb = DbAsync(self.__db, max_queued=self.get_cfg('Db', 'max_queued', 256))
+
+        self.__db_counters = DbCounters(self.__db, self.__TABLE_BOT_STATS, self.__TABLE_CMD_STATS)
+        self.__db_counters_interval = self.get_cfg('Db', 'stats_flush_interval', 30)
+
+        self.__executor = CmdExecutor(
+            max_running = self.get_cfg('Cmds', 'max_running', 32),
+            max_queued  = self.get_cfg('Cmds', 'max_queued', 256),
+            classes     = self.get_cfg('Cmds', 'concurrency', { 'image' : 4 })
+        )
+
+        self.__rate_limiter = RateLimiter(self.get_cfg('Cmds', 'rate_limits', {
+            'user'  : { 'capacity' : 10,  'per_second' : 0.5 },
+            'guild' : { 'capacity' : 60,  'per_second' : 3   },
+        }))
+
+        # Channel id -> time of last "busy" reply
+        self.__busy_replies = {}
+
+        Metrics.gauge('sickle_cmds_running', 'Commands running', fn=lambda: { () : self.__executor.running })
+        Metrics.gauge('sickle_cmds_queued', 'Commands waiting to run', fn=lambda: { () : self.__executor.queued })
+        Metrics.gauge('sickle_gateway_latency_seconds', 'Discord gateway heartbeat latency', fn=lambda: { () : self.latency } if math.isfinite(self.latency) else {})
 
         # Needed for misc commands that upload images, downloads, etc
         os.makedirs('cache', exist_ok=True)
 
+        # Background tasks, held until done; the loop only keeps weak refs to them
+        self.__tasks = set()
+
         self.__bot_loop = asyncio.get_event_loop()
         self.__bot_loop.create_task(self.start(self.get_cfg('Core', 'discord_token')))
 
@@ -111,11 +203,45 @@ class DiscordBot(discord.Client):
 
 
     async def close(self):
-        await discord.Client.close(self)
+        if self.__closing:
+            return
+
+        self.__closing = True
         self.quit = True
 
+        # Saved first; `is_closed` is True as soon as disconnecting starts, and
+        # whatever is waiting on that may exit the process
+        try:
+            # Modules release what they hold first, they may still save things
+            for name, shutdown in self._shutdowns.items():
+                try: await shutdown['func'](self)
+                except Exception as e:
+                    self.__logger.exception(f'Shutdown "{name}" failed | {type(e)}: {e}')
+
+            try: await self.__db_counters.flush(self.__adb)
+            except Exception as e:
+                self.__logger.exception(f'Failed to save stat counters on close | {type(e)}: {e}')
+
+            # Flushes any pending db writes
+            self.__adb.close()
+            self.__db.close()
+
+            await discord.Client.close(self)
+        finally:
+            self.__closed.set()
+
+
+    def wait_closed(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits for `close` to be done, from another thread. Returns whether it is
+        """
+        return self.__closed.wait(timeout)
+
 
     async def on_message(self, msg: discord.Message):
+        if msg.author.id == self.user.id:
+            self.__sent_msgs.add(msg.id)
+
         try:
             if isinstance(msg.guild, type(None)):
                 await self.__handle_dm_msg(msg)
@@ -130,7 +256,8 @@ class DiscordBot(discord.Client):
         except Exception as e:
             await self.__report(
                 f'Error: `on_message` crash\n'
-                f'{Utils.format_exception(e)}'
+                f'{Utils.format_exception(e)}',
+                exc = e
             )
 
 
@@ -143,6 +270,9 @@ class DiscordBot(discord.Client):
 
 
     async def on_connect(self):
+        # New session, messages the bot sent in the meantime were not seen
+        self.__sent_msgs.reset()
+
         if self.__is_connected:
             return
 
@@ -155,7 +285,8 @@ class DiscordBot(discord.Client):
         self.__logger.info(f'Registering commands and creating tasks...')
 
         # Create main loop
-        self.loop.create_task(self.__main_loop())
+        self.__spawn(self.__main_loop(), name='main_loop')
+        self.__spawn(self.__loop_monitor.run(), name='loop_monitor')
 
         # Load commands and events
         cmd_path = self.CONFIG["Core"]["cmd_path"]
@@ -198,18 +329,21 @@ class DiscordBot(discord.Client):
                     self.__logger.info(f'    {name}')
 
                     if member['type'] == 'cmd':
-                        self._cmds[name] = member
+                        self._router.add(name, member, member.get('aliases', ()))
                         self._modules[module_file].append(name)
 
                     if member['type'] == 'event':
                         self._events[name] = member
 
+                    if member['type'] == 'shutdown':
+                        self._shutdowns[name] = member
+
                     continue
 
                 if not inspect.isfunction(member):
                     continue
 
-                if not name in self._cmds:
+                if isinstance(self._router.get(name), type(None)):
                     if f'_{class_name}__' in name:
                         # It's a private function, skip
                         continue
@@ -219,9 +353,9 @@ class DiscordBot(discord.Client):
                 self.__logger.warning(f'"{name}" command is not wrapped in `DiscordCmdBase.DiscordCmd`. "help" cmd usage info will be unavailable!')
 
                 self.__logger.info(f'    {name}')
-                self._cmds[name]['fn']      = member
-                self._cmds[name]['example'] = ''
-                self._cmds[name]['help']    = ''
+                self._router.builtins[name]['fn']      = member
+                self._router.builtins[name]['example'] = ''
+                self._router.builtins[name]['help']    = ''
                 self._modules[module_file].append(name)
 
 
@@ -239,14 +373,12 @@ class DiscordBot(discord.Client):
 
                 # Auto assign bot channel if not set and enable it in there
                 if 'bot' in channel.name:
-                    table = self.__db.table(self.__TABLE_BOT_CH)
-                    if not table.contains(doc_id=channel.guild.id):
+                    if not await self.__adb.contains(self.__TABLE_BOT_CH, doc_id=channel.guild.id):
                         self.__logger.info(f'Setting bot channel for {channel.guild.name}#{channel.name} | {channel.guild.id}.{channel.id}')
-                        table.insert(Document({ 'channel' : channel.id }, channel.guild.id))
+                        await self.__adb.insert(self.__TABLE_BOT_CH, Document({ 'channel' : channel.id }, channel.guild.id))
 
-                    table = self.__db.table(self.__TABLE_BOT_EN)
-                    if not table.contains(doc_id=channel.id):
-                        table.insert(Document({ 'chan_en' : True }, channel.id))
+                    if not await self.__adb.contains(self.__TABLE_BOT_EN, doc_id=channel.id):
+                        await self.__adb.insert(self.__TABLE_BOT_EN, Document({ 'chan_en' : True }, channel.id))
 
             if isinstance(self.__dbg_ch, type(None)):
                 self.__logger.info(f'Debug channel not found!')
@@ -258,7 +390,7 @@ class DiscordBot(discord.Client):
             for name, event in self._events.items():
                 if event['en']:
                     self.__logger.info(f'    {name}')
-                    self.__bot_loop.create_task(event['func'](self))
+                    self.__spawn(event['func'](self), name=f'event:{name}')
 
             # Present as ready
             self.__logger.info(f'Ready!')
@@ -268,7 +400,8 @@ class DiscordBot(discord.Client):
             await self.__report(
                 f'[ ERROR ]\n'
                 f'{e}\n'
-                f'{traceback.print_exception(e)}'
+                f'{traceback.print_exception(e)}',
+                exc = e
             )
 
 
@@ -277,21 +410,70 @@ class DiscordBot(discord.Client):
         return self.__db
 
 
+    @property
+    def executor_stats(self) -> dict:
+        """
+        Running and queued command counts
+        """
+        return self.__executor.stats
+
+
+    @property
+    def rate_limiter_stats(self) -> dict:
+        return self.__rate_limiter.stats
+
+
+    @property
+    def router_stats(self) -> dict:
+        return self._router.stats
+
+
+    @property
+    def loop_stats(self) -> dict:
+        """
+        Event loop lag histogram and what blocked the loop
+        """
+        return self.__loop_monitor.stats
+
+
+    @property
+    def adb(self) -> DbAsync:
+        """
+        Same db as `db`, but operations run off the event loop. Prefer this in commands and events.
+        """
+        return self.__adb
+
+
     @staticmethod
-    def get_cfg(src: str, key: str):
+    def get_cfg(src: str, key: str, default = KeyError):
+        """
+        Returns `default` if the setting is missing, or raises if no default is given
+        """
         try: return DiscordBot.CONFIG[src][key]
         except KeyError as e:
-           raise KeyError(f'Config get failure: {src}.{key}') from e
+            if default is not KeyError:
+                return default
 
+            raise KeyError(f'Config get failure: {src}.{key}') from e
 
-    def get_prev_msg(self, channel_id: int) -> Optional[discord.Message]:
-        try: return self.__prev_msg[channel_id]
-        except KeyError:
-            return None
+
+    def get_msg_history(self, channel_id: int) -> "list[MsgRecord]":
+        """
+        Recent messages seen in the channel, newest first
+        """
+        return self.__msg_history.get(channel_id)
+
+
+    def find_recent_images(self, channel_id: int, max_msgs: Optional[int] = None) -> "list[MsgAttachment]":
+        """
+        Image attachments of the newest message in the channel that has any,
+        looking at most `max_msgs` messages back
+        """
+        return self.__msg_history.find_images(channel_id, max_msgs)
 
 
     async def run_help_cmd(self: "DiscordBot", msg: discord.Message, cmd: str):
-        await self._cmds['help']['func'](self, msg, cmd)
+        await self._router.get('help')['func'](self, msg, cmd)
 
 
     async def __handle_dm_msg(self, msg: discord.Message):
@@ -300,8 +482,8 @@ class DiscordBot(discord.Client):
             return
 
         if msg.reference:
-            ref_msg = await msg.channel.fetch_message(msg.reference.message_id)
-            if ref_msg.author.id != self.user.id:
+            ref_msg = await self.__fetch_bot_ref(msg)
+            if isinstance(ref_msg, type(None)):
                 return
 
             # Message the devs if the user replies to the bot
@@ -323,7 +505,7 @@ class DiscordBot(discord.Client):
             return
 
         if not msg.content.startswith(self.cmd_prefix):
-            await msg.channel.send(self.db_get_info_msg())
+            await msg.channel.send(await self.db_get_info_msg())
             return
 
         cmd = msg.content.lstrip(self.cmd_prefix)
@@ -332,20 +514,44 @@ class DiscordBot(discord.Client):
         cmd  = args[0]
         args = args[1:]
 
-        if not cmd in self._cmds:
+        cmd_data = await self._router.resolve(cmd)
+        if isinstance(cmd_data, type(None)):
             self.__logger.debug(f'"{cmd}" invalid cmd')
             return
 
-        self.__bot_loop.create_task(self.__exec_cmd(cmd, msg, args))
+        cmd = self._router.name(cmd)
+
+        if self.__is_rate_limited(cmd, cmd_data, msg):
+            return
+
+        await self.__dispatch(cmd, cmd_data, msg, args)
         self.__logger.debug(f'{cmd}:@{msg.author.name} -> DM')
 
 
     async def __handle_server_msg(self, msg: discord.Message):
-        try: self.__prev_msg[msg.channel.id] = self.__curr_msg[msg.channel.id]
-        except KeyError:
-            pass
+        self.__msg_history.add(msg)
+
+        is_cmd = \
+            not msg.author.bot and \
+            not msg.reference  and \
+            msg.content.startswith(self.cmd_prefix)
+
+        if is_cmd:
+            cmd = msg.content.lstrip(self.cmd_prefix)
+
+            args = cmd.split(' ')
+            cmd  = args[0]
+            args = args[1:]
+
+            # Built-in command, or server specific custom command
+            cmd_data = await self._router.resolve(cmd, msg.guild.id)
+            cmd      = self._router.name(cmd)
+
+            # Checked before anything gets counted, so flooding costs next to nothing
+            if not isinstance(cmd_data, type(None)):
+                if self.__is_rate_limited(cmd, cmd_data, msg):
+                    return
 
-        self.__curr_msg[msg.channel.id] = msg
         self.__db_inc_msgs(msg, DiscordBot.__MSG_TYPE_TOTAL)
 
         if msg.author.bot:
@@ -355,7 +561,7 @@ class DiscordBot(discord.Client):
         self.__db_inc_msgs(msg, DiscordBot.__MSG_TYPE_USERS)
 
         if msg.reference:
-            try: ref_msg = await msg.channel.fetch_message(msg.reference.message_id)
+            try: ref_msg = await self.__fetch_bot_ref(msg)
             except discord.NotFound:
                 await self.__report(
                     f'[ WARNING ]\n'
@@ -371,7 +577,7 @@ class DiscordBot(discord.Client):
                 # TODO: Check if the bot have access to the channel
                 return
 
-            if ref_msg.author.id != self.user.id:
+            if isinstance(ref_msg, type(None)):
                 return
 
             # Message the devs if the user replies to the bot
@@ -392,31 +598,18 @@ class DiscordBot(discord.Client):
             await self.msg_dev(msg, f'{ref_content}\n')
             return
 
-        if not msg.content.startswith(self.cmd_prefix):
+        if not is_cmd:
             # Responding to commands only
             return
 
         self.__db_inc_msgs(msg, DiscordBot.__MSG_TYPE_CMDS)
 
-        cmd = msg.content.lstrip(self.cmd_prefix)
-
-        args = cmd.split(' ')
-        cmd  = args[0]
-        args = args[1:]
-
-        # Built-in command
-        if cmd in self._cmds:
-            self.__bot_loop.create_task(self.__exec_cmd(cmd, msg, args))
-            self.__logger.debug(f'{cmd}:@{msg.author.name} -> {msg.guild.name}:#{msg.channel.name}')
-            return
-
-        # Server specific custom command
-        if f'{msg.guild.id}_{cmd}' in self._cmds:
-            self.__bot_loop.create_task(self.__exec_cmd(f'{msg.guild.id}_{cmd}', msg, args))
-            self.__logger.debug(f'{cmd}:@{msg.author.name} -> {msg.guild.name}:#{msg.channel.name}')
+        if isinstance(cmd_data, type(None)):
+            self.__logger.debug(f'"{cmd}" invalid cmd')
             return
 
-        self.__logger.debug(f'"{cmd}" invalid cmd')
+        await self.__dispatch(cmd, cmd_data, msg, args)
+        self.__logger.debug(f'{cmd}:@{msg.author.name} -> {msg.guild.name}:#{msg.channel.name}')
 
 
     async def __handle_dev_ch_msg(self, msg: discord.Message):
@@ -425,8 +618,8 @@ class DiscordBot(discord.Client):
             return
 
         if msg.reference:
-            ref_msg = await msg.channel.fetch_message(msg.reference.message_id)
-            if ref_msg.author.id != self.user.id:
+            ref_msg = await self.__fetch_bot_ref(msg)
+            if isinstance(ref_msg, type(None)):
                 return
 
             # Message back the user if the dev replies to the bot
@@ -492,29 +685,81 @@ class DiscordBot(discord.Client):
         cmd  = args[0]
         args = args[1:]
 
-        # Built-in command
-        if cmd in self._cmds:
-            self.__bot_loop.create_task(self.__exec_cmd(cmd, msg, args))
-            self.__logger.debug(f'{cmd}:@{msg.author.name} -> DM')
+        # Built-in command, or server specific custom command
+        cmd_data = await self._router.resolve(cmd, msg.guild.id)
+        if isinstance(cmd_data, type(None)):
+            self.__logger.debug(f'"{cmd}" invalid cmd')
             return
 
-        # Server specific custom command
-        if f'{msg.guild.id}_{cmd}' in self._cmds:
-            self.__bot_loop.create_task(self.__exec_cmd(f'{msg.guild.id}_{cmd}', msg, args))
-            self.__logger.debug(f'{cmd}:@{msg.author.name} -> DM')
-            return
+        cmd = self._router.name(cmd)
+
+        await self.__dispatch(cmd, cmd_data, msg, args)
+        self.__logger.debug(f'{cmd}:@{msg.author.name} -> DM')
+
+
+    def __time_sends(self):
+        """
+        Measures how long sending messages takes. All sends go through the
+        http client's `send_message`.
+        """
+        send_message = self.http.send_message
+
+        async def timed_send_message(*args, **kwargs):
+            start = time.perf_counter()
+            try: return await send_message(*args, **kwargs)
+            finally:
+                DiscordBot.__METRIC_SEND_TIME.observe(time.perf_counter() - start)
 
-        self.__logger.debug(f'"{cmd}" invalid cmd')
+        self.http.send_message = timed_send_message
+
+
+    async def __fetch_bot_ref(self, msg: discord.Message) -> Optional[discord.Message]:
+        """
+        Message `msg` replies to if the bot sent it, None otherwise. Only
+        fetches the message if discord didn't include it and the bot could have
+        sent it. Raises `discord.NotFound` if it can't be fetched.
+        """
+        ref = msg.reference
+
+        if isinstance(ref.resolved, discord.Message):
+            return ref.resolved if ref.resolved.author.id == self.user.id else None
+
+        if isinstance(ref.resolved, discord.DeletedReferencedMessage) or isinstance(ref.message_id, type(None)):
+            return None
+
+        if self.__sent_msgs.contains(ref.message_id) is False:
+            return None
+
+        ref_msg = await msg.channel.fetch_message(ref.message_id)
+        return ref_msg if ref_msg.author.id == self.user.id else None
 
 
     async def __main_loop(self):
         self.__logger.info('Running main loop...')
 
+        counters_flush_time = time.time()
+
         while True:
             await asyncio.sleep(1)
 
+            if time.time() - counters_flush_time >= self.__db_counters_interval:
+                counters_flush_time = time.time()
+
+                try: await self.__db_counters.flush(self.__adb)
+                except Exception as e:
+                    await self.__report(
+                        f'[ ERROR ]\n'
+                        f'Failed to save stat counters\n'
+                        f'{Utils.format_exception(e)}',
+                        exc = e
+                    )
+
+            if self.__reports.due():
+                await self.__reports.flush()
+
             if self.quit:
                 await self.__report('Exiting discord loop...')
+                await self.__reports.flush()
                 await self.close()
                 return
 
@@ -522,19 +767,75 @@ class DiscordBot(discord.Client):
                 continue
 
 
-    async def __exec_cmd(self, cmd: str, msg: discord.Message, args: list):
-        with warnings.catch_warnings(record=True) as w:
+    async def __dispatch(self, cmd: str, cmd_data: dict, msg: discord.Message, args: list):
+        """
+        Hands the command to the executor, or tells the user the bot is busy if it's full
+        """
+        concurrency = cmd_data.get('concurrency', None)
+        if self.__executor.submit(lambda: self.__exec_cmd(cmd, cmd_data, msg, args), concurrency, f'cmd:{cmd}'):
+            return
+
+        self.__logger.debug(f'{cmd}:@{msg.author.name} | Rejected, command queue is full ({self.__executor.queued} queued)')
+        await self.__reply_busy(msg, 'Too many commands', 'The bot is handling too many commands right now, try again in a bit')
+
+
+    def __is_rate_limited(self, cmd: str, cmd_data: dict, msg: discord.Message) -> bool:
+        """
+        Takes the command's cost from the user's, guild's and command's rate limits.
+        The bot admin is not limited.
+        """
+        if msg.author.id == self.get_cfg('Core', 'admin_user_id', None):
+            return False
+
+        guild_id = msg.guild.id if not isinstance(msg.guild, type(None)) else None
+        cost     = cmd_data.get('cost', 1)
+
+        if self.__rate_limiter.allow(msg.author.id, guild_id, cmd, cost):
+            return False
+
+        self.__logger.debug(f'{cmd}:@{msg.author.name} | Rejected, rate limited')
+        self.__spawn(self.__reply_busy(msg, 'Slow down', 'Too many commands, try again in a bit'))
+        return True
+
+
+    def __spawn(self, coro: Coroutine, name: Optional[str] = None) -> asyncio.Task:
+        task = self.__bot_loop.create_task(coro, name=name)
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+        return task
+
+
+    async def __reply_busy(self, msg: discord.Message, title: str, text: str):
+        # Don't add to the flood with a reply to every rejected command
+        now = time.time()
+        if now - self.__busy_replies.get(msg.channel.id, 0) < DiscordBot.__BUSY_REPLY_INTERVAL:
+            return
+
+        if len(self.__busy_replies) > 1024:
+            self.__busy_replies = { channel_id : t for channel_id, t in self.__busy_replies.items() if now - t < DiscordBot.__BUSY_REPLY_INTERVAL }
+
+        self.__busy_replies[msg.channel.id] = now
+
+        try:
+            embed = discord.Embed(type='rich', color=0xFF9900, title='⏳ Busy')
+            embed.add_field(name=title, value=text)
+            await msg.channel.send(None, embed=embed)
+        except discord.HTTPException:
+            pass
+
+
+    async def __exec_cmd(self, cmd: str, cmd_data: dict, msg: discord.Message, args: list):
+        with Diagnostics.capture() as w:
             if not msg.author.guild_permissions.manage_channels:
-                if not self._cmds[cmd]['anywhere']:
-                    table = self.__db.table(self.__TABLE_BOT_EN)
-                    if not table.contains(doc_id=msg.channel.id):
+                if not cmd_data['anywhere']:
+                    data = await self.__adb.get(self.__TABLE_BOT_EN, doc_id=msg.channel.id)
+                    if isinstance(data, type(None)):
                         self.__logger.debug(
                             f'{msg.guild.name}:#{msg.channel.name} @{msg.author.name} | "{self.cmd_prefix}{cmd} {" ".join(args)}"\n'
                             'Ignoring command because channel does not have `bot_en` and user has no manage channel permission.'
                         )
                         return
                     else:
-                        data = table.get(doc_id=msg.channel.id)
                         if not data['chan_en']:
                             self.__logger.debug(
                                 f'{msg.guild.name}:#{msg.channel.name} @{msg.author.name} | "{self.cmd_prefix}{cmd} {" ".join(args)}"\n'
@@ -544,12 +845,20 @@ class DiscordBot(discord.Client):
 
             self.__db_inc_cmd_count(msg.guild.id, cmd)
 
+            # Custom commands are per guild, they'd make too many labels
+            metric_cmd = cmd if self._router.get(cmd) is cmd_data else 'custom'
+            start = time.perf_counter()
+
             try:
                 self.__logger.debug(f'cmd: {cmd}    msg: {msg}')
-                await self._cmds[cmd]['func'](self, msg, *args)
+                await cmd_data['func'](self, msg, *args)
             except discord.Forbidden:
+                DiscordBot.__METRIC_CMD_TIME.observe(time.perf_counter() - start, metric_cmd)
                 return
             except Exception as e:
+                DiscordBot.__METRIC_CMD_TIME.observe(time.perf_counter() - start, metric_cmd)
+                DiscordBot.__METRIC_CMD_ERRORS.inc(metric_cmd)
+
                 try:
                     embed = discord.Embed(type='rich', color=0xFF9900, title='⚠ Error')
                     embed.add_field(name='Something went wrong', value=f'Do not panic! The developers have been notified.')
@@ -570,36 +879,58 @@ class DiscordBot(discord.Client):
                 await self.__report(
                     f'[ ERROR ]\n'
                     f'{server_name}:#{channel_name} @{msg.author.name} | "{self.cmd_prefix}{cmd} {" ".join(args)}"\n'
-                    f'{err}\n'
+                    f'{err}\n',
+                    exc = e
                 )
 
+            else:
+                DiscordBot.__METRIC_CMD_TIME.observe(time.perf_counter() - start, metric_cmd)
+
             # Process warnings
-            for warning in w:
-                file = warning.filename.split('\\')[-1]
-                err = f'  {file}, line {warning.lineno}'
+            try: server_name = msg.guild.name
+            except AttributeError:
+                server_name = 'DM'
 
-                try: server_name = msg.guild.name
-                except AttributeError:
-                    server_name = 'DM'
+            try: channel_name = msg.channel.name
+            except AttributeError:
+                channel_name = ''
 
-                try: channel_name = msg.channel.name
-                except AttributeError:
-                    channel_name = ''
+            await self.report_warnings(f'{server_name}:#{channel_name} @{msg.author.name} | "{self.cmd_prefix}{cmd} {" ".join(args)}"', w)
 
-                await self.__report(
-                    f'[ WARNING ]\n'
-                    f'{server_name}:#{channel_name} @{msg.author.name} | "{self.cmd_prefix}{cmd} {" ".join(args)}"\n'
-                    f'Warning: {warning.message}\n'
-                    f'{err}\n'
-                )
 
-            w.clear()
+    async def report_warnings(self, source: str, records: list):
+        """
+        Reports warnings collected by `Diagnostics.capture()` to the debug channel
+        """
+        for warning in records:
+            file = warning.filename.split('\\')[-1]
+            err = f'  {file}, line {warning.lineno}'
 
+            await self.__report(
+                f'[ WARNING ]\n'
+                f'{source}\n'
+                f'Warning: {warning.message}\n'
+                f'{err}\n',
+                fingerprint = ( warning.category.__qualname__, warning.filename, warning.lineno )
+            )
 
-    async def __report(self, msg: str, log: bool = True):
+
+    async def __report(self, msg: str, log: bool = True, exc: Optional[BaseException] = None, fingerprint: Optional[tuple] = None):
+        """
+        Posts `msg` to the debug channel with the next report digest. Repeats
+        of the same report are counted instead of posted again; reports for an
+        exception `exc` are the same if raised from the same place.
+        """
         if log:
             self.__logger.warn(msg)
 
+        if not isinstance(exc, type(None)) and isinstance(fingerprint, type(None)):
+            fingerprint = ReportCoalescer.fingerprint(exc)
+
+        self.__reports.add(msg, fingerprint)
+
+
+    async def __send_report(self, msg: str):
         if self.__dbg_ch is None:
             self.__logger.warn(
                 f'Unable to send message to debug channel - Does channel exist?\n'
@@ -660,6 +991,97 @@ class DiscordBot(discord.Client):
         await self.__dbg_ch.send(None, embed=embed)
 
 
+    def db_get_storage_stats(self) -> dict:
+        if isinstance(self.__db, (DbSqlite, DbSharded)):
+            return self.__db.stats
+
+        return self.__db.storage.stats
+
+
+    def __open_db(self) -> "DbTinyDB | DbSqlite | DbSharded":
+        backend   = self.get_cfg('Db', 'backend', 'json')
+        json_path = self.get_cfg('Db', 'path', 'db.json')
+
+        serializer = DbSerializer.get(self.get_cfg('Db', 'serializer', 'auto'))
+
+        self.__logger.info(f'db backend: {backend} | serializer: {serializer.name}')
+
+        match backend:
+            case 'json':
+                return DbTinyDB(
+                    json_path,
+                    indexes    = self.__DB_INDEXES,
+                    serializer = serializer,
+                    storage    = DbThreadSafeMiddleware(
+                        DbAtomicJsonStorage,
+                        write_behind   = self.get_cfg('Db', 'write_behind', False),
+                        flush_interval = self.get_cfg('Db', 'flush_interval', 5.0)
+                    )
+                )
+
+            case 'journal':
+                # Changes are appended to a journal; the flush thread compacts it into the db file
+                return DbJournalTinyDB(
+                    json_path,
+                    indexes    = self.__DB_INDEXES,
+                    serializer = serializer,
+                    fsync      = self.get_cfg('Db', 'journal_fsync', False),
+                    storage    = DbThreadSafeMiddleware(
+                        DbJournalStorage,
+                        write_behind   = True,
+                        flush_interval = self.get_cfg('Db', 'compact_interval', 60.0)
+                    )
+                )
+
+            case 'sqlite':
+                sqlite_path = self.get_cfg('Db', 'sqlite_path', 'db.sqlite')
+
+                # One-shot import of the existing json db. It's made under a temp name and only
+                # moved into place once done, so an import cut short gets redone on next start
+                if not os.path.exists(sqlite_path) and os.path.exists(json_path):
+                    tmp_path = f'{sqlite_path}.tmp'
+                    for path in [ tmp_path, f'{tmp_path}-wal', f'{tmp_path}-shm' ]:
+                        if os.path.exists(path):
+                            os.remove(path)
+
+                    db = DbSqlite(tmp_path, indexes=self.__DB_INDEXES)
+                    try: db.migrate_from_json(json_path)
+                    finally:
+                        db.close()
+
+                    os.replace(tmp_path, sqlite_path)
+
+                return DbSqlite(sqlite_path, indexes=self.__DB_INDEXES)
+
+            case 'sharded':
+                shard_path = self.get_cfg('Db', 'shard_path', 'db')
+
+                # One-shot import of the existing json db. Same as for sqlite, it's made in a temp
+                # dir that's only moved into place once done
+                if not os.path.exists(shard_path) and os.path.exists(json_path):
+                    tmp_path = f'{shard_path}.tmp'
+                    if os.path.exists(tmp_path):
+                        shutil.rmtree(tmp_path)
+
+                    db = DbSharded(tmp_path, self.__DB_SHARDS, indexes=self.__DB_INDEXES, serializer=serializer)
+                    try: db.migrate_from_json(json_path)
+                    finally:
+                        db.close()
+
+                    os.rename(tmp_path, shard_path)
+
+                return DbSharded(
+                    shard_path, self.__DB_SHARDS,
+                    indexes        = self.__DB_INDEXES,
+                    max_loaded     = self.get_cfg('Db', 'max_loaded_shards', 256),
+                    write_behind   = self.get_cfg('Db', 'write_behind', False),
+                    flush_interval = self.get_cfg('Db', 'flush_interval', 5.0),
+                    serializer     = serializer
+                )
+
+        raise ValueError(f'Invalid db backend: "{backend}"')
+
+
     def get_version(self) -> str:
         try: repo = git.Repo('.')
         except git.NoSuchPathError:
@@ -669,56 +1091,36 @@ class DiscordBot(discord.Client):
         return time.strftime('v%Y.%m.%d', time.gmtime(date))
 
 
-    def __db_inc_msgs(self, msg: discord.Message, msg_type: int):
+    def __db_inc_msgs(self, msg: discord.Message, msg_type: str):
         """
-        Data fmt:
-            "bot_stats" : {
-                [msg.guild.id: int] : {
-                    "total_msgs" : int,
-                    "user_msgs"  : int,
-                    "total_cmds" : int,
-                }
-            }
+        Counted in memory, see `DbCounters` for the persisted data fmt
         """
         if isinstance(msg.guild, type(None)):
             # Probably private DM
             return
 
-        table = self.__db.table(self.__TABLE_BOT_STATS)
-        entry = table.get(doc_id=msg.guild.id)
-
-        if isinstance(entry, type(None)):
-            data = {
-                'total_msgs' : 1 if msg_type == DiscordBot.__MSG_TYPE_TOTAL else 0,
-                'user_msgs'  : 1 if msg_type == DiscordBot.__MSG_TYPE_USERS else 0,
-                'total_cmds' : 1 if msg_type == DiscordBot.__MSG_TYPE_CMDS  else 0,
-            }
-            table.insert(Document(data, doc_id=msg.guild.id))
-            return
+        self.__db_counters.inc_msgs(msg.guild.id, msg_type)
 
-        if msg_type == DiscordBot.__MSG_TYPE_TOTAL: entry['total_msgs'] += 1
-        if msg_type == DiscordBot.__MSG_TYPE_USERS: entry['user_msgs'] += 1
-        if msg_type == DiscordBot.__MSG_TYPE_CMDS:  entry['total_cmds'] += 1
 
-        table.update(entry)
+    def __db_inc_cmd_count(self, server_id: int, cmd: str):
+        """
+        Counted in memory, see `DbCounters` for the persisted data fmt
+        """
+        self.__db_counters.inc_cmd(server_id, cmd)
 
 
-    def __db_inc_cmd_count(self, server_id: int, cmd: str):
+    def db_get_bot_stats(self, server_id: int) -> Optional[dict]:
         """
         Data fmt:
-            "cmd_stats": {
-                [doc_id: int] : { 'cmd' : (cmd: str), 'server' : (server_id: int), 'count' : (count: int) },
-                [doc_id: int] : { 'cmd' : (cmd: str), 'server' : (server_id: int), 'count' : (count: int) },
-                ...
+            "bot_stats" : {
+                [msg.guild.id: int] : {
+                    "total_msgs" : int,
+                    "user_msgs"  : int,
+                    "total_cmds" : int,
+                }
             }
         """
-        table = self.__db.table(self.__TABLE_CMD_STATS)
-        entry = table.get(tinydb.Query().fragment({'cmd' : cmd, 'server' : server_id}))
-
-        if not entry:
-            table.insert({ 'cmd' : cmd, 'server' : server_id, 'count' : 1 })
-        else:
-            table.update({ 'count' : entry['count'] + 1 }, doc_ids=[ entry.doc_id ])
+        return self.__db_counters.get_bot_stats(server_id)
 
 
     def db_get_cmd_server_count(self, server_id: int, cmd: str) -> int:
@@ -730,9 +1132,7 @@ class DiscordBot(discord.Client):
                 ...
             }
         """
-        table = self.__db.table(self.__TABLE_CMD_STATS)
-        entry = table.get(tinydb.Query().fragment({'cmd' : cmd, 'server' : server_id}))
-        return 0 if not entry else entry['count']
+        return self.__db_counters.get_cmd_server_count(server_id, cmd)
 
 
     def db_get_cmd_total_count(self, cmd: str) -> int:
@@ -744,12 +1144,10 @@ class DiscordBot(discord.Client):
                 ...
             }
         """
-        table = self.__db.table(self.__TABLE_CMD_STATS)
-        entries = table.search(tinydb.Query().fragment({'cmd' : cmd}))
-        return sum([ entry['count'] for entry in entries ])
+        return self.__db_counters.get_cmd_total_count(cmd)
 
 
-    def db_set_info_msg(self, msg: str):
+    async def db_set_info_msg(self, msg: str):
         """
         Data fmt:
             "bot_cfg": {
@@ -758,16 +1156,15 @@ class DiscordBot(discord.Client):
                 }
             }
         """
-        table = self.__db.table(self.__TABLE_BOT_CFG)
-        entry = table.get(doc_id=DiscordBot.__DB_BOT_CFG_INFO_MSG)
+        entry = await self.__adb.get(self.__TABLE_BOT_CFG, doc_id=DiscordBot.__DB_BOT_CFG_INFO_MSG)
 
         if not entry:
-            table.insert({ 'info' : msg })
+            await self.__adb.insert(self.__TABLE_BOT_CFG, { 'info' : msg })
         else:
-            table.update({ 'info' : msg }, doc_ids=[ DiscordBot.__DB_BOT_CFG_INFO_MSG ])
+            await self.__adb.update(self.__TABLE_BOT_CFG, { 'info' : msg }, doc_ids=[ DiscordBot.__DB_BOT_CFG_INFO_MSG ])
 
 
-    def db_get_info_msg(self) -> str:
+    async def db_get_info_msg(self) -> str:
         """
         Data fmt:
             "bot_cfg": {
@@ -776,8 +1173,7 @@ class DiscordBot(discord.Client):
                 }
             }
         """
-        table = self.__db.table(self.__TABLE_BOT_CFG)
-        entry = table.get(doc_id=DiscordBot.__DB_BOT_CFG_INFO_MSG)
+        entry = await self.__adb.get(self.__TABLE_BOT_CFG, doc_id=DiscordBot.__DB_BOT_CFG_INFO_MSG)
 
         if not entry:
             return 'Use ">>devs {msg}" to notify devs of any issues'
@@ -12,6 +12,7 @@ import logging
 import fastapi
 
 from .DiscordBot import DiscordBot
+from .metrics import Metrics
 from .utils import Utils
 
 
@@ -132,8 +133,10 @@ class FeedServer():
     __logger = logging.getLogger(__qualname__)
     __app    = fastapi.FastAPI()
 
+    __METRIC_POSTS = Metrics.counter('sickle_feed_posts_total', 'Feed posts processed', ( 'route', 'status' ))
+
     @staticmethod
-    async def init(callback: Callable[[str, dict], dict]):
+    async def init(callback: Callable[[str, dict], dict], bot: DiscordBot):
         """
         Intializes the Sickle bot API server
 
@@ -141,8 +144,12 @@ class FeedServer():
         ======
         callback: Callable
             Callback to function that would process the discord bot request
+
+        bot: DiscordBot
+            Bot whose stats the server reports
         """
         FeedServer.callback = callback
+        FeedServer.bot      = bot
 
         api_port = DiscordBot.get_cfg('Core', 'api_port')
         FeedServer.__logger.info(f'Initializing server: 127.0.0.1:{api_port}')
@@ -159,17 +166,21 @@ class FeedServer():
 
         try: await FeedServer.callback(route, data)
         except KeyError as e:
+            FeedServer.__METRIC_POSTS.inc(route, 'err')
             warnings.warn(
                 f'Error processing "{route}":\n'
                 f'Raised {type(e)}: {e}\n'
                 f'Data: {data}'
             )
         except Exception as e:
+            FeedServer.__METRIC_POSTS.inc(route, 'err')
             warnings.warn(
                 f'Error processing "{route}":\n'
                 f'{Utils.format_exception(e)}'
             )
             return { 'status' : 'err' }
+        else:
+            FeedServer.__METRIC_POSTS.inc(route, 'ok')
 
         return { 'status' : 'ok' }
 
@@ -180,6 +191,18 @@ class FeedServer():
         return { 'status' : 'ok' }
 
 
+    @staticmethod
+    @__app.get('/metrics')  # type: ignore
+    async def metrics():
+        return fastapi.responses.PlainTextResponse(Metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+    @staticmethod
+    @__app.get('/admin/loop')  # type: ignore
+    async def loop_stats():
+        return FeedServer.bot.loop_stats
+
+
     @staticmethod
     @__app.put('/admin/shutdown')  # type: ignore
     async def shutdown():
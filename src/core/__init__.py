@@ -2,3 +2,5 @@ from .utils import DiscordCmdBase
 from .Logger import Logger
 from .DiscordBot import DiscordBot
 from .FeedServer import FeedServer
+from .scheduler import Scheduler
+from .diagnostics import Diagnostics
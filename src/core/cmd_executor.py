@@ -0,0 +1,145 @@
+from typing import Callable, Coroutine, Optional
+
+import asyncio
+import logging
+import collections
+
+
+class CmdExecutor():
+    """
+    Runs commands as tasks with a cap on how many run at once
+
+    At most `max_running` commands run concurrently. Commands can also belong to
+    a concurrency class with a lower cap of its own, ex: `{ 'image' : 4 }`.
+    Commands over a cap wait in a FIFO queue of at most `max_queued` entries; a
+    queued command only waits for its own class, so a backlog of image commands
+    doesn't hold up the rest. Once the queue is full, new commands are rejected
+    and it's up to the caller to tell the user.
+    """
+
+    def __init__(self, max_running: int = 32, max_queued: int = 256, classes: Optional[dict] = None):
+        """
+        Params
+        ======
+        max_running: int
+            Max commands running at once
+
+        max_queued: int
+            Max commands waiting to run
+
+        classes: dict
+            Concurrency class name -> max commands of that class running at once
+        """
+        self.__logger = logging.getLogger(__class__.__name__)
+
+        self.__max_running = max_running
+        self.__max_queued  = max_queued
+        self.__classes     = dict(classes) if not isinstance(classes, type(None)) else {}
+
+        self.__running = 0
+        self.__class_running = collections.Counter()
+        self.__class_queued  = collections.Counter()
+
+        # (class, coroutine function, task name)
+        self.__queue = collections.deque()
+
+        # Keeps running tasks referenced until they are done
+        self.__tasks = set()
+
+        self.__stats = {
+            'started'  : 0,
+            'deferred' : 0,  # Had to wait in the queue
+            'rejected' : 0,
+        }
+
+
+    def submit(self, fn: Callable[[], Coroutine], cls: Optional[str] = None, name: Optional[str] = None) -> bool:
+        """
+        Runs `fn()` as a task named `name` now or once there is room. Returns
+        False if it was rejected because the queue is full.
+        """
+        if self.__can_run(cls):
+            self.__start(fn, cls, name)
+            return True
+
+        if len(self.__queue) >= self.__max_queued:
+            self.__stats['rejected'] += 1
+            return False
+
+        self.__queue.append((cls, fn, name))
+        self.__class_queued[cls] += 1
+        self.__stats['deferred'] += 1
+        return True
+
+
+    @property
+    def running(self) -> int:
+        return self.__running
+
+
+    @property
+    def queued(self) -> int:
+        return len(self.__queue)
+
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'running'     : self.__running,
+            'queued'      : len(self.__queue),
+            'max_running' : self.__max_running,
+            'max_queued'  : self.__max_queued,
+            **self.__stats,
+            'classes'     : {
+                cls : { 'running' : self.__class_running[cls], 'queued' : self.__class_queued[cls], 'max_running' : limit }
+                for cls, limit in self.__classes.items()
+            },
+        }
+
+
+    def __can_run(self, cls: Optional[str]) -> bool:
+        if self.__running >= self.__max_running:
+            return False
+
+        if cls in self.__classes and self.__class_running[cls] >= self.__classes[cls]:
+            return False
+
+        return True
+
+
+    def __start(self, fn: Callable[[], Coroutine], cls: Optional[str], name: Optional[str]):
+        self.__running += 1
+        self.__class_running[cls] += 1
+        self.__stats['started'] += 1
+
+        task = asyncio.get_running_loop().create_task(fn(), name=name)
+        self.__tasks.add(task)
+        task.add_done_callback(lambda task: self.__on_done(task, cls))
+
+
+    def __on_done(self, task: asyncio.Task, cls: Optional[str]):
+        self.__tasks.discard(task)
+
+        self.__running -= 1
+        self.__class_running[cls] -= 1
+
+        if not task.cancelled() and not isinstance(task.exception(), type(None)):
+            self.__logger.error(f'Command task failed | {type(task.exception())}: {task.exception()}')
+
+        self.__start_queued()
+
+
+    def __start_queued(self):
+        if len(self.__queue) == 0 or self.__running >= self.__max_running:
+            return
+
+        # First queued command whose class has room
+        for i, (cls, fn, name) in enumerate(self.__queue):
+            if not self.__can_run(cls):
+                continue
+
+            del self.__queue[i]
+            self.__class_queued[cls] -= 1
+
+            self.__start(fn, cls, name)
+            return
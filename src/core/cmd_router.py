@@ -0,0 +1,227 @@
+from typing import Awaitable, Callable, Optional
+
+import asyncio
+import logging
+import collections
+import time
+
+
+class CmdRouter():
+    """
+    Finds the command a message refers to
+
+    Built-in commands live in one namespace shared by all guilds. Each guild
+    also has a namespace of its own custom commands, which gets loaded through
+    `loader` the first time something is looked up in that guild. At most
+    `max_loaded` guild namespaces are kept, least recently used ones get
+    dropped and are loaded again when needed. Guilds without custom commands
+    get an empty namespace, so unknown commands don't hit the db every time.
+
+    Built-in commands take precedence, custom commands can't shadow them.
+    Commands can have aliases, which resolve to the same command.
+    """
+
+    def __init__(self, max_loaded: int = 1024):
+        """
+        Params
+        ======
+        max_loaded: int
+            Max guild namespaces kept in memory at once
+        """
+        self.__logger = logging.getLogger(__class__.__name__)
+
+        # Name -> cmd
+        self.__builtins = {}
+
+        # Alias -> name
+        self.__aliases = {}
+
+        # Guild id -> { name : cmd }
+        self.__guilds = collections.OrderedDict()
+        self.__max_loaded = max_loaded
+
+        # Guild id -> future of the namespace being loaded
+        self.__loading = {}
+        self.__loader = None
+
+        self.__stats = {
+            'lookups'       : 0,
+            'builtin_hits'  : 0,
+            'guild_hits'    : 0,
+            'misses'        : 0,
+            'loads'         : 0,
+            'load_errors'   : 0,
+            'evictions'     : 0,
+            'lookup_time'   : 0.0,  # Excluding loads
+            'load_time'     : 0.0,
+            'max_load_time' : 0.0,
+        }
+
+
+    def add(self, name: str, cmd: dict, aliases: "list[str]" = ()):
+        """
+        Registers a built-in command
+        """
+        self.__builtins[name] = cmd
+
+        for alias in aliases:
+            if alias in self.__builtins or alias in self.__aliases:
+                self.__logger.warning(f'Alias "{alias}" of "{name}" is already taken, skipping')
+                continue
+
+            self.__aliases[alias] = name
+
+
+    def set_loader(self, loader: Callable[[int], Awaitable[dict]]):
+        """
+        Sets the function loading a guild's custom commands. It's given the
+        guild id and returns a dict of name -> cmd.
+        """
+        self.__loader = loader
+        self.invalidate()
+
+
+    @property
+    def builtins(self) -> dict:
+        """
+        Built-in commands by name, without aliases
+        """
+        return self.__builtins
+
+
+    def get(self, name: str) -> Optional[dict]:
+        """
+        Built-in command by name or alias
+        """
+        cmd = self.__builtins.get(name, None)
+        if not isinstance(cmd, type(None)):
+            return cmd
+
+        name = self.__aliases.get(name, None)
+        if isinstance(name, type(None)):
+            return None
+
+        return self.__builtins[name]
+
+
+    def name(self, name: str) -> str:
+        """
+        Built-in command name an alias refers to, or `name` itself
+        """
+        return self.__aliases.get(name, name)
+
+
+    async def resolve(self, name: str, guild_id: Optional[int] = None) -> Optional[dict]:
+        """
+        Built-in command, or the guild's custom command, by name. `guild_id` is
+        None for DMs, which only have built-in commands.
+        """
+        start = time.perf_counter()
+        self.__stats['lookups'] += 1
+
+        cmd = self.get(name)
+        if not isinstance(cmd, type(None)):
+            self.__stats['builtin_hits'] += 1
+            self.__stats['lookup_time'] += time.perf_counter() - start
+            return cmd
+
+        if isinstance(guild_id, type(None)):
+            self.__stats['misses'] += 1
+            self.__stats['lookup_time'] += time.perf_counter() - start
+            return None
+
+        cmds = self.__guilds.get(guild_id, None)
+        if isinstance(cmds, type(None)):
+            self.__stats['lookup_time'] += time.perf_counter() - start
+            cmds  = await self.__load(guild_id)
+            start = time.perf_counter()
+        else:
+            self.__guilds.move_to_end(guild_id)
+
+        cmd = cmds.get(name, None)
+        if isinstance(cmd, type(None)):
+            self.__stats['misses'] += 1
+        else:
+            self.__stats['guild_hits'] += 1
+
+        self.__stats['lookup_time'] += time.perf_counter() - start
+        return cmd
+
+
+    def invalidate(self, guild_id: Optional[int] = None):
+        """
+        Drops the guild's custom commands, or every guild's if no guild is
+        given. They get loaded again on next lookup. To be called whenever a
+        guild's custom commands change.
+        """
+        if isinstance(guild_id, type(None)):
+            self.__guilds.clear()
+            self.__loading.clear()
+            return
+
+        self.__guilds.pop(guild_id, None)
+        self.__loading.pop(guild_id, None)
+
+
+    @property
+    def stats(self) -> dict:
+        return {
+            **self.__stats,
+            'builtins' : len(self.__builtins),
+            'aliases'  : len(self.__aliases),
+            'loaded'   : len(self.__guilds),
+            'loading'  : len(self.__loading),
+        }
+
+
+    async def __load(self, guild_id: int) -> dict:
+        if isinstance(self.__loader, type(None)):
+            return {}
+
+        # Lookups in the same guild while it's loading wait on the same load
+        future = self.__loading.get(guild_id, None)
+        if not isinstance(future, type(None)):
+            try: return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+
+                # The load got cancelled, count as not found
+                return {}
+
+        future = asyncio.get_running_loop().create_future()
+        self.__loading[guild_id] = future
+
+        start = time.perf_counter()
+
+        try: cmds = dict(await self.__loader(guild_id))
+        except Exception as e:
+            self.__logger.error(f'Failed to load custom commands for {guild_id} | {type(e)}: {e}')
+            self.__stats['load_errors'] += 1
+
+            # Not cached, tried again on next lookup
+            cmds = {}
+            future.set_result(cmds)
+        else:
+            load_time = time.perf_counter() - start
+            self.__stats['loads'] += 1
+            self.__stats['load_time'] += load_time
+            self.__stats['max_load_time'] = max(self.__stats['max_load_time'], load_time)
+
+            # Only keep it if it wasn't invalidated while loading
+            if self.__loading.get(guild_id, None) is future:
+                self.__guilds[guild_id] = cmds
+                while len(self.__guilds) > self.__max_loaded:
+                    self.__guilds.popitem(last=False)
+                    self.__stats['evictions'] += 1
+
+            future.set_result(cmds)
+        finally:
+            if self.__loading.get(guild_id, None) is future:
+                del self.__loading[guild_id]
+
+            # Cancelled while loading
+            if not future.done():
+                future.cancel()
+
+        return cmds
@@ -0,0 +1,143 @@
+from typing import Callable
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import time
+
+from .metrics import Metrics
+
+
+class DbAsync():
+    """
+    Async facade over the bot's db that keeps storage I/O off the event loop
+
+    Every operation runs on one dedicated db thread, in the order it was
+    submitted. At most `max_queued` operations can be pending at once; callers
+    beyond that wait for a free slot, which keeps a burst of commands from
+    piling up unbounded work behind a slow disk.
+
+    Usage:
+        entry = await self.adb.get('bot_en', doc_id=msg.channel.id)
+        await self.adb.insert('reminders', Document(data, doc_id=msg.id))
+    """
+
+    __METRIC_OP_TIME = Metrics.histogram('sickle_db_op_duration_seconds', 'Time db operations took, including time queued', ( 'op', ),
+        buckets = ( 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5 ))
+
+    def __init__(self, db, max_queued: int = 256):
+        self.__logger = logging.getLogger(__class__.__name__)
+
+        self.__db       = db
+        self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+        self.__slots    = asyncio.Semaphore(max_queued)
+
+        self.__depth     = 0
+        self.__depth_max = 0
+        self.__waiting   = 0
+
+        # op name -> { 'count' : int, 'time' : float, 'max' : float }
+        self.__op_stats = {}
+
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """
+        Runs `fn(*args, **kwargs)` on the db thread
+        """
+        return await self.__submit(getattr(fn, '__name__', 'run'), functools.partial(fn, *args, **kwargs))
+
+
+    async def get(self, table: str, *args, **kwargs):
+        return await self.__table_op(table, 'get', *args, **kwargs)
+
+
+    async def contains(self, table: str, *args, **kwargs) -> bool:
+        return await self.__table_op(table, 'contains', *args, **kwargs)
+
+
+    async def search(self, table: str, *args, **kwargs) -> list:
+        return await self.__table_op(table, 'search', *args, **kwargs)
+
+
+    async def all(self, table: str) -> list:
+        return await self.__table_op(table, 'all')
+
+
+    async def insert(self, table: str, *args, **kwargs) -> int:
+        return await self.__table_op(table, 'insert', *args, **kwargs)
+
+
+    async def insert_multiple(self, table: str, *args, **kwargs) -> list:
+        return await self.__table_op(table, 'insert_multiple', *args, **kwargs)
+
+
+    async def update(self, table: str, *args, **kwargs) -> list:
+        return await self.__table_op(table, 'update', *args, **kwargs)
+
+
+    async def upsert(self, table: str, *args, **kwargs) -> list:
+        return await self.__table_op(table, 'upsert', *args, **kwargs)
+
+
+    async def remove(self, table: str, *args, **kwargs) -> list:
+        return await self.__table_op(table, 'remove', *args, **kwargs)
+
+
+    def close(self):
+        """
+        Waits for pending operations to finish
+        """
+        self.__executor.shutdown(wait=True)
+
+
+    @property
+    def stats(self) -> dict:
+        """
+        Queue depth and per-op latency. Latency is measured from submission, so it
+        includes time spent waiting in the queue.
+        """
+        return {
+            'queued'     : self.__depth,
+            'queued_max' : self.__depth_max,
+            'waiting'    : self.__waiting,
+            'ops'        : { name : dict(stats) for name, stats in self.__op_stats.items() },
+        }
+
+
+    async def __table_op(self, table: str, op: str, *args, **kwargs):
+        def fn():
+            return getattr(self.__db.table(table), op)(*args, **kwargs)
+
+        return await self.__submit(op, fn)
+
+
+    async def __submit(self, name: str, fn: Callable):
+        if self.__slots.locked():
+            self.__waiting += 1
+            try: await self.__slots.acquire()
+            finally:
+                self.__waiting -= 1
+        else:
+            await self.__slots.acquire()
+
+        self.__depth += 1
+        self.__depth_max = max(self.__depth_max, self.__depth)
+
+        start = time.perf_counter()
+
+        try: return await asyncio.get_running_loop().run_in_executor(self.__executor, fn)
+        finally:
+            self.__depth -= 1
+            self.__slots.release()
+
+            latency = time.perf_counter() - start
+            DbAsync.__METRIC_OP_TIME.observe(latency, name)
+
+            try: stats = self.__op_stats[name]
+            except KeyError:
+                stats = self.__op_stats[name] = { 'count' : 0, 'time' : 0.0, 'max' : 0.0 }
+
+            stats['count'] += 1
+            stats['time']  += latency
+            stats['max']   = max(stats['max'], latency)
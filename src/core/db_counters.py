@@ -0,0 +1,222 @@
+from typing import Callable, Optional
+
+import asyncio
+import collections
+import logging
+import time
+
+import tinydb
+from tinydb.table import Document
+
+from .db_async import DbAsync
+
+
+class DbCounters():
+    """
+    Aggregates message and command counters in memory and persists them in batches
+
+    Incrementing only touches a dict. The accumulated deltas are written to the
+    db on `flush`, which the bot calls periodically. Getters return persisted
+    values merged with whatever is still pending or being written.
+
+    Not thread safe; all calls are expected to come from the bot's event loop.
+    Only the writes done by `flush` run on the db thread.
+    """
+
+    MSG_FIELDS = ( 'total_msgs', 'user_msgs', 'total_cmds' )
+
+    def __init__(self, db: tinydb.TinyDB, bot_stats_table: str, cmd_stats_table: str):
+        self.__logger = logging.getLogger(__class__.__name__)
+
+        self.__db = db
+        self.__bot_stats_table = bot_stats_table
+        self.__cmd_stats_table = cmd_stats_table
+
+        # (guild_id, field) -> delta
+        self.__msgs = collections.Counter()
+
+        # (guild_id, cmd) -> delta
+        self.__cmds = collections.Counter()
+
+        # Deltas taken out by a `flush` that's still writing them
+        self.__flushing_msgs = collections.Counter()
+        self.__flushing_cmds = collections.Counter()
+
+        self.__flush_lock = asyncio.Lock()
+
+
+    def inc_msgs(self, guild_id: int, field: str):
+        self.__msgs[(guild_id, field)] += 1
+
+
+    def inc_cmd(self, guild_id: int, cmd: str):
+        self.__cmds[(guild_id, cmd)] += 1
+
+
+    def get_bot_stats(self, guild_id: int) -> Optional[dict]:
+        """
+        Data fmt:
+            "bot_stats" : {
+                [guild_id: int] : {
+                    "total_msgs" : int,
+                    "user_msgs"  : int,
+                    "total_cmds" : int,
+                }
+            }
+        """
+        entry = self.__db.table(self.__bot_stats_table).get(doc_id=guild_id)
+        pending = {
+            field : self.__msgs.get((guild_id, field), 0) + self.__flushing_msgs.get((guild_id, field), 0)
+            for field in DbCounters.MSG_FIELDS
+            if (guild_id, field) in self.__msgs or (guild_id, field) in self.__flushing_msgs
+        }
+
+        if isinstance(entry, type(None)):
+            if len(pending) == 0:
+                return None
+
+            entry = { field : 0 for field in DbCounters.MSG_FIELDS }
+
+        stats = dict(entry)
+        for field, delta in pending.items():
+            stats[field] = stats.get(field, 0) + delta
+
+        return stats
+
+
+    def get_cmd_server_count(self, guild_id: int, cmd: str) -> int:
+        """
+        Data fmt:
+            "cmd_stats": {
+                [doc_id: int] : { 'cmd' : (cmd: str), 'server' : (server_id: int), 'count' : (count: int) },
+                ...
+            }
+        """
+        table = self.__db.table(self.__cmd_stats_table)
+        entry = table.get(tinydb.Query().fragment({ 'cmd' : cmd, 'server' : guild_id }))
+
+        count = 0 if not entry else entry['count']
+        return count + self.__cmds.get((guild_id, cmd), 0) + self.__flushing_cmds.get((guild_id, cmd), 0)
+
+
+    def get_cmd_total_count(self, cmd: str) -> int:
+        table = self.__db.table(self.__cmd_stats_table)
+        entries = table.search(tinydb.Query().fragment({ 'cmd' : cmd }))
+
+        count = sum([ entry['count'] for entry in entries ])
+        return count + sum([
+            delta
+            for pending in ( self.__cmds, self.__flushing_cmds )
+            for (_, pending_cmd), delta in pending.items() if pending_cmd == cmd
+        ])
+
+
+    async def flush(self, adb: DbAsync):
+        """
+        Persists all pending deltas, writing them on `adb`'s thread. Counting
+        goes on on the loop in the meantime.
+        """
+        # One at a time; the bot's periodic flush and `close` can overlap
+        async with self.__flush_lock:
+            msgs, self.__msgs = self.__msgs, collections.Counter()
+            cmds, self.__cmds = self.__cmds, collections.Counter()
+
+            if len(msgs) == 0 and len(cmds) == 0:
+                return
+
+            start = time.perf_counter()
+            num_msgs, num_cmds = len(msgs), len(cmds)
+
+            self.__flushing_msgs = msgs
+            self.__flushing_cmds = cmds
+
+            # The db thread removes deltas from these as they get written, while the
+            # getters keep reading `msgs` and `cmds` as they were
+            unwritten_msgs = collections.Counter(msgs)
+            unwritten_cmds = collections.Counter(cmds)
+
+            try:
+                if len(msgs) != 0:
+                    await adb.run(self.__flush_msgs, unwritten_msgs)
+                    self.__flushing_msgs = collections.Counter()
+
+                if len(cmds) != 0:
+                    await adb.run(self.__flush_cmds, unwritten_cmds)
+            except Exception:
+                # Only what wasn't written is kept for the next flush, on top of what came in since
+                self.__msgs.update(unwritten_msgs)
+                self.__cmds.update(unwritten_cmds)
+                raise
+            finally:
+                self.__flushing_msgs = collections.Counter()
+                self.__flushing_cmds = collections.Counter()
+
+            self.__logger.debug(f'Flushed {num_msgs} msg and {num_cmds} cmd counters in {(time.perf_counter() - start)*1000:.2f} ms')
+
+
+    def __flush_msgs(self, msgs: collections.Counter):
+        """
+        Applies message deltas, removing them from `msgs` as they're written
+        """
+        table = self.__db.table(self.__bot_stats_table)
+
+        deltas = collections.defaultdict(dict)
+        for (guild_id, field), delta in msgs.items():
+            deltas[guild_id][field] = delta
+
+        # Documents don't hold their guild id for an update to go by, so each gets its own
+        for entry in table.get(doc_ids=list(deltas)):
+            fields = deltas.pop(entry.doc_id)
+            table.update(DbCounters.__add_deltas(fields), doc_ids=[ entry.doc_id ])
+
+            for field in fields:
+                del msgs[(entry.doc_id, field)]
+
+        # Whatever is left does not exist in the db yet
+        if len(deltas) != 0:
+            table.insert_multiple([
+                Document({ field : fields.get(field, 0) for field in DbCounters.MSG_FIELDS }, doc_id=guild_id)
+                for guild_id, fields in deltas.items()
+            ])
+            msgs.clear()
+
+
+    def __flush_cmds(self, cmds: collections.Counter):
+        """
+        Applies all command deltas with one update and one insert, removing them
+        from `cmds` as they're written
+        """
+        table = self.__db.table(self.__cmd_stats_table)
+
+        # Looked up through the ('cmd', 'server') index rather than a scan of the table
+        doc_keys = {}
+        for guild_id, cmd in cmds:
+            entry = table.get(tinydb.Query().fragment({ 'cmd' : cmd, 'server' : guild_id }))
+            if not isinstance(entry, type(None)):
+                doc_keys[entry.doc_id] = ( guild_id, cmd )
+
+        def apply_delta(doc: dict):
+            doc['count'] += cmds.get((doc['server'], doc['cmd']), 0)
+
+        if len(doc_keys) != 0:
+            table.update(apply_delta, doc_ids=list(doc_keys))
+
+            for key in doc_keys.values():
+                del cmds[key]
+
+        # Whatever is left does not exist in the db yet
+        if len(cmds) != 0:
+            table.insert_multiple([
+                { 'cmd' : cmd, 'server' : guild_id, 'count' : delta }
+                for (guild_id, cmd), delta in cmds.items()
+            ])
+            cmds.clear()
+
+
+    @staticmethod
+    def __add_deltas(deltas: dict) -> Callable[[dict], None]:
+        def apply_delta(doc: dict):
+            for field, delta in deltas.items():
+                doc[field] = doc.get(field, 0) + delta
+
+        return apply_delta
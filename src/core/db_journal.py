@@ -0,0 +1,298 @@
+from typing import Optional
+
+from tinydb import Storage
+
+import os
+import re
+import logging
+import threading
+import time
+
+from .db_storage import DbAtomicJsonStorage
+from .db_serializer import DbSerializer
+from .db_table import DbTable, DbTinyDB
+
+
+class DbJournalStorage(Storage):
+    """
+    JSON storage that records changes in an append-only journal
+
+    The db is kept as a snapshot file plus journal segments next to it
+    (`{path}.journal.{seq}`). `DbJournalTable` appends one record per change to
+    the newest segment; `write` is a compaction: it starts a new segment, writes
+    the whole db as the new snapshot and then deletes the older segments.
+
+    Records hold the resulting state of the documents a change touched rather
+    than the operation itself, so replaying one more than once has no effect.
+    That makes every crash point safe: `read` replays all remaining segments on
+    top of the snapshot, in order, and a record cut short by the crash is dropped.
+
+    Meant to be used under `DbThreadSafeMiddleware` with `write_behind` enabled,
+    which makes its flush interval the compaction interval.
+    """
+
+    def __init__(self, path: str, encoding: str = 'utf-8', fsync: bool = False, serializer: Optional[DbSerializer] = None, **kwargs):
+        """
+        Params
+        ======
+        path: str
+            Snapshot file path
+
+        fsync: bool
+            Sync the journal to disk after every record. Without it records survive
+            the process getting killed, but not a power loss.
+        """
+        Storage.__init__(self)
+
+        self.__logger = logging.getLogger(__class__.__name__)
+        self.__lock   = threading.Lock()
+
+        self.__path     = path
+        self.__fsync    = fsync
+        self.__snapshot = DbAtomicJsonStorage(path, encoding=encoding, serializer=serializer, **kwargs)
+
+        # Records are always utf-8
+        self.__serializer = self.__snapshot.serializer
+
+        # Segments on disk, oldest first. New records go in segment `__seq`, which
+        # is created on the first append.
+        self.__seqs = self.__find_segments()
+        self.__seq  = (self.__seqs[-1] + 1) if len(self.__seqs) != 0 else 0
+        self.__file = None
+
+        self.__stats = {
+            'records'      : 0,    # Records appended
+            'record_bytes' : 0,    # Bytes appended to the journal
+            'record_time'  : 0.0,  # Time spent appending records, total (s)
+            'replayed'     : 0,    # Records replayed on startup
+            'compactions'  : 0,
+        }
+
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+
+    @property
+    def stats(self) -> dict:
+        with self.__lock:
+            return dict(self.__stats)
+
+
+    def read(self) -> Optional[dict]:
+        data = self.__snapshot.read()
+
+        with self.__lock:
+            seqs = list(self.__seqs)
+
+        if len(seqs) == 0:
+            return data
+
+        data = data if not isinstance(data, type(None)) else {}
+        num_records = 0
+
+        for seq in seqs:
+            num_records += self.__replay(self.__segment(seq), data)
+
+        with self.__lock:
+            self.__stats['replayed'] += num_records
+
+        self.__logger.info(f'Replayed {num_records} journal records from {len(seqs)} segments')
+        return data
+
+
+    def write(self, data: dict) -> int:
+        """
+        Compacts the journal into a new snapshot. Returns number of bytes written.
+        """
+        return self.finish_write(self.prepare_write(data))
+
+
+    def prepare_write(self, data: dict) -> tuple:
+        """
+        First half of `write`, see `DbAtomicJsonStorage.prepare_write`. Has to be
+        called while no records are being appended.
+        """
+        with self.__lock:
+            # Records appended from here on go in a new segment
+            self.__close_file()
+
+            old_seqs = list(self.__seqs)
+            self.__seq += 1
+
+        return ( old_seqs, self.__snapshot.prepare_write(data) )
+
+
+    def finish_write(self, pending: tuple) -> int:
+        """
+        Second half of `write`. Returns number of bytes written.
+        """
+        old_seqs, serialized = pending
+        num_bytes = self.__snapshot.finish_write(serialized)
+
+        # Everything in the old segments made it into the snapshot
+        with self.__lock:
+            for seq in old_seqs:
+                try: os.remove(self.__segment(seq))
+                except FileNotFoundError:
+                    pass
+
+                if seq in self.__seqs:
+                    self.__seqs.remove(seq)
+
+            self.__stats['compactions'] += 1
+
+        return num_bytes
+
+
+    def append(self, record: dict):
+        """
+        Adds a change to the journal. Records look like:
+            { 'table' : (name: str), 'set' : { (doc_id: str) : (doc: dict), ... } }
+            { 'table' : (name: str), 'del' : [ (doc_id: int), ... ] }
+            { 'table' : (name: str), 'truncate' : True }
+        """
+        line = self.__serializer.dumps(record) + b'\n'
+
+        with self.__lock:
+            start = time.perf_counter()
+
+            if isinstance(self.__file, type(None)):
+                self.__file = open(self.__segment(self.__seq), 'ab')
+                self.__seqs.append(self.__seq)
+
+            self.__file.write(line)
+            self.__file.flush()
+
+            if self.__fsync:
+                os.fsync(self.__file.fileno())
+
+            self.__stats['records']      += 1
+            self.__stats['record_bytes'] += len(line)
+            self.__stats['record_time']  += time.perf_counter() - start
+
+
+    def close(self):
+        with self.__lock:
+            self.__close_file()
+
+
+    def __close_file(self):
+        if not isinstance(self.__file, type(None)):
+            self.__file.close()
+            self.__file = None
+
+
+    def __replay(self, path: str, data: dict) -> int:
+        num_records = 0
+
+        with open(path, 'rb') as f:
+            for line in f:
+                try: record = self.__serializer.loads(line)
+                except ValueError:
+                    # Last record was cut short by a crash
+                    self.__logger.warning(f'Dropping partial journal record in {path}')
+                    break
+
+                table = data.setdefault(record['table'], {})
+
+                if 'truncate' in record:
+                    table.clear()
+
+                for doc_id, doc in record.get('set', {}).items():
+                    table[doc_id] = doc
+
+                for doc_id in record.get('del', []):
+                    table.pop(str(doc_id), None)
+
+                num_records += 1
+
+        return num_records
+
+
+    def __segment(self, seq: int) -> str:
+        return f'{self.__path}.journal.{seq}'
+
+
+    def __find_segments(self) -> "list[int]":
+        dir_path  = os.path.dirname(os.path.abspath(self.__path))
+        file_name = os.path.basename(self.__path)
+        pattern   = re.compile(re.escape(file_name) + r'\.journal\.(\d+)$')
+
+        seqs = []
+        for name in os.listdir(dir_path):
+            match = pattern.match(name)
+            if match:
+                seqs.append(int(match.group(1)))
+
+        return sorted(seqs)
+
+
+
+class DbJournalTable(DbTable):
+    """
+    `DbTable` that records every change in the storage's journal
+    """
+
+    def insert(self, *args, **kwargs):
+        with self._storage.op_lock:
+            doc_id = DbTable.insert(self, *args, **kwargs)
+            self.__journal_set([ doc_id ])
+            return doc_id
+
+
+    def insert_multiple(self, *args, **kwargs):
+        with self._storage.op_lock:
+            doc_ids = DbTable.insert_multiple(self, *args, **kwargs)
+            self.__journal_set(doc_ids)
+            return doc_ids
+
+
+    def update(self, *args, **kwargs):
+        with self._storage.op_lock:
+            doc_ids = DbTable.update(self, *args, **kwargs)
+            self.__journal_set(doc_ids)
+            return doc_ids
+
+
+    def update_multiple(self, *args, **kwargs):
+        with self._storage.op_lock:
+            doc_ids = DbTable.update_multiple(self, *args, **kwargs)
+            self.__journal_set(doc_ids)
+            return doc_ids
+
+
+    # `upsert` goes through `update` and `insert`
+
+
+    def remove(self, *args, **kwargs):
+        with self._storage.op_lock:
+            doc_ids = DbTable.remove(self, *args, **kwargs)
+            if len(doc_ids) != 0:
+                self._storage.append({ 'table' : self.name, 'del' : doc_ids })
+
+            return doc_ids
+
+
+    def truncate(self):
+        with self._storage.op_lock:
+            DbTable.truncate(self)
+            self._storage.append({ 'table' : self.name, 'truncate' : True })
+
+
+    def __journal_set(self, doc_ids: "list[int]"):
+        if len(doc_ids) == 0:
+            return
+
+        table = self._read_table()
+        self._storage.append({ 'table' : self.name, 'set' : { str(doc_id) : table[str(doc_id)] for doc_id in doc_ids } })
+
+
+
+class DbJournalTinyDB(DbTinyDB):
+    """
+    TinyDB using `DbJournalTable` tables, over `DbJournalStorage`
+    """
+
+    table_class = DbJournalTable
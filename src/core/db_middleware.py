@@ -2,32 +2,203 @@ from tinydb.middlewares import Middleware
 
 import threading
 import logging
+import time
 
 
 class DbThreadSafeMiddleware(Middleware):
     """
     Adds lock to perform thread safe operations
+
+    The database is parsed from the underlying storage only once, on first read.
+    After that the in-memory snapshot is authoritative: reads are served from it
+    and writes replace it before being passed down to the storage.
+
+    With `write_behind` enabled, writes only mark the snapshot dirty. A background
+    thread flushes it every `flush_interval` seconds, coalescing all writes made in
+    between into one. Remaining changes are flushed on `close`.
     """
 
-    def __init__(self, storage_cls):
+    def __init__(self, storage_cls, write_behind: bool = False, flush_interval: float = 5.0):
         Middleware.__init__(self, storage_cls)
 
         self.__logger = logging.getLogger(__class__.__name__)
         self.__lock   = threading.Lock()
 
+        # Held by `DbTable` for a whole read-modify-write operation
+        self.__op_lock = threading.RLock()
+
+        self.__data      = None
+        self.__is_loaded = False
+        self.__is_dirty  = False
+        self.__is_closed = False
+
+        self.__write_behind   = write_behind
+        self.__flush_interval = flush_interval
+        self.__flush_lock     = threading.Lock()
+        self.__flush_evt      = threading.Event()
+        self.__flush_thread   = None
+
+        self.__stats = {
+            'reads'         : 0,    # Total read requests
+            'hits'          : 0,    # Reads served from the snapshot
+            'parses'        : 0,    # Reads that had to go to the storage
+            'parse_time'    : 0.0,  # Time spent parsing, total (s)
+            'parse_last'    : 0.0,  # Time spent parsing, last parse (s)
+            'writes'        : 0,    # Write requests
+            'flushes'       : 0,    # Writes that reached the storage
+            'write_time'    : 0.0,  # Time spent in storage writes, total (s)
+            'flush_last'    : 0.0,  # Time spent in storage writes, last write (s)
+            'flush_max'     : 0.0,  # Time spent in storage writes, slowest write (s)
+            'bytes_written' : 0,    # Only known for storages that report it
+        }
+
+
+    def __call__(self, *args, **kwargs):
+        Middleware.__call__(self, *args, **kwargs)
+
+        if self.__write_behind:
+            self.__flush_thread = threading.Thread(target=self.__flush_loop, name='db_flush', daemon=True)
+            self.__flush_thread.start()
+
+        return self
+
 
     def read(self):
         with self.__lock:
-            return self.storage.read()
+            self.__stats['reads'] += 1
+
+            if self.__is_loaded:
+                self.__stats['hits'] += 1
+                return self.__data
+
+            self.__load()
+            return self.__data
 
 
     def write(self, data):
         #self.__logger.debug(f'db req: {id(data)}')
         with self.__lock:
             #self.__logger.debug(f'db write: {id(data)}')
-            self.storage.write(data)
+            self.__data      = data
+            self.__is_loaded = True
+            self.__is_dirty  = True
+
+            self.__stats['writes'] += 1
+
+        if not self.__write_behind:
+            self.flush()
+
+
+    def flush(self):
+        """
+        Writes the snapshot to the storage if it changed since the last flush
+        """
+        # Write operations change documents in place while holding `op_lock`, so the
+        # snapshot is serialized with it held. It's let go of for the file I/O, so
+        # reads and writes are not held up by the disk. `flush_lock` keeps flushes in
+        # order until their I/O is done; it's taken after `op_lock`, same as write
+        # operations that flush do.
+        with self.__op_lock:
+            self.__flush_lock.acquire()
+
+            try:
+                with self.__lock:
+                    if not self.__is_dirty:
+                        self.__flush_lock.release()
+                        return
+
+                    start   = time.perf_counter()
+                    pending = None
+
+                    if hasattr(self.storage, 'prepare_write'):
+                        pending = self.storage.prepare_write(self.__data)
+                    else:
+                        # Storages that can't split it up write with everything held
+                        num_bytes = self.storage.write(self.__data)
+
+                    self.__is_dirty = False
+            except Exception:
+                self.__flush_lock.release()
+                raise
+
+        try:
+            if not isinstance(pending, type(None)):
+                num_bytes = self.storage.finish_write(pending)
+        except Exception:
+            with self.__lock:
+                self.__is_dirty = True
+            raise
+        finally:
+            self.__flush_lock.release()
+
+        flush_time = time.perf_counter() - start
+
+        with self.__lock:
+            self.__stats['flushes']    += 1
+            self.__stats['write_time'] += flush_time
+            self.__stats['flush_last'] = flush_time
+            self.__stats['flush_max']  = max(self.__stats['flush_max'], flush_time)
+
+            if isinstance(num_bytes, int):
+                self.__stats['bytes_written'] += num_bytes
+
+
+    def reload(self):
+        """
+        Discards the snapshot and parses the storage again
+        """
+        with self.__lock:
+            self.__load()
 
 
     def close(self):
+        if self.__is_closed:
+            return
+
+        self.__is_closed = True
+
+        if not isinstance(self.__flush_thread, type(None)):
+            self.__flush_evt.set()
+            self.__flush_thread.join()
+
+        self.flush()
+
         with self.__lock:
             self.storage.close()
+
+
+    @property
+    def op_lock(self) -> threading.RLock:
+        return self.__op_lock
+
+
+    @property
+    def stats(self) -> dict:
+        with self.__lock:
+            stats = dict(self.__stats)
+
+        # Storages with stats of their own (ex: journal)
+        stats.update(getattr(self.storage, 'stats', {}))
+        return stats
+
+
+    def __load(self):
+        start = time.perf_counter()
+        self.__data = self.storage.read()
+        parse_time  = time.perf_counter() - start
+
+        self.__is_loaded = True
+        self.__is_dirty  = False
+
+        self.__stats['parses']     += 1
+        self.__stats['parse_time'] += parse_time
+        self.__stats['parse_last'] = parse_time
+
+        self.__logger.debug(f'db parsed in {parse_time*1000:.2f} ms')
+
+
+    def __flush_loop(self):
+        while not self.__flush_evt.wait(self.__flush_interval):
+            try: self.flush()
+            except Exception as e:
+                self.__logger.error(f'db flush failed; Will retry in {self.__flush_interval} seconds | {type(e)}: {e}')
@@ -0,0 +1,62 @@
+from typing import Optional
+
+import tinydb
+
+
+class DbQuery():
+
+    @staticmethod
+    def eq_fields(cond: tinydb.queries.QueryLike) -> Optional[dict]:
+        """
+        Extracts the `field == value` pairs a query is made of, so storages that
+        can look documents up by field don't need to scan.
+
+        Understood forms:
+            Query().fragment({ 'a' : x, 'b' : y })
+            Query().a == x
+            (Query().a == x) & (Query().b == y)
+
+        Returns None for anything else, in which case the query has to be evaluated
+        against every document. Fragments are assumed to be on the document root,
+        which is the only way the bot uses them.
+        """
+        try: hashval = cond._hash
+        except AttributeError:
+            return None
+
+        return DbQuery.__eq_fields(hashval)
+
+
+    @staticmethod
+    def __eq_fields(hashval: Optional[tuple]) -> Optional[dict]:
+        if not isinstance(hashval, tuple) or len(hashval) == 0:
+            return None
+
+        match hashval[0]:
+            case 'fragment':
+                return dict(hashval[1])
+
+            case '==':
+                path, value = hashval[1], hashval[2]
+                if len(path) != 1:
+                    return None
+
+                return { path[0] : value }
+
+            case 'and':
+                fields = {}
+                for sub_hashval in hashval[1]:
+                    sub_fields = DbQuery.__eq_fields(sub_hashval)
+                    if isinstance(sub_fields, type(None)):
+                        return None
+
+                    for key, value in sub_fields.items():
+                        if key in fields and fields[key] != value:
+                            # Contradicting conditions; leave it to the query itself
+                            return None
+
+                        fields[key] = value
+
+                return fields
+
+        return None
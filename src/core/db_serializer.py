@@ -0,0 +1,139 @@
+import json
+import logging
+
+try: import orjson
+except ImportError:
+    orjson = None
+
+try: import msgspec
+except ImportError:
+    msgspec = None
+
+
+class DbSerializer():
+    """
+    Turns the db into JSON bytes and back for the json storages
+
+    `get` picks the fastest available implementation. All of them write plain
+    JSON holding the same data and read each other's files, as well as files
+    written by TinyDB's own `JSONStorage`. Only insignificant formatting
+    differs: the fast encoders write compact JSON with non-ASCII characters as
+    UTF-8 instead of `\\u` escapes.
+    """
+
+    name = None
+
+    def dumps(self, data) -> bytes:
+        raise NotImplementedError
+
+
+    def loads(self, data: "bytes | str"):
+        raise NotImplementedError
+
+
+    @staticmethod
+    def get(name: str = 'auto', **kwargs) -> "DbSerializer":
+        """
+        Params
+        ======
+        name: str
+            'auto', 'orjson', 'msgspec' or 'json'. 'auto' picks orjson, then
+            msgspec, falling back to json when neither is installed.
+
+        kwargs:
+            Passed to `json.dumps`. Only the json serializer supports them, so
+            'auto' picks it when any are given.
+        """
+        if name == 'auto':
+            if len(kwargs) != 0:
+                name = 'json'
+            elif not isinstance(orjson, type(None)):
+                name = 'orjson'
+            elif not isinstance(msgspec, type(None)):
+                name = 'msgspec'
+            else:
+                name = 'json'
+
+        match name:
+            case 'json':
+                return DbJsonSerializer(**kwargs)
+
+            case 'orjson':
+                if isinstance(orjson, type(None)):
+                    raise ValueError('orjson serializer requested, but orjson is not installed')
+
+                return DbOrjsonSerializer()
+
+            case 'msgspec':
+                if isinstance(msgspec, type(None)):
+                    raise ValueError('msgspec serializer requested, but msgspec is not installed')
+
+                return DbMsgspecSerializer()
+
+        raise ValueError(f'Invalid db serializer: "{name}"')
+
+
+
+class DbJsonSerializer(DbSerializer):
+
+    name = 'json'
+
+    def __init__(self, **kwargs):
+        self.__kwargs = kwargs
+
+
+    def dumps(self, data) -> bytes:
+        return json.dumps(data, **self.__kwargs).encode('utf-8')
+
+
+    def loads(self, data: "bytes | str"):
+        return json.loads(data)
+
+
+
+class DbOrjsonSerializer(DbSerializer):
+
+    name = 'orjson'
+
+    def __init__(self):
+        self.__logger   = logging.getLogger(__class__.__name__)
+        self.__fallback = DbJsonSerializer()
+
+
+    def dumps(self, data) -> bytes:
+        try: return orjson.dumps(data)
+        except TypeError as e:
+            # Things orjson refuses, like ints past 64 bits
+            self.__logger.warning(f'orjson failed to encode db, falling back to json | {e}')
+            return self.__fallback.dumps(data)
+
+
+    def loads(self, data: "bytes | str"):
+        return orjson.loads(data)
+
+
+
+class DbMsgspecSerializer(DbSerializer):
+
+    name = 'msgspec'
+
+    def __init__(self):
+        self.__logger   = logging.getLogger(__class__.__name__)
+        self.__fallback = DbJsonSerializer()
+
+        self.__encoder = msgspec.json.Encoder()
+        self.__decoder = msgspec.json.Decoder()
+
+
+    def dumps(self, data) -> bytes:
+        try: return self.__encoder.encode(data)
+        except (TypeError, OverflowError, msgspec.EncodeError) as e:
+            self.__logger.warning(f'msgspec failed to encode db, falling back to json | {e}')
+            return self.__fallback.dumps(data)
+
+
+    def loads(self, data: "bytes | str"):
+        # Raise the same kind of error as the others
+        try: return self.__decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
@@ -0,0 +1,693 @@
+from typing import Callable, Iterable, Iterator, Mapping, Optional, Union
+
+import os
+import logging
+import threading
+import time
+import collections
+
+import tinydb
+from tinydb.table import Document
+
+from .db_middleware import DbThreadSafeMiddleware
+from .db_storage import DbAtomicJsonStorage
+from .db_table import DbTinyDB
+from .db_query import DbQuery
+from .db_serializer import DbSerializer
+
+
+class DbSharded():
+    """
+    Drop-in for the part of `tinydb.TinyDB` the bot uses that stores guild-scoped
+    tables in one small file per guild
+
+    Layout:
+        {path}/core.json            Tables that are not sharded, as a regular TinyDB file
+        {path}/shards/{key}.json    All sharded tables' documents belonging to one shard
+        {path}/shards/_ids-{n}.json Shard keys of field sharded tables' documents, by doc_id
+
+    Shard files are TinyDB files too, holding only their part of each table.
+    They are loaded on first access and kept in memory up to `max_loaded` at a
+    time, least recently used ones are evicted first. A change only rewrites the
+    files of the shards it touched, so write cost scales with the size of the
+    guild and not the whole db.
+
+    How a table is sharded is given by `shards`, table name -> one of:
+        'doc_id'    The doc_id is the guild id
+        (str)       Name of the field holding the guild id
+        (int)       The doc_id is not tied to a guild (ex: channel ids); documents
+                    are spread over this many bucket shards by doc_id
+
+    Queries on a field sharded table that include the guild field only load that
+    guild's shard. Any other query has to go through every shard of the table.
+    Lookups by doc_id find the shard in the `_ids` shards, which are split up by
+    doc_id and loaded and evicted like any other shard, so one lookup loads at
+    most two files and a missing document is known to be missing right away.
+    """
+
+    # Number of `_ids` shards
+    __ID_BUCKETS = 64
+
+    def __init__(self, path: str, shards: dict, indexes: Optional[dict] = None, max_loaded: int = 256, write_behind: bool = False, flush_interval: float = 5.0, serializer: Optional[DbSerializer] = None):
+        """
+        Params
+        ======
+        path: str
+            Directory the db files are kept in
+
+        shards: dict
+            Table name -> how the table is sharded, see class doc
+
+        indexes: dict
+            Indexes of the core tables, see `DbTable`. Sharded tables are looked up
+            per guild already and don't use them.
+
+        max_loaded: int
+            Max number of shards kept in memory
+
+        write_behind: bool
+            Coalesce changes in memory and write them every `flush_interval` seconds
+            instead of on every change. Also applies to the core file.
+
+        serializer: DbSerializer
+            Used for all files, defaults to the stdlib json one
+        """
+        self.__logger = logging.getLogger(__class__.__name__)
+        self.__lock   = threading.RLock()
+
+        self.__path      = path
+        self.__shard_dir = os.path.join(path, 'shards')
+        self.__shards    = dict(shards)
+        self.__tables    = {}
+
+        self.__serializer = serializer if not isinstance(serializer, type(None)) else DbSerializer.get('json')
+
+        self.__max_loaded     = max(1, max_loaded)
+        self.__write_behind   = write_behind
+        self.__flush_interval = flush_interval
+        self.__flush_evt      = threading.Event()
+        self.__flush_thread   = None
+        self.__is_closed      = False
+
+        os.makedirs(self.__shard_dir, exist_ok=True)
+
+        self.__core = DbTinyDB(
+            os.path.join(path, 'core.json'),
+            indexes    = indexes,
+            serializer = self.__serializer,
+            storage    = DbThreadSafeMiddleware(DbAtomicJsonStorage, write_behind=write_behind, flush_interval=flush_interval)
+        )
+
+        # Shard key -> { table name : { doc_id (str) : doc } }, in LRU order
+        self.__loaded = collections.OrderedDict()
+        self.__dirty  = set()
+
+        # Keys of all shards that exist, loaded or not
+        self.__keys = set([ file_name[:-len('.json')] for file_name in os.listdir(self.__shard_dir) if file_name.endswith('.json') ])
+
+        # Field sharded tables with an `_ids` entry for every document. A new db has
+        # them from the start, older ones get them built on first lookup.
+        entry = self.__core.table('_shard_dirs').get(doc_id=1)
+        if isinstance(entry, type(None)) and len(self.__keys) == 0:
+            self.__core.table('_shard_dirs').insert(Document({ name : True for name, shard_by in self.__shards.items() if DbSharded.__is_field(shard_by) }, doc_id=1))
+            entry = self.__core.table('_shard_dirs').get(doc_id=1)
+
+        self.__indexed = set() if isinstance(entry, type(None)) else set([ name for name, done in entry.items() if done ])
+
+        self.__stats = {
+            'shards'        : len(self.__keys),
+            'loaded'        : 0,
+            'loads'         : 0,
+            'load_time'     : 0.0,
+            'evictions'     : 0,
+            'writes'        : 0,
+            'write_time'    : 0.0,
+            'bytes_written' : 0,
+        }
+
+        if self.__write_behind:
+            self.__flush_thread = threading.Thread(target=self.__flush_loop, name='db_shard_flush', daemon=True)
+            self.__flush_thread.start()
+
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+
+    @property
+    def lock(self) -> threading.RLock:
+        return self.__lock
+
+
+    @property
+    def stats(self) -> dict:
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats['shards'] = len(self.__keys)
+            stats['loaded'] = len(self.__loaded)
+
+        core_stats = self.__core.storage.stats
+        stats['core_flushes']    = core_stats['flushes']
+        stats['core_write_time'] = core_stats['write_time']
+
+        return stats
+
+
+    def table(self, name: str):
+        if name not in self.__shards:
+            return self.__core.table(name)
+
+        if name in self.__tables:
+            return self.__tables[name]
+
+        table = DbShardedTable(self, name, self.__shards[name])
+        self.__tables[name] = table
+        return table
+
+
+    def tables(self) -> set:
+        return self.__core.tables() | set(self.__shards.keys())
+
+
+    def flush(self):
+        """
+        Writes every shard that changed since the last flush
+        """
+        with self.__lock:
+            dirty = list(self.__dirty)
+
+        # The lock is taken per shard so other threads get a turn in between
+        for key in dirty:
+            with self.__lock:
+                if key in self.__dirty:
+                    self.__write(key)
+
+        self.__core.storage.flush()
+
+
+    def close(self):
+        if self.__is_closed:
+            return
+
+        self.__is_closed = True
+
+        if not isinstance(self.__flush_thread, type(None)):
+            self.__flush_evt.set()
+            self.__flush_thread.join()
+
+        self.flush()
+        self.__core.close()
+
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        Imports all tables of a TinyDB json file, splitting the sharded ones up.
+        Returns number of imported documents.
+        """
+        with open(json_path, 'rb') as f:
+            data = f.read()
+
+        data = self.__serializer.loads(data) if data else {}
+        num_docs = 0
+
+        with self.__lock:
+            for name, docs in data.items():
+                self.table(name).insert_multiple([ Document(doc, int(doc_id)) for doc_id, doc in docs.items() ])
+                num_docs += len(docs)
+
+                if DbSharded.__is_field(self.__shards.get(name, None)) and len(docs) != 0:
+                    self.__set_last_id(name, max([ int(doc_id) for doc_id in docs ]))
+
+            self.flush()
+
+        self.__logger.info(f'Migrated {num_docs} documents in {len(data)} tables from {json_path} to {self.__path} ({len(self.__keys)} shards)')
+        return num_docs
+
+
+    def keys(self, name: str) -> "list[str]":
+        """
+        Keys of the shards a table can have documents in
+        """
+        shard_by = self.__shards[name]
+
+        if isinstance(shard_by, int):
+            prefix = f'{name}-'
+            return [ key for key in self.__keys if key.startswith(prefix) ]
+
+        # Guild shards
+        return [ key for key in self.__keys if key.isdigit() ]
+
+
+    def has_key(self, key: str) -> bool:
+        return key in self.__keys
+
+
+    def docs(self, key: str, name: str, create: bool = False) -> Optional[dict]:
+        """
+        Documents of table `name` in shard `key`, loading the shard if needed.
+        Returns None if there are none, unless `create` is set.
+        """
+        shard = self.__load(key, create)
+        if isinstance(shard, type(None)):
+            return None
+
+        if name not in shard:
+            if not create:
+                return None
+
+            shard[name] = {}
+
+        return shard[name]
+
+
+    def changed(self, key: str):
+        """
+        Marks a shard as modified. Call `commit` once the operation is done.
+        """
+        self.__dirty.add(key)
+
+
+    def commit(self):
+        """
+        Writes modified shards, unless writes are deferred to the flush thread
+        """
+        if self.__write_behind:
+            return
+
+        for key in list(self.__dirty):
+            self.__write(key)
+
+
+    def doc_key(self, name: str, doc_id: int) -> Optional[str]:
+        """
+        Shard key of a document in a field sharded table, or None if it doesn't exist
+        """
+        if name not in self.__indexed:
+            self.__build_ids(name)
+
+        ids = self.docs(self.__ids_key(doc_id), name)
+        if isinstance(ids, type(None)):
+            return None
+
+        return ids.get(str(doc_id), None)
+
+
+    def set_doc_key(self, name: str, doc_id: int, key: Optional[str]):
+        """
+        Records which shard a document of a field sharded table is in, None if it
+        was removed. Goes out with the next `commit`.
+        """
+        ids_key = self.__ids_key(doc_id)
+
+        if isinstance(key, type(None)):
+            ids = self.docs(ids_key, name)
+            if isinstance(ids, type(None)) or str(doc_id) not in ids:
+                return
+
+            del ids[str(doc_id)]
+        else:
+            ids = self.docs(ids_key, name, create=True)
+            if ids.get(str(doc_id), None) == key:
+                return
+
+            ids[str(doc_id)] = key
+
+        self.changed(ids_key)
+
+
+    def next_id(self, name: str) -> int:
+        """
+        New doc_id for a document inserted into a field sharded table without one
+        """
+        table   = self.__core.table('_shard_ids')
+        entry   = table.get(doc_id=1)
+        last_id = 0 if isinstance(entry, type(None)) else entry.get(name, 0)
+
+        self.__set_last_id(name, last_id + 1)
+        return last_id + 1
+
+
+    def __set_last_id(self, name: str, last_id: int):
+        self.__core.table('_shard_ids').upsert(Document({ name : last_id }, doc_id=1))
+
+
+    def __build_ids(self, name: str):
+        """
+        Fills in the `_ids` shards of a table from a db made before they existed.
+        Has to go through every shard, but only once.
+        """
+        start   = time.perf_counter()
+        num_ids = 0
+
+        for key in self.keys(name):
+            docs = self.docs(key, name)
+            if isinstance(docs, type(None)):
+                continue
+
+            for doc_id in docs:
+                self.set_doc_key(name, int(doc_id), key)
+                num_ids += 1
+
+        self.commit()
+
+        self.__indexed.add(name)
+        self.__core.table('_shard_dirs').upsert(Document({ name : True }, doc_id=1))
+
+        self.__logger.info(f'Built shard ids of {num_ids} documents in table "{name}" ({time.perf_counter() - start:.2f} s)')
+
+
+    def __ids_key(self, doc_id: int) -> str:
+        return f'_ids-{doc_id % DbSharded.__ID_BUCKETS}'
+
+
+    @staticmethod
+    def __is_field(shard_by: Union[str, int]) -> bool:
+        return isinstance(shard_by, str) and shard_by != 'doc_id'
+
+
+    def __load(self, key: str, create: bool) -> Optional[dict]:
+        if key in self.__loaded:
+            self.__loaded.move_to_end(key)
+            return self.__loaded[key]
+
+        if key not in self.__keys:
+            if not create:
+                return None
+
+            shard = {}
+            self.__keys.add(key)
+        else:
+            start = time.perf_counter()
+            shard = DbAtomicJsonStorage(self.__file(key), serializer=self.__serializer).read()
+            shard = shard if not isinstance(shard, type(None)) else {}
+
+            self.__stats['loads']     += 1
+            self.__stats['load_time'] += time.perf_counter() - start
+
+        self.__loaded[key] = shard
+        self.__evict(keep=key)
+        return shard
+
+
+    def __evict(self, keep: str):
+        while len(self.__loaded) > self.__max_loaded:
+            key = next(iter(self.__loaded))
+            if key == keep:
+                self.__loaded.move_to_end(key)
+                continue
+
+            if key in self.__dirty:
+                self.__write(key)
+
+            # Writing an empty shard drops it on its own
+            self.__loaded.pop(key, None)
+            self.__stats['evictions'] += 1
+
+
+    def __write(self, key: str):
+        shard = self.__loaded[key]
+        self.__dirty.discard(key)
+
+        start = time.perf_counter()
+
+        try:
+            for name in [ name for name, docs in shard.items() if len(docs) == 0 ]:
+                del shard[name]
+
+            if len(shard) == 0:
+                # Nothing left in the shard
+                try: os.remove(self.__file(key))
+                except FileNotFoundError:
+                    pass
+
+                self.__keys.discard(key)
+                self.__loaded.pop(key, None)
+                return
+
+            num_bytes = DbAtomicJsonStorage(self.__file(key), serializer=self.__serializer).write(shard)
+        except Exception:
+            self.__dirty.add(key)
+            raise
+
+        self.__stats['writes']        += 1
+        self.__stats['write_time']    += time.perf_counter() - start
+        self.__stats['bytes_written'] += num_bytes
+
+
+    def __file(self, key: str) -> str:
+        return os.path.join(self.__shard_dir, f'{key}.json')
+
+
+    def __flush_loop(self):
+        while not self.__flush_evt.wait(self.__flush_interval):
+            try: self.flush()
+            except Exception as e:
+                self.__logger.error(f'db shard flush failed; Will retry in {self.__flush_interval} seconds | {type(e)}: {e}')
+
+
+
+class DbShardedTable():
+    """
+    Mirrors the `tinydb.table.Table` methods the bot uses
+    """
+
+    def __init__(self, db: DbSharded, name: str, shard_by: Union[str, int]):
+        self.__db       = db
+        self.__name     = name
+        self.__shard_by = shard_by
+
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+
+    def insert(self, document: Mapping) -> int:
+        with self.__db.lock:
+            doc_id = self.__insert(document)
+            self.__db.commit()
+            return doc_id
+
+
+    def insert_multiple(self, documents: Iterable[Mapping]) -> "list[int]":
+        with self.__db.lock:
+            doc_ids = [ self.__insert(document) for document in documents ]
+            self.__db.commit()
+            return doc_ids
+
+
+    def all(self) -> "list[Document]":
+        return list(iter(self))
+
+
+    def search(self, cond: tinydb.queries.QueryLike) -> "list[Document]":
+        with self.__db.lock:
+            return [ doc for key, doc in self.__select(cond) ]
+
+
+    def get(self, cond: Optional[tinydb.queries.QueryLike] = None, doc_id: Optional[int] = None, doc_ids: Optional[list] = None):
+        with self.__db.lock:
+            if not isinstance(doc_id, type(None)):
+                key  = self.__doc_key(doc_id)
+                docs = None if isinstance(key, type(None)) else self.__db.docs(key, self.__name)
+                if isinstance(docs, type(None)) or str(doc_id) not in docs:
+                    return None
+
+                return Document(docs[str(doc_id)], doc_id)
+
+            if not isinstance(doc_ids, type(None)):
+                return [ doc for doc in [ self.get(doc_id=doc_id) for doc_id in doc_ids ] if not isinstance(doc, type(None)) ]
+
+            if not isinstance(cond, type(None)):
+                return next((doc for key, doc in self.__select(cond)), None)
+
+        raise RuntimeError('You have to pass either cond or doc_id or doc_ids')
+
+
+    def contains(self, cond: Optional[tinydb.queries.QueryLike] = None, doc_id: Optional[int] = None) -> bool:
+        if not isinstance(doc_id, type(None)):
+            return not isinstance(self.get(doc_id=doc_id), type(None))
+
+        if not isinstance(cond, type(None)):
+            return not isinstance(self.get(cond), type(None))
+
+        raise RuntimeError('You have to pass either cond or doc_id')
+
+
+    def count(self, cond: tinydb.queries.QueryLike) -> int:
+        return len(self.search(cond))
+
+
+    def update(self, fields: Union[Mapping, Callable], cond: Optional[tinydb.queries.QueryLike] = None, doc_ids: Optional[Iterable[int]] = None) -> "list[int]":
+        if callable(fields):
+            perform_update = fields
+        else:
+            perform_update = lambda doc: doc.update(fields)
+
+        with self.__db.lock:
+            if not isinstance(doc_ids, type(None)):
+                docs = [ (self.__doc_key(doc.doc_id), doc) for doc in self.get(doc_ids=list(doc_ids)) ]
+            elif not isinstance(cond, type(None)):
+                docs = list(self.__select(cond))
+            else:
+                docs = list(self.__select(None))
+
+            for key, doc in docs:
+                perform_update(doc)
+
+                new_key = self.__key(doc.doc_id, doc)
+                if new_key != key:
+                    # Guild field changed, document moves to another shard
+                    del self.__db.docs(key, self.__name)[str(doc.doc_id)]
+                    self.__db.changed(key)
+
+                self.__db.docs(new_key, self.__name, create=True)[str(doc.doc_id)] = dict(doc)
+                self.__db.changed(new_key)
+                self.__set_doc_key(doc.doc_id, new_key)
+
+            self.__db.commit()
+
+        return [ doc.doc_id for key, doc in docs ]
+
+
+    def upsert(self, document: Mapping, cond: Optional[tinydb.queries.QueryLike] = None) -> "list[int]":
+        if isinstance(document, Document):
+            doc_ids = [ document.doc_id ]
+        else:
+            doc_ids = None
+
+        if isinstance(doc_ids, type(None)) and isinstance(cond, type(None)):
+            raise ValueError('If you don\'t specify a search query, you must specify a doc_id. Hint: use a table.Document object.')
+
+        with self.__db.lock:
+            updated_ids = self.update(document, cond, doc_ids)
+            if len(updated_ids) != 0:
+                return updated_ids
+
+            return [ self.insert(document) ]
+
+
+    def remove(self, cond: Optional[tinydb.queries.QueryLike] = None, doc_ids: Optional[Iterable[int]] = None) -> "list[int]":
+        with self.__db.lock:
+            if not isinstance(doc_ids, type(None)):
+                docs = [ (self.__doc_key(doc.doc_id), doc) for doc in self.get(doc_ids=list(doc_ids)) ]
+            elif not isinstance(cond, type(None)):
+                docs = list(self.__select(cond))
+            else:
+                raise RuntimeError('Use truncate() to remove all documents')
+
+            for key, doc in docs:
+                del self.__db.docs(key, self.__name)[str(doc.doc_id)]
+                self.__db.changed(key)
+                self.__set_doc_key(doc.doc_id, None)
+
+            self.__db.commit()
+
+        return [ doc.doc_id for key, doc in docs ]
+
+
+    def truncate(self):
+        with self.__db.lock:
+            for key in self.__db.keys(self.__name):
+                docs = self.__db.docs(key, self.__name)
+                if isinstance(docs, type(None)) or len(docs) == 0:
+                    continue
+
+                for doc_id in docs:
+                    self.__set_doc_key(int(doc_id), None)
+
+                docs.clear()
+                self.__db.changed(key)
+
+            self.__db.commit()
+
+
+    def __len__(self) -> int:
+        with self.__db.lock:
+            return sum([ len(self.__db.docs(key, self.__name) or {}) for key in self.__db.keys(self.__name) ])
+
+
+    def __iter__(self) -> Iterator[Document]:
+        with self.__db.lock:
+            docs = [ doc for key, doc in self.__select(None) ]
+
+        for doc in docs:
+            yield doc
+
+
+    def __insert(self, document: Mapping) -> int:
+        if not isinstance(document, Mapping):
+            raise ValueError('Document is not a Mapping')
+
+        if isinstance(document, Document):
+            doc_id = document.doc_id
+        elif self.__is_field_sharded():
+            doc_id = self.__db.next_id(self.__name)
+        else:
+            raise ValueError(f'Documents in table "{self.__name}" need a doc_id. Hint: use a table.Document object.')
+
+        key  = self.__key(doc_id, document)
+        docs = self.__db.docs(key, self.__name, create=True)
+        if str(doc_id) in docs:
+            raise ValueError(f'Document with ID {doc_id} already exists')
+
+        docs[str(doc_id)] = dict(document)
+        self.__db.changed(key)
+        self.__set_doc_key(doc_id, key)
+
+        return doc_id
+
+
+    def __select(self, cond: Optional[tinydb.queries.QueryLike]) -> Iterator[tuple]:
+        """
+        Yields (shard key, document) of documents matching `cond`, or all if None
+        """
+        keys = None
+
+        if self.__is_field_sharded() and not isinstance(cond, type(None)):
+            fields = DbQuery.eq_fields(cond)
+            if not isinstance(fields, type(None)) and self.__shard_by in fields:
+                key  = str(fields[self.__shard_by])
+                keys = [ key ] if self.__db.has_key(key) else []
+
+        if isinstance(keys, type(None)):
+            keys = self.__db.keys(self.__name)
+
+        for key in keys:
+            docs = self.__db.docs(key, self.__name)
+            if isinstance(docs, type(None)):
+                continue
+
+            for doc_id, doc in docs.items():
+                doc = Document(doc, int(doc_id))
+                if isinstance(cond, type(None)) or cond(doc):
+                    yield key, doc
+
+
+    def __key(self, doc_id: int, document: Mapping) -> str:
+        if isinstance(self.__shard_by, int):
+            return f'{self.__name}-{doc_id % self.__shard_by}'
+
+        if self.__shard_by == 'doc_id':
+            return str(doc_id)
+
+        try: return str(int(document[self.__shard_by]))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Document in table "{self.__name}" needs an int "{self.__shard_by}" field to be sharded by')
+
+
+    def __doc_key(self, doc_id: int) -> Optional[str]:
+        if self.__is_field_sharded():
+            return self.__db.doc_key(self.__name, doc_id)
+
+        return self.__key(doc_id, {})
+
+
+    def __set_doc_key(self, doc_id: int, key: Optional[str]):
+        if self.__is_field_sharded():
+            self.__db.set_doc_key(self.__name, doc_id, key)
+
+
+    def __is_field_sharded(self) -> bool:
+        return isinstance(self.__shard_by, str) and self.__shard_by != 'doc_id'
@@ -0,0 +1,371 @@
+from typing import Callable, Iterable, Iterator, Mapping, Optional, Union
+
+import json
+import sqlite3
+import logging
+import threading
+import time
+
+import tinydb
+from tinydb.table import Document
+
+from .db_query import DbQuery
+
+
+class DbSqlite():
+    """
+    SQLite backed drop-in for the part of `tinydb.TinyDB` the bot uses
+
+    Each table is an SQL table of `(doc_id, data)` rows, with the document stored
+    as JSON in `data`. Tables keep TinyDB's doc_id semantics and return
+    `tinydb.table.Document` objects. Queries that boil down to field equality are
+    turned into SQL lookups and can use the declared indexes; any other query is
+    evaluated against every document like TinyDB would.
+
+    The connection runs in WAL mode and is shared between threads under a lock.
+    """
+
+    def __init__(self, path: str, indexes: Optional[dict] = None):
+        """
+        Params
+        ======
+        path: str
+            Database file path
+
+        indexes: dict
+            Table name -> list of field tuples to index, ex: `{ 'cmd_stats' : [ ('cmd', 'server') ] }`
+        """
+        self.__logger = logging.getLogger(__class__.__name__)
+        self.__lock   = threading.RLock()
+
+        self.__path    = path
+        self.__indexes = indexes if not isinstance(indexes, type(None)) else {}
+        self.__tables  = {}
+
+        self.__stats = {
+            'reads'      : 0,
+            'read_time'  : 0.0,
+            'writes'     : 0,
+            'write_time' : 0.0,
+        }
+
+        self.__conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.__conn.execute('PRAGMA journal_mode=WAL')
+        self.__conn.execute('PRAGMA synchronous=NORMAL')
+
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+
+    @property
+    def stats(self) -> dict:
+        with self.__lock:
+            return dict(self.__stats)
+
+
+    def table(self, name: str) -> "DbSqliteTable":
+        if name in self.__tables:
+            return self.__tables[name]
+
+        with self.__lock:
+            self.__conn.execute(f'CREATE TABLE IF NOT EXISTS {DbSqlite.__quote(name)} (doc_id INTEGER PRIMARY KEY, data TEXT NOT NULL)')
+
+            for fields in self.__indexes.get(name, []):
+                index_name = '__'.join([ name, *fields ])
+                columns    = ', '.join([ DbSqlite.field_expr(field) for field in fields ])
+                self.__conn.execute(f'CREATE INDEX IF NOT EXISTS {DbSqlite.__quote(index_name)} ON {DbSqlite.__quote(name)} ({columns})')
+
+        table = DbSqliteTable(self, name)
+        self.__tables[name] = table
+        return table
+
+
+    def tables(self) -> set:
+        rows = self.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+        return set([ row[0] for row in rows ])
+
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
+
+
+    def execute(self, sql: str, params: Iterable = (), write: bool = False) -> sqlite3.Cursor:
+        with self.__lock:
+            start  = time.perf_counter()
+            cursor = self.__conn.execute(sql, tuple(params))
+            self.__add_stat(write, start)
+            return cursor
+
+
+    def executemany(self, sql: str, params: Iterable[Iterable]) -> sqlite3.Cursor:
+        with self.__lock:
+            start  = time.perf_counter()
+            cursor = self.__conn.executemany(sql, params)
+            self.__add_stat(True, start)
+            return cursor
+
+
+    def transaction(self) -> "DbSqliteTransaction":
+        """
+        Context manager grouping all statements made within it into one commit
+        """
+        return DbSqliteTransaction(self.__conn, self.__lock)
+
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        Imports all tables of a TinyDB json file. Documents that already exist are
+        overwritten. Returns number of imported documents.
+        """
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = f.read()
+
+        data = json.loads(data) if data else {}
+        num_docs = 0
+
+        with self.transaction():
+            for name, docs in data.items():
+                table = self.table(name)
+                self.executemany(
+                    f'INSERT OR REPLACE INTO {table.sql_name} (doc_id, data) VALUES (?, ?)',
+                    [ (int(doc_id), json.dumps(doc)) for doc_id, doc in docs.items() ]
+                )
+                num_docs += len(docs)
+
+        self.__logger.info(f'Migrated {num_docs} documents in {len(data)} tables from {json_path} to {self.__path}')
+        return num_docs
+
+
+    @staticmethod
+    def field_expr(field: str) -> str:
+        # Indexes are only used by queries that have the exact same expression
+        return f"json_extract(data, '$.\"{field}\"')"
+
+
+    @staticmethod
+    def __quote(name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+
+
+    def __add_stat(self, write: bool, start: float):
+        if write:
+            self.__stats['writes']     += 1
+            self.__stats['write_time'] += time.perf_counter() - start
+        else:
+            self.__stats['reads']     += 1
+            self.__stats['read_time'] += time.perf_counter() - start
+
+
+
+class DbSqliteTransaction():
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.RLock):
+        self.__conn  = conn
+        self.__lock  = lock
+        self.__depth = 0
+
+
+    def __enter__(self):
+        self.__lock.acquire()
+
+        if not self.__conn.in_transaction:
+            self.__conn.execute('BEGIN')
+            self.__depth = 1
+
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.__depth == 1:
+                self.__conn.execute('COMMIT' if isinstance(exc_type, type(None)) else 'ROLLBACK')
+        finally:
+            self.__lock.release()
+
+
+
+class DbSqliteTable():
+    """
+    Mirrors the `tinydb.table.Table` methods the bot uses
+    """
+
+    def __init__(self, db: DbSqlite, name: str):
+        self.__db   = db
+        self.__name = name
+        self.__sql_name = '"' + name.replace('"', '""') + '"'
+
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+
+    @property
+    def sql_name(self) -> str:
+        return self.__sql_name
+
+
+    def insert(self, document: Mapping) -> int:
+        if not isinstance(document, Mapping):
+            raise ValueError('Document is not a Mapping')
+
+        doc_id = document.doc_id if isinstance(document, Document) else None
+
+        try:
+            cursor = self.__db.execute(
+                f'INSERT INTO {self.__sql_name} (doc_id, data) VALUES (?, ?)',
+                (doc_id, json.dumps(dict(document))), write=True
+            )
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f'Document with ID {doc_id} already exists') from e
+
+        return cursor.lastrowid
+
+
+    def insert_multiple(self, documents: Iterable[Mapping]) -> "list[int]":
+        with self.__db.transaction():
+            return [ self.insert(document) for document in documents ]
+
+
+    def all(self) -> "list[Document]":
+        return list(iter(self))
+
+
+    def search(self, cond: tinydb.queries.QueryLike) -> "list[Document]":
+        return list(self.__select(cond))
+
+
+    def get(self, cond: Optional[tinydb.queries.QueryLike] = None, doc_id: Optional[int] = None, doc_ids: Optional[list] = None):
+        if not isinstance(doc_id, type(None)):
+            row = self.__db.execute(f'SELECT doc_id, data FROM {self.__sql_name} WHERE doc_id = ?', (doc_id,)).fetchone()
+            return None if isinstance(row, type(None)) else DbSqliteTable.__to_doc(row)
+
+        if not isinstance(doc_ids, type(None)):
+            return [ doc for doc in [ self.get(doc_id=doc_id) for doc_id in doc_ids ] if not isinstance(doc, type(None)) ]
+
+        if not isinstance(cond, type(None)):
+            return next(self.__select(cond), None)
+
+        raise RuntimeError('You have to pass either cond or doc_id or doc_ids')
+
+
+    def contains(self, cond: Optional[tinydb.queries.QueryLike] = None, doc_id: Optional[int] = None) -> bool:
+        if not isinstance(doc_id, type(None)):
+            row = self.__db.execute(f'SELECT 1 FROM {self.__sql_name} WHERE doc_id = ?', (doc_id,)).fetchone()
+            return not isinstance(row, type(None))
+
+        if not isinstance(cond, type(None)):
+            return not isinstance(self.get(cond), type(None))
+
+        raise RuntimeError('You have to pass either cond or doc_id')
+
+
+    def count(self, cond: tinydb.queries.QueryLike) -> int:
+        return len(self.search(cond))
+
+
+    def update(self, fields: Union[Mapping, Callable], cond: Optional[tinydb.queries.QueryLike] = None, doc_ids: Optional[Iterable[int]] = None) -> "list[int]":
+        if callable(fields):
+            perform_update = fields
+        else:
+            perform_update = lambda doc: doc.update(fields)
+
+        with self.__db.transaction():
+            if not isinstance(doc_ids, type(None)):
+                docs = self.get(doc_ids=list(doc_ids))
+            elif not isinstance(cond, type(None)):
+                docs = self.search(cond)
+            else:
+                docs = self.all()
+
+            for doc in docs:
+                perform_update(doc)
+
+            self.__db.executemany(
+                f'UPDATE {self.__sql_name} SET data = ? WHERE doc_id = ?',
+                [ (json.dumps(dict(doc)), doc.doc_id) for doc in docs ]
+            )
+
+        return [ doc.doc_id for doc in docs ]
+
+
+    def upsert(self, document: Mapping, cond: Optional[tinydb.queries.QueryLike] = None) -> "list[int]":
+        if isinstance(document, Document):
+            doc_ids = [ document.doc_id ]
+        else:
+            doc_ids = None
+
+        if isinstance(doc_ids, type(None)) and isinstance(cond, type(None)):
+            raise ValueError('If you don\'t specify a search query, you must specify a doc_id. Hint: use a table.Document object.')
+
+        with self.__db.transaction():
+            updated_ids = self.update(document, cond, doc_ids)
+            if len(updated_ids) != 0:
+                return updated_ids
+
+            return [ self.insert(document) ]
+
+
+    def remove(self, cond: Optional[tinydb.queries.QueryLike] = None, doc_ids: Optional[Iterable[int]] = None) -> "list[int]":
+        with self.__db.transaction():
+            if not isinstance(doc_ids, type(None)):
+                doc_ids = [ doc.doc_id for doc in self.get(doc_ids=list(doc_ids)) ]
+            elif not isinstance(cond, type(None)):
+                doc_ids = [ doc.doc_id for doc in self.search(cond) ]
+            else:
+                raise RuntimeError('Use truncate() to remove all documents')
+
+            self.__db.executemany(f'DELETE FROM {self.__sql_name} WHERE doc_id = ?', [ (doc_id,) for doc_id in doc_ids ])
+
+        return doc_ids
+
+
+    def truncate(self):
+        self.__db.execute(f'DELETE FROM {self.__sql_name}', write=True)
+
+
+    def __len__(self) -> int:
+        return self.__db.execute(f'SELECT COUNT(*) FROM {self.__sql_name}').fetchone()[0]
+
+
+    def __iter__(self) -> Iterator[Document]:
+        rows = self.__db.execute(f'SELECT doc_id, data FROM {self.__sql_name}').fetchall()
+        for row in rows:
+            yield DbSqliteTable.__to_doc(row)
+
+
+    def __select(self, cond: tinydb.queries.QueryLike) -> Iterator[Document]:
+        fields = DbQuery.eq_fields(cond)
+
+        if isinstance(fields, type(None)) or len(fields) == 0 or None in fields.values():
+            for doc in self:
+                if cond(doc):
+                    yield doc
+            return
+
+        where  = ' AND '.join([ f'{DbSqlite.field_expr(field)} = ?' for field in fields ])
+        params = [ DbSqliteTable.__to_sql_value(value) for value in fields.values() ]
+
+        rows = self.__db.execute(f'SELECT doc_id, data FROM {self.__sql_name} WHERE {where}', params).fetchall()
+        for row in rows:
+            doc = DbSqliteTable.__to_doc(row)
+
+            # SQL compares loosely (ex: 1 == true), the query has the final say
+            if cond(doc):
+                yield doc
+
+
+    @staticmethod
+    def __to_doc(row: tuple) -> Document:
+        return Document(json.loads(row[1]), row[0])
+
+
+    @staticmethod
+    def __to_sql_value(value):
+        if isinstance(value, (dict, list, tuple)):
+            return json.dumps(value)
+
+        return value
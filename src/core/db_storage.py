@@ -0,0 +1,97 @@
+from typing import Optional
+
+from tinydb import Storage
+
+import os
+
+from .db_serializer import DbSerializer
+
+
+class DbAtomicJsonStorage(Storage):
+    """
+    JSON file storage that never leaves a partially written db behind
+
+    Data is written to a temporary file next to the db, synced and then renamed
+    over the old file. A crash mid-write leaves either the old or the new db.
+    """
+
+    def __init__(self, path: str, encoding: str = 'utf-8', serializer: Optional[DbSerializer] = None, **kwargs):
+        """
+        Params
+        ======
+        serializer: DbSerializer
+            Defaults to the stdlib json one, which gets `kwargs` (ex: `indent`)
+        """
+        Storage.__init__(self)
+
+        self.__path       = path
+        self.__tmp_path   = f'{path}.tmp'
+        self.__encoding   = encoding
+        self.__serializer = serializer if not isinstance(serializer, type(None)) else DbSerializer.get('json', **kwargs)
+
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+
+    @property
+    def serializer(self) -> DbSerializer:
+        return self.__serializer
+
+
+    def read(self) -> Optional[dict]:
+        try:
+            with open(self.__path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        if not data:
+            return None
+
+        if self.__encoding != 'utf-8':
+            data = data.decode(self.__encoding)
+
+        return self.__serializer.loads(data)
+
+
+    def write(self, data: dict) -> int:
+        """
+        Returns number of bytes written
+        """
+        return self.finish_write(self.prepare_write(data))
+
+
+    def prepare_write(self, data: dict) -> bytes:
+        """
+        First half of `write`: serializes `data`, for callers that need to hold
+        a lock while it can't change and do the file I/O without it
+        """
+        serialized = self.__serializer.dumps(data)
+        if self.__encoding != 'utf-8':
+            serialized = serialized.decode('utf-8').encode(self.__encoding)
+
+        return serialized
+
+
+    def finish_write(self, serialized: bytes) -> int:
+        """
+        Second half of `write`: writes what `prepare_write` returned. Returns
+        number of bytes written.
+        """
+        with open(self.__tmp_path, 'wb') as f:
+            f.write(serialized)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(self.__tmp_path, self.__path)
+        return len(serialized)
+
+
+    def close(self):
+        pass
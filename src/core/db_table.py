@@ -0,0 +1,236 @@
+from typing import Optional
+
+import threading
+
+import tinydb
+from tinydb.table import Table, Document
+
+from .db_query import DbQuery
+
+
+class DbTable(Table):
+    """
+    TinyDB table whose write operations are atomic across threads
+
+    TinyDB updates a table by reading the whole db, modifying it and writing it
+    back. Two threads doing that at once lose one of the updates, so every write
+    operation holds the storage's `op_lock` from start to end.
+
+    Tables can also be given `indexes`, tuples of fields commonly looked up
+    together, ex: `[ ('cmd', 'server') ]`. A `search`/`get` whose query is a
+    fragment or field equality covering all fields of an index becomes a hash
+    lookup instead of a scan. Indexes are built on first use and kept up to date
+    by the write operations. If the table data gets replaced by anything else
+    (ex: a db reload), they are rebuilt on next use.
+    """
+
+    def __init__(self, *args, indexes: "list[tuple]" = (), **kwargs):
+        Table.__init__(self, *args, **kwargs)
+
+        # Fields -> { (values): set(doc_ids) }
+        self.__indexes = { tuple(fields) : {} for fields in indexes }
+
+        # Fields -> { doc_id : (values) }, to find a changed document's old entry
+        self.__index_keys = { fields : {} for fields in self.__indexes }
+
+        # Table data the indexes were built from, None if not built
+        self.__indexed_table = None
+
+
+    def insert(self, *args, **kwargs):
+        with self.__op_lock():
+            before = self._read_table()
+            doc_id = Table.insert(self, *args, **kwargs)
+            self.__reindex(before, [ doc_id ])
+            return doc_id
+
+
+    def insert_multiple(self, *args, **kwargs):
+        with self.__op_lock():
+            before  = self._read_table()
+            doc_ids = Table.insert_multiple(self, *args, **kwargs)
+            self.__reindex(before, doc_ids)
+            return doc_ids
+
+
+    def update(self, *args, **kwargs):
+        with self.__op_lock():
+            before  = self._read_table()
+            doc_ids = Table.update(self, *args, **kwargs)
+            self.__reindex(before, doc_ids)
+            return doc_ids
+
+
+    def update_multiple(self, *args, **kwargs):
+        with self.__op_lock():
+            before  = self._read_table()
+            doc_ids = Table.update_multiple(self, *args, **kwargs)
+            self.__reindex(before, doc_ids)
+            return doc_ids
+
+
+    def upsert(self, *args, **kwargs):
+        with self.__op_lock():
+            return Table.upsert(self, *args, **kwargs)
+
+
+    def remove(self, *args, **kwargs):
+        with self.__op_lock():
+            before  = self._read_table()
+            doc_ids = Table.remove(self, *args, **kwargs)
+            self.__reindex(before, doc_ids)
+            return doc_ids
+
+
+    def truncate(self):
+        with self.__op_lock():
+            Table.truncate(self)
+            self.__indexed_table = None
+
+
+    def search(self, cond: tinydb.queries.QueryLike) -> "list[Document]":
+        doc_ids = self.__lookup(cond)
+        if isinstance(doc_ids, type(None)):
+            return Table.search(self, cond)
+
+        table = self._read_table()
+        docs  = [ Document(table[str(doc_id)], doc_id) for doc_id in sorted(doc_ids) if str(doc_id) in table ]
+
+        # The index only narrows down candidates, the query has the final say
+        return [ doc for doc in docs if cond(doc) ]
+
+
+    def get(self, cond: Optional[tinydb.queries.QueryLike] = None, doc_id: Optional[int] = None, doc_ids: Optional[list] = None):
+        if isinstance(doc_id, type(None)) and isinstance(doc_ids, type(None)) and not isinstance(cond, type(None)):
+            if not isinstance(self.__lookup(cond), type(None)):
+                return next(iter(self.search(cond)), None)
+
+        return Table.get(self, cond, doc_id, doc_ids)
+
+
+    def __op_lock(self) -> threading.RLock:
+        return self._storage.op_lock
+
+
+    def __lookup(self, cond: tinydb.queries.QueryLike) -> Optional[set]:
+        """
+        Ids of the documents that can match `cond`, or None if no index applies
+        """
+        if len(self.__indexes) == 0:
+            return None
+
+        fields = DbQuery.eq_fields(cond)
+        if isinstance(fields, type(None)):
+            return None
+
+        # Most specific index the query covers
+        index_fields = None
+        for candidate in self.__indexes:
+            if all([ field in fields for field in candidate ]):
+                if isinstance(index_fields, type(None)) or len(candidate) > len(index_fields):
+                    index_fields = candidate
+
+        if isinstance(index_fields, type(None)):
+            return None
+
+        key = tuple([ fields[field] for field in index_fields ])
+
+        if self.__indexed_table is not self._read_table():
+            with self.__op_lock():
+                table = self._read_table()
+                if self.__indexed_table is not table:
+                    self.__build(table)
+
+        try: return set(self.__indexes[index_fields].get(key, ()))
+        except TypeError:
+            # Unhashable value, ex: list
+            return None
+
+
+    def __build(self, table: dict):
+        for fields in self.__indexes:
+            self.__indexes[fields]    = {}
+            self.__index_keys[fields] = {}
+
+        for doc_id, doc in table.items():
+            self.__add(int(doc_id), doc)
+
+        self.__indexed_table = table
+
+
+    def __reindex(self, before: dict, doc_ids: "list[int]"):
+        if len(self.__indexes) == 0:
+            return
+
+        if self.__indexed_table is not before:
+            # Not built, or out of date already; gets rebuilt on next lookup
+            self.__indexed_table = None
+            return
+
+        table = self._read_table()
+
+        for doc_id in doc_ids:
+            self.__discard(doc_id)
+
+            doc = table.get(str(doc_id), None)
+            if not isinstance(doc, type(None)):
+                self.__add(doc_id, doc)
+
+        self.__indexed_table = table
+
+
+    def __add(self, doc_id: int, doc: dict):
+        for fields, index in self.__indexes.items():
+            # Documents missing a field can't match an equality on it
+            if not all([ field in doc for field in fields ]):
+                continue
+
+            key = tuple([ doc[field] for field in fields ])
+
+            try: index.setdefault(key, set()).add(doc_id)
+            except TypeError:
+                continue
+
+            self.__index_keys[fields][doc_id] = key
+
+
+    def __discard(self, doc_id: int):
+        for fields, index in self.__indexes.items():
+            key = self.__index_keys[fields].pop(doc_id, None)
+            if isinstance(key, type(None)):
+                continue
+
+            doc_ids = index.get(key, None)
+            if isinstance(doc_ids, type(None)):
+                continue
+
+            doc_ids.discard(doc_id)
+            if len(doc_ids) == 0:
+                del index[key]
+
+
+
+class DbTinyDB(tinydb.TinyDB):
+    """
+    TinyDB using `DbTable` tables. Expects a storage providing `op_lock`, such
+    as `DbThreadSafeMiddleware`.
+    """
+
+    table_class = DbTable
+
+    def __init__(self, *args, indexes: Optional[dict] = None, **kwargs):
+        """
+        Params
+        ======
+        indexes: dict
+            Table name -> list of field tuples to index, ex: `{ 'cmd_stats' : [ ('cmd', 'server') ] }`
+
+        Other args are passed to TinyDB
+        """
+        self.__indexes = indexes if not isinstance(indexes, type(None)) else {}
+        tinydb.TinyDB.__init__(self, *args, **kwargs)
+
+
+    def table(self, name: str, **kwargs) -> DbTable:
+        kwargs.setdefault('indexes', self.__indexes.get(name, ()))
+        return tinydb.TinyDB.table(self, name, **kwargs)
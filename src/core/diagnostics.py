@@ -0,0 +1,76 @@
+from typing import Optional
+
+import sys
+import contextlib
+import contextvars
+import warnings
+
+
+class Diagnostics():
+    """
+    Warnings collected per task
+
+    `capture()` starts collecting the warnings of the current task, which
+    includes whatever it awaits and tasks it creates from then on, ex: one
+    command invocation. Concurrent commands each have their own collection,
+    and nothing process wide gets swapped in and out like with
+    `warnings.catch_warnings`.
+
+    Code reports with `Diagnostics.warn`. Warnings raised through the
+    `warnings` module, ex: by libraries, are collected as well once
+    `install()` has been called. Outside of a capture, warnings go through
+    the `warnings` module as usual.
+    """
+
+    __records = contextvars.ContextVar('diagnostics_records', default=None)
+    __showwarning = None
+
+    @staticmethod
+    def install():
+        """
+        Routes warnings shown by the `warnings` module into the current capture
+        """
+        if not isinstance(Diagnostics.__showwarning, type(None)):
+            return
+
+        Diagnostics.__showwarning = warnings.showwarning
+        warnings.showwarning = Diagnostics.__on_showwarning
+
+
+    @staticmethod
+    @contextlib.contextmanager
+    def capture() -> "list[warnings.WarningMessage]":
+        """
+        Collects the warnings reported in the current task into the list yielded
+        """
+        records = []
+        token = Diagnostics.__records.set(records)
+
+        try: yield records
+        finally:
+            Diagnostics.__records.reset(token)
+
+
+    @staticmethod
+    def warn(message: str, category: type = UserWarning, stacklevel: int = 1):
+        """
+        Same as `warnings.warn`, but goes to the current capture if there is one.
+        Every call gets collected, not only the first one from a location.
+        """
+        records = Diagnostics.__records.get()
+        if isinstance(records, type(None)):
+            warnings.warn(message, category, stacklevel=stacklevel + 1)
+            return
+
+        frame = sys._getframe(stacklevel)
+        records.append(warnings.WarningMessage(category(message), category, frame.f_code.co_filename, frame.f_lineno))
+
+
+    @staticmethod
+    def __on_showwarning(message: Warning, category: type, filename: str, lineno: int, file: Optional[object] = None, line: Optional[str] = None):
+        records = Diagnostics.__records.get()
+        if isinstance(records, type(None)):
+            Diagnostics.__showwarning(message, category, filename, lineno, file, line)
+            return
+
+        records.append(warnings.WarningMessage(message, category, filename, lineno, file, line))
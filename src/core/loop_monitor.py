@@ -0,0 +1,204 @@
+import os
+import sys
+import asyncio
+import logging
+import threading
+import collections
+import time
+
+
+class LoopMonitor():
+    """
+    Measures how late the event loop runs things and finds what blocks it
+
+    A heartbeat task sleeps `interval` seconds at a time; how much later than
+    that it wakes up is the loop lag, kept in a histogram over the last
+    `window` seconds. A lag of `threshold` seconds or more is a stall.
+
+    While a stall is going on the loop can't tell what's blocking it, so a
+    watchdog thread checks on the heartbeat. When it's overdue, the thread
+    notes the task running on the loop and the line of bot code the loop
+    thread is at. The task name is what was dispatched: commands run as
+    'cmd:<name>' tasks and events as 'event:<name>'.
+    """
+
+    # Upper bounds of the histogram buckets (s), the last bucket has no bound
+    BUCKETS = ( 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0 )
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1, window: float = 600, max_stalls: int = 32):
+        """
+        Params
+        ======
+        interval: float
+            Seconds between heartbeats
+
+        threshold: float
+            Lag (s) from which on it's a stall that gets logged and attributed
+
+        window: float
+            Seconds of history the histogram covers, rounded up to whole minutes
+
+        max_stalls: int
+            How many of the most recent stalls are kept
+        """
+        self.__logger = logging.getLogger(__class__.__name__)
+
+        self.__interval  = interval
+        self.__threshold = threshold
+
+        # (minute, bucket counts, lag sum, max lag), oldest first
+        self.__minutes = collections.deque(maxlen=max(1, int((window + 59) // 60)))
+
+        # Dispatch name -> [ count, total lag, max lag ]
+        self.__stall_totals = {}
+        self.__stalls = collections.deque(maxlen=max_stalls)
+
+        self.__loop = None
+        self.__loop_thread_id = None
+
+        self.__beat = time.monotonic()
+
+        # (heartbeat it's late for, dispatch name, location) of what the watchdog found blocking the loop
+        self.__suspect = None
+
+        # Code under here counts as the bot's
+        self.__src_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+    async def run(self):
+        """
+        Heartbeat; runs until cancelled
+        """
+        self.__loop = asyncio.get_running_loop()
+        self.__loop_thread_id = threading.get_ident()
+        self.__beat = time.monotonic()
+
+        watchdog = threading.Thread(target=self.__watch, name='LoopMonitor', daemon=True)
+        watchdog.start()
+
+        while True:
+            expected = time.monotonic() + self.__interval
+            await asyncio.sleep(self.__interval)
+
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+
+            beat, self.__beat = self.__beat, now
+            suspect = self.__suspect
+
+            self.__add_lag(lag)
+            if lag >= self.__threshold:
+                if isinstance(suspect, type(None)) or suspect[0] != beat:
+                    suspect = ( beat, 'unknown', '' )
+
+                self.__add_stall(lag, suspect[1], suspect[2])
+
+
+    @property
+    def stats(self) -> dict:
+        counts = [ 0 ]*(len(LoopMonitor.BUCKETS) + 1)
+        lag_sum = 0.0
+        lag_max = 0.0
+
+        for _, minute_counts, minute_sum, minute_max in list(self.__minutes):
+            counts   = [ count + minute_count for count, minute_count in zip(counts, minute_counts) ]
+            lag_sum += minute_sum
+            lag_max  = max(lag_max, minute_max)
+
+        labels = [ f'<={bound*1000:g}ms' for bound in LoopMonitor.BUCKETS ] + [ f'>{LoopMonitor.BUCKETS[-1]*1000:g}ms' ]
+        num_samples = sum(counts)
+
+        return {
+            'interval_ms'  : self.__interval*1000,
+            'threshold_ms' : self.__threshold*1000,
+            'window_s'     : len(self.__minutes)*60,
+            'samples'      : num_samples,
+            'lag_avg_ms'   : lag_sum/max(1, num_samples)*1000,
+            'lag_max_ms'   : lag_max*1000,
+            'histogram'    : dict(zip(labels, counts)),
+            'stalls'       : {
+                name : { 'count' : count, 'total_ms' : total*1000, 'max_ms' : max_lag*1000 }
+                for name, (count, total, max_lag) in sorted(self.__stall_totals.items(), key=lambda item: -item[1][1])
+            },
+            'recent'       : list(self.__stalls),
+        }
+
+
+    def __add_lag(self, lag: float):
+        minute = int(time.time() // 60)
+
+        if len(self.__minutes) == 0 or self.__minutes[-1][0] != minute:
+            self.__minutes.append(( minute, [ 0 ]*(len(LoopMonitor.BUCKETS) + 1), 0.0, 0.0 ))
+
+        _, counts, lag_sum, lag_max = self.__minutes[-1]
+
+        bucket = len(LoopMonitor.BUCKETS)
+        for i, bound in enumerate(LoopMonitor.BUCKETS):
+            if lag <= bound:
+                bucket = i
+                break
+
+        counts[bucket] += 1
+        self.__minutes[-1] = ( minute, counts, lag_sum + lag, max(lag_max, lag) )
+
+
+    def __add_stall(self, lag: float, name: str, where: str):
+        totals = self.__stall_totals.setdefault(name, [ 0, 0.0, 0.0 ])
+        totals[0] += 1
+        totals[1] += lag
+        totals[2]  = max(totals[2], lag)
+
+        self.__stalls.append({
+            'time'   : time.time(),
+            'name'   : name,
+            'where'  : where,
+            'lag_ms' : lag*1000,
+        })
+
+        self.__logger.warning(f'Event loop blocked for {lag*1000:.0f} ms | {name} {where}')
+
+
+    def __watch(self):
+        while True:
+            time.sleep(self.__interval)
+
+            # Overdue by more than a sleep; the loop is stuck on something right now
+            beat = self.__beat
+            if time.monotonic() - beat < 2*self.__interval:
+                continue
+
+            # Already found for this stall
+            suspect = self.__suspect
+            if not isinstance(suspect, type(None)) and suspect[0] == beat:
+                continue
+
+            try: self.__suspect = ( beat, self.__running_task_name(), self.__running_code() )
+            except Exception as e:
+                self.__logger.debug(f'Unable to inspect the event loop | {type(e)}: {e}')
+
+
+    def __running_task_name(self) -> str:
+        # Not public asyncio api, but the only way to look from another thread
+        current_tasks = getattr(asyncio.tasks, '_current_tasks', {})
+
+        task = current_tasks.get(self.__loop, None)
+        if isinstance(task, type(None)):
+            # Plain callback, ex: a transport or a `call_soon`
+            return 'callback'
+
+        return task.get_name()
+
+
+    def __running_code(self) -> str:
+        frame = sys._current_frames().get(self.__loop_thread_id, None)
+        if isinstance(frame, type(None)):
+            return ''
+
+        # Innermost frame that's the bot's own code, that's what made the blocking call
+        while not isinstance(frame, type(None)):
+            if frame.f_code.co_filename.startswith(self.__src_path):
+                return f'at {os.path.relpath(frame.f_code.co_filename, self.__src_path)}:{frame.f_lineno} in {frame.f_code.co_name}'
+
+            frame = frame.f_back
+
+        return ''
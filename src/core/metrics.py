@@ -0,0 +1,178 @@
+from typing import Callable, Optional
+
+import bisect
+import math
+
+
+class MetricCounter():
+
+    TYPE = 'counter'
+
+    def __init__(self, name: str, help: str, labels: "tuple[str]" = ()):
+        self.name   = name
+        self.help   = help
+        self.labels = tuple(labels)
+
+        # Label values -> count
+        self.__values = {}
+
+
+    def inc(self, *label_values: str, amount: float = 1):
+        try: self.__values[label_values] += amount
+        except KeyError:
+            self.__values[label_values] = amount
+
+
+    def samples(self) -> "list[tuple[str, tuple, float]]":
+        return [ ( self.name, label_values, value ) for label_values, value in list(self.__values.items()) ]
+
+
+
+class MetricGauge():
+
+    TYPE = 'gauge'
+
+    def __init__(self, name: str, help: str, labels: "tuple[str]" = (), fn: Optional[Callable[[], dict]] = None):
+        """
+        fn: Callable
+            Gets the values when rendered, returns label values -> value. Gauges
+            without it are set with `set`.
+        """
+        self.name   = name
+        self.help   = help
+        self.labels = tuple(labels)
+
+        self.__fn = fn
+
+        # Label values -> value
+        self.__values = {}
+
+
+    def set(self, *label_values: str, value: float):
+        self.__values[label_values] = value
+
+
+    def samples(self) -> "list[tuple[str, tuple, float]]":
+        values = self.__fn() if not isinstance(self.__fn, type(None)) else self.__values
+        return [ ( self.name, label_values, value ) for label_values, value in list(values.items()) ]
+
+
+
+class MetricHistogram():
+
+    TYPE = 'histogram'
+
+    # Prometheus' default buckets (s)
+    BUCKETS = ( 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0 )
+
+    def __init__(self, name: str, help: str, labels: "tuple[str]" = (), buckets: "tuple[float]" = BUCKETS):
+        self.name    = name
+        self.help    = help
+        self.labels  = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+
+        # Label values -> [ count per bucket (not cumulative, last one is +Inf), sum ]
+        self.__values = {}
+
+
+    def observe(self, value: float, *label_values: str):
+        try: counts = self.__values[label_values]
+        except KeyError:
+            counts = self.__values[label_values] = [ 0 ]*(len(self.buckets) + 1) + [ 0.0 ]
+
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+
+    def samples(self) -> "list[tuple[str, tuple, float]]":
+        samples = []
+
+        for label_values, counts in list(self.__values.items()):
+            total = 0
+            for bound, count in zip(self.buckets + ( math.inf, ), counts):
+                total += count
+                samples.append(( f'{self.name}_bucket', label_values + ( ( 'le', Metrics.format_value(bound) ), ), total ))
+
+            samples.append(( f'{self.name}_sum', label_values, counts[-1] ))
+            samples.append(( f'{self.name}_count', label_values, total ))
+
+        return samples
+
+
+
+class Metrics():
+    """
+    In-process metrics, rendered in the Prometheus text format
+
+    Metrics are created once, ex: as class attributes of what they measure, and
+    updated by value. Updates are plain dict operations without locks, so they
+    are cheap but are meant to be made from the event loop thread only.
+
+    Usage:
+        __CMD_TIME = Metrics.histogram('sickle_cmd_duration_seconds', 'Command run time', ( 'cmd', ))
+        ...
+        DiscordBot.__CMD_TIME.observe(time.perf_counter() - start, cmd)
+    """
+
+    __metrics = {}
+
+    @staticmethod
+    def counter(name: str, help: str, labels: "tuple[str]" = ()) -> MetricCounter:
+        return Metrics.__add(MetricCounter(name, help, labels))
+
+
+    @staticmethod
+    def gauge(name: str, help: str, labels: "tuple[str]" = (), fn: Optional[Callable[[], dict]] = None) -> MetricGauge:
+        return Metrics.__add(MetricGauge(name, help, labels, fn))
+
+
+    @staticmethod
+    def histogram(name: str, help: str, labels: "tuple[str]" = (), buckets: "tuple[float]" = MetricHistogram.BUCKETS) -> MetricHistogram:
+        return Metrics.__add(MetricHistogram(name, help, labels, buckets))
+
+
+    @staticmethod
+    def render() -> str:
+        lines = []
+
+        for metric in list(Metrics.__metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.TYPE}')
+
+            for name, label_values, value in metric.samples():
+                labels = list(zip(metric.labels, label_values[:len(metric.labels)])) + list(label_values[len(metric.labels):])
+                labels = ','.join([ f'{label}="{Metrics.__escape(str(label_value))}"' for label, label_value in labels ])
+
+                if len(labels) > 0:
+                    lines.append(f'{name}{{{labels}}} {Metrics.format_value(value)}')
+                else:
+                    lines.append(f'{name} {Metrics.format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+    @staticmethod
+    def format_value(value: float) -> str:
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+
+        if math.isnan(value):
+            return 'NaN'
+
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+    @staticmethod
+    def __add(metric):
+        # Already made, ex: module imported again
+        existing = Metrics.__metrics.get(metric.name, None)
+        if not isinstance(existing, type(None)) and type(existing) == type(metric):
+            return existing
+
+        Metrics.__metrics[metric.name] = metric
+        return metric
+
+
+    @staticmethod
+    def __escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,94 @@
+from typing import NamedTuple, Optional
+
+import collections
+
+import discord
+
+
+class MsgAttachment(NamedTuple):
+
+    url: str
+    proxy_url: str
+    content_type: Optional[str]
+
+
+class MsgRecord(NamedTuple):
+
+    id: int
+    author_id: int
+    attachments: "tuple[MsgAttachment]"
+
+
+class MsgHistory():
+    """
+    Last few messages of recently active channels
+
+    Only what commands need from past messages is kept: the message id, its
+    author and its attachments. Each channel holds its last `max_msgs` records,
+    and at most `max_channels` channels are kept, least recently active ones
+    get dropped first.
+    """
+
+    def __init__(self, max_channels: int = 4096, max_msgs: int = 16):
+        """
+        Params
+        ======
+        max_channels: int
+            Max channels to keep history for
+
+        max_msgs: int
+            Max messages kept per channel
+        """
+        self.__max_channels = max_channels
+        self.__max_msgs     = max_msgs
+
+        # Channel id -> deque of MsgRecord, oldest first
+        self.__channels = collections.OrderedDict()
+
+
+    def add(self, msg: discord.Message):
+        attachments = tuple([
+            MsgAttachment(attachment.url, attachment.proxy_url, attachment.content_type)
+            for attachment in msg.attachments
+        ])
+
+        records = self.__channels.get(msg.channel.id, None)
+        if isinstance(records, type(None)):
+            records = collections.deque(maxlen=self.__max_msgs)
+            self.__channels[msg.channel.id] = records
+
+            if len(self.__channels) > self.__max_channels:
+                self.__channels.popitem(last=False)
+        else:
+            self.__channels.move_to_end(msg.channel.id)
+
+        records.append(MsgRecord(msg.id, msg.author.id, attachments))
+
+
+    def get(self, channel_id: int) -> "list[MsgRecord]":
+        """
+        Channel's messages, newest first
+        """
+        records = self.__channels.get(channel_id, None)
+        if isinstance(records, type(None)):
+            return []
+
+        return list(reversed(records))
+
+
+    def find_images(self, channel_id: int, max_msgs: Optional[int] = None) -> "list[MsgAttachment]":
+        """
+        Image attachments of the newest message that has any, looking at most
+        `max_msgs` messages back
+        """
+        for record in self.get(channel_id)[:max_msgs]:
+            images = [
+                attachment for attachment in record.attachments
+                if not isinstance(attachment.content_type, type(None)) and 'image/' in attachment.content_type
+            ]
+
+            if len(images) > 0:
+                return images
+
+        return []
+
@@ -0,0 +1,60 @@
+from typing import Optional
+
+import collections
+
+import discord
+
+
+class MsgIdCache():
+    """
+    Ids of the last `max_ids` messages the bot has sent
+
+    Message ids are snowflakes and grow with time, so as long as every message
+    sent since some point was added, a newer id that's missing can't be one of
+    the bot's. `contains` uses that to answer for sure without fetching the
+    message. Older ids, ones that got evicted or from before the bot was
+    watching, are unknown.
+    """
+
+    def __init__(self, max_ids: int = 4096):
+        """
+        Params
+        ======
+        max_ids: int
+            Max message ids to remember
+        """
+        self.__max_ids = max_ids
+
+        # Message id -> None, oldest first
+        self.__ids = collections.OrderedDict()
+
+        # Every message sent after this id is in `__ids`
+        self.__since_id = discord.utils.time_snowflake(discord.utils.utcnow())
+
+
+    def add(self, msg_id: int):
+        self.__ids[msg_id] = None
+
+        while len(self.__ids) > self.__max_ids:
+            evicted_id, _ = self.__ids.popitem(last=False)
+            self.__since_id = max(self.__since_id, evicted_id)
+
+
+    def contains(self, msg_id: int) -> Optional[bool]:
+        """
+        True if the bot sent the message, False if it didn't, None if unknown
+        """
+        if msg_id in self.__ids:
+            return True
+
+        if msg_id > self.__since_id:
+            return False
+
+        return None
+
+
+    def reset(self):
+        """
+        Messages sent until now may have been missed, ex: while disconnected
+        """
+        self.__since_id = max(self.__since_id, discord.utils.time_snowflake(discord.utils.utcnow()))
@@ -0,0 +1,100 @@
+from typing import Hashable, Optional
+
+import time
+
+
+class RateLimiter():
+    """
+    Token buckets per user, per guild and per command
+
+    Every command costs some tokens (1 by default, more for expensive ones). It
+    only goes through if the user's, the guild's and the command's buckets all
+    have enough; then the cost is taken from each. Buckets refill continuously
+    at `per_second` tokens a second up to `capacity`, which is also the largest
+    burst allowed.
+
+    A bucket that has been idle long enough to be full again is the same as a
+    missing one, so those get dropped every `sweep_interval` seconds to keep
+    memory bounded by recent activity.
+    """
+
+    SCOPES = ('user', 'guild', 'cmd')
+
+    def __init__(self, limits: dict, sweep_interval: float = 60.0):
+        """
+        Params
+        ======
+        limits: dict
+            Scope ('user', 'guild', 'cmd') -> { 'capacity' : float, 'per_second' : float }.
+            Scopes that are left out are not limited.
+        """
+        self.__limits = { scope : (float(limit['capacity']), float(limit['per_second'])) for scope, limit in limits.items() if scope in RateLimiter.SCOPES }
+
+        # (scope, key) -> [ tokens, last update time ]
+        self.__buckets = {}
+
+        self.__sweep_interval = sweep_interval
+        self.__sweep_time     = time.monotonic()
+
+        self.__stats = {
+            'allowed'  : 0,
+            'rejected' : 0,
+        }
+
+
+    def allow(self, user_id: Hashable, guild_id: Optional[Hashable], cmd: str, cost: float = 1.0) -> bool:
+        """
+        Takes `cost` tokens from each of the buckets if they all have enough.
+        `guild_id` is None for DMs.
+        """
+        now = time.monotonic()
+
+        if now - self.__sweep_time >= self.__sweep_interval:
+            self.__sweep(now)
+
+        keys = [ ('user', user_id), ('guild', guild_id), ('cmd', cmd) ]
+        buckets = []
+
+        for scope, key in keys:
+            if scope not in self.__limits or isinstance(key, type(None)):
+                continue
+
+            capacity, per_second = self.__limits[scope]
+
+            bucket = self.__buckets.get((scope, key), None)
+            if isinstance(bucket, type(None)):
+                bucket = [ capacity, now ]
+            else:
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1])*per_second)
+                bucket[1] = now
+
+            if bucket[0] < cost:
+                self.__stats['rejected'] += 1
+                return False
+
+            buckets.append(((scope, key), bucket))
+
+        for key, bucket in buckets:
+            bucket[0] -= cost
+            self.__buckets[key] = bucket
+
+        self.__stats['allowed'] += 1
+        return True
+
+
+    @property
+    def stats(self) -> dict:
+        return { **self.__stats, 'buckets' : len(self.__buckets) }
+
+
+    def __sweep(self, now: float):
+        self.__sweep_time = now
+
+        full = []
+        for key, (tokens, last_time) in self.__buckets.items():
+            capacity, per_second = self.__limits[key[0]]
+            if tokens + (now - last_time)*per_second >= capacity:
+                full.append(key)
+
+        for key in full:
+            del self.__buckets[key]
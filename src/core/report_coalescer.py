@@ -0,0 +1,154 @@
+from typing import Awaitable, Callable, Hashable, Optional
+
+import logging
+import collections
+import traceback
+import time
+
+
+class ReportCoalescer():
+    """
+    Batches debug channel reports
+
+    Reports are collected and sent as digests every `interval` seconds. Reports
+    with the same fingerprint (by default the exception type and the frame it
+    was raised from, or the text itself) are sent once with a repeat count, so
+    something failing over and over doesn't flood the channel. At most
+    `max_per_minute` digest messages get sent a minute; past that, digests only
+    go to the log.
+    """
+
+    # Discord's limit is 2000 characters, leaving room for the code block
+    MAX_MSG_LEN = 1900
+
+    def __init__(self, send: Callable[[str], Awaitable], interval: float = 10.0, max_per_minute: int = 10, max_pending: int = 256):
+        """
+        Params
+        ======
+        send: Callable[[str], Awaitable]
+            Sends a digest to the debug channel
+
+        interval: float
+            Seconds between digests
+
+        max_per_minute: int
+            Max digest messages sent a minute
+
+        max_pending: int
+            Max distinct reports held between digests, more only get logged
+        """
+        self.__logger = logging.getLogger(__class__.__name__)
+
+        self.__send = send
+        self.__interval       = interval
+        self.__max_per_minute = max_per_minute
+        self.__max_pending    = max_pending
+
+        # Fingerprint -> [ first report text, count ]
+        self.__pending = collections.OrderedDict()
+        self.__flush_time = time.monotonic()
+
+        # Times of the digests sent in the last minute
+        self.__sent_times = collections.deque()
+
+        self.__stats = {
+            'reports' : 0,
+            'repeats' : 0,
+            'dropped' : 0,
+            'sent'    : 0,
+            'logged'  : 0,  # Digests that were over budget
+        }
+
+
+    @staticmethod
+    def fingerprint(e: BaseException) -> tuple:
+        """
+        Exception type and the frame it was raised from
+        """
+        frames = traceback.extract_tb(e.__traceback__)
+        if len(frames) == 0:
+            return ( type(e).__qualname__, str(e) )
+
+        return ( type(e).__qualname__, frames[-1].filename, frames[-1].lineno, frames[-1].name )
+
+
+    def add(self, text: str, fingerprint: Optional[Hashable] = None):
+        """
+        Queues a report for the next digest. Reports without a fingerprint are
+        matched by text.
+        """
+        if isinstance(fingerprint, type(None)):
+            fingerprint = text
+
+        self.__stats['reports'] += 1
+
+        entry = self.__pending.get(fingerprint, None)
+        if not isinstance(entry, type(None)):
+            entry[1] += 1
+            self.__stats['repeats'] += 1
+            return
+
+        if len(self.__pending) >= self.__max_pending:
+            self.__stats['dropped'] += 1
+            return
+
+        self.__pending[fingerprint] = [ text, 1 ]
+
+
+    def due(self) -> bool:
+        return time.monotonic() - self.__flush_time >= self.__interval
+
+
+    async def flush(self):
+        """
+        Sends what's pending as digests
+        """
+        self.__flush_time = time.monotonic()
+
+        if len(self.__pending) == 0:
+            return
+
+        pending, self.__pending = self.__pending, collections.OrderedDict()
+
+        digest = ''
+        for text, count in pending.values():
+            if count > 1:
+                text = f'{text}\n(x{count} since last report)'
+
+            if len(text) > ReportCoalescer.MAX_MSG_LEN:
+                text = text[:ReportCoalescer.MAX_MSG_LEN - 16] + '\n... (truncated)'
+
+            if len(digest) + len(text) + 1 > ReportCoalescer.MAX_MSG_LEN:
+                await self.__send_digest(digest)
+                digest = ''
+
+            digest += f'{text}\n'
+
+        await self.__send_digest(digest)
+
+
+    @property
+    def stats(self) -> dict:
+        return { **self.__stats, 'pending' : len(self.__pending) }
+
+
+    async def __send_digest(self, digest: str):
+        if len(digest) == 0:
+            return
+
+        now = time.monotonic()
+        while len(self.__sent_times) > 0 and now - self.__sent_times[0] >= 60:
+            self.__sent_times.popleft()
+
+        if len(self.__sent_times) >= self.__max_per_minute:
+            self.__stats['logged'] += 1
+            self.__logger.warning(
+                f'Over the debug channel budget ({self.__max_per_minute}/min), not sending:\n'
+                f'{digest}'
+            )
+            return
+
+        self.__sent_times.append(now)
+        self.__stats['sent'] += 1
+
+        await self.__send(digest)
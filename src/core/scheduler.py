@@ -0,0 +1,107 @@
+from typing import Hashable, Optional
+
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class Scheduler():
+    """
+    Keeps keys ordered by due time and wakes up exactly when the earliest one is due
+
+    Entries are held in a min-heap. Rescheduling a key marks its old entry as removed
+    and leaves it in the heap to be dropped when it reaches the top, so add and pop
+    are both O(log n). Times are unix timestamps in seconds.
+    """
+
+    __REMOVED = object()
+
+    def __init__(self):
+        self.__heap    = []
+        self.__entries = {}  # key -> [ due_at, seq, key ]
+        self.__seq     = itertools.count()
+        self.__wake    = asyncio.Event()
+
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__entries
+
+
+    def add(self, key: Hashable, due_at: float):
+        """
+        Schedules `key`. Rescheduling an existing key replaces its due time.
+        """
+        if key in self.__entries:
+            self.__remove(key)
+
+        entry = [ due_at, next(self.__seq), key ]
+        self.__entries[key] = entry
+        heapq.heappush(self.__heap, entry)
+
+        if self.__heap[0] is entry:
+            # New earliest entry, the waiter needs to recalculate its sleep
+            self.__wake.set()
+
+
+    def next_due(self) -> Optional[float]:
+        self.__drop_removed()
+        return self.__heap[0][0] if self.__heap else None
+
+
+    def pop_due(self, now: Optional[float] = None) -> list:
+        """
+        Removes and returns all keys that are due
+        """
+        if isinstance(now, type(None)):
+            now = time.time()
+
+        due = []
+
+        self.__drop_removed()
+        while self.__heap and self.__heap[0][0] <= now:
+            _, _, key = heapq.heappop(self.__heap)
+            del self.__entries[key]
+            due.append(key)
+
+            self.__drop_removed()
+
+        return due
+
+
+    async def wait_due(self) -> list:
+        """
+        Sleeps until at least one key is due and returns all due keys
+        """
+        while True:
+            self.__wake.clear()
+
+            due = self.pop_due()
+            if len(due) != 0:
+                return due
+
+            next_due = self.next_due()
+            timeout  = None if isinstance(next_due, type(None)) else max(0, next_due - time.time())
+
+            try: await asyncio.wait_for(self.__wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+    def __remove(self, key: Hashable):
+        entry = self.__entries.pop(key)
+        entry[2] = Scheduler.__REMOVED
+
+        # Don't let replaced entries pile up
+        if len(self.__heap) > 2*len(self.__entries) + 64:
+            self.__heap = [ entry for entry in self.__heap if entry[2] is not Scheduler.__REMOVED ]
+            heapq.heapify(self.__heap)
+
+
+    def __drop_removed(self):
+        while self.__heap and self.__heap[0][2] is Scheduler.__REMOVED:
+            heapq.heappop(self.__heap)
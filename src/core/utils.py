@@ -25,7 +25,16 @@ class DiscordCmdBase():
     ANYONE        = 3  # Anyone can use the command
 
     @staticmethod
-    def DiscordCmd(perm: int = MODERATOR, anywhere: bool = False, example: str = '', help: str = '') -> typing.Callable:
+    def DiscordCmd(perm: int = MODERATOR, anywhere: bool = False, example: str = '', help: str = '', concurrency: typing.Optional[str] = None, cost: float = 1, aliases: "list[str]" = ()) -> typing.Callable:
+        """
+        concurrency: Name of the concurrency class the command runs in, ex: 'image'.
+            The class' limit is set in the `Cmds.concurrency` config.
+
+        cost: Rate limit tokens the command uses up, higher for expensive commands.
+            The limits are set in the `Cmds.rate_limits` config.
+
+        aliases: Other names the command can be called by.
+        """
         # TODO: Add built-in permissions
         #   - DiscordCmdBase.ADMIN - Only admin can use
         #   - DiscordCmdBase.PERM([ x0, x1, ... ]) - Command requires permissions x0, x1, etc
@@ -39,7 +48,11 @@ class DiscordCmdBase():
                 'perm'     : perm,
                 'anywhere' : anywhere,
                 'example'  : example,
-                'help'     : help
+                'help'     : help,
+
+                'concurrency' : concurrency,
+                'cost'        : cost,
+                'aliases'     : list(aliases),
             }
 
         return wrapper
@@ -58,3 +71,20 @@ class DiscordCmdBase():
             }
 
         return wrapper
+
+
+    @staticmethod
+    def DiscordShutdown() -> typing.Callable:
+        """
+        Awaited when the bot closes, before the db is closed
+        """
+
+        def wrapper(fn : typing.Callable) -> dict:
+            return {
+                'func'    : fn,
+                'type'    : 'shutdown',
+                'example' : '',
+                'help'    : '',
+            }
+
+        return wrapper
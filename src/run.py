@@ -41,7 +41,10 @@ if __name__ == '__main__':
 
     discord_bot = DiscordBot()
 
-    while not discord_bot.is_closed():
-        try: time.sleep(0.2)
+    # The bot's thread is a daemon; exiting before it's done closing would lose unsaved db writes
+    while True:
+        try:
+            if discord_bot.wait_closed(0.2):
+                break
         except KeyboardInterrupt:
             discord_bot.quit = True
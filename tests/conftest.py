@@ -0,0 +1,66 @@
+import os
+import sys
+import shutil
+import tempfile
+
+# The bot runs from the repo root with `src` as its script dir, and reads
+# config.yaml from the cwd as soon as `core` is imported
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+_cwd = tempfile.mkdtemp(prefix='sickle-bot-tests-')
+shutil.copy(os.path.join(ROOT, 'config_example.yaml'), os.path.join(_cwd, 'config.yaml'))
+os.chdir(_cwd)
+
+
+import pytest
+
+from core.db_table import DbTinyDB
+from core.db_middleware import DbThreadSafeMiddleware
+from core.db_storage import DbAtomicJsonStorage
+from core.db_journal import DbJournalStorage, DbJournalTinyDB
+from core.db_sqlite import DbSqlite
+from core.db_sharded import DbSharded
+
+
+# Same as the bot's
+DB_INDEXES = {
+    'cmd_stats'  : [ ('cmd', 'server'), ('cmd',) ],
+    'reminders'  : [ ('server_id', 'user_id'), ('due_at',) ],
+    'self_roles' : [ ('server', 'role_name'), ('server',) ],
+}
+
+DB_SHARDS = {
+    'bot_stats'   : 'doc_id',
+    'bot_ch'      : 'doc_id',
+    'custom_cmds' : 'doc_id',
+    'self_roles'  : 'server',
+    'reminders'   : 'server_id',
+    'bot_en'      : 64,
+}
+
+DB_BACKENDS = [ 'json', 'journal', 'sqlite', 'sharded' ]
+
+
+def open_db(backend: str, path: str, write_behind: bool = False):
+    """
+    Opens a db with the given backend the way the bot does, under directory `path`
+    """
+    match backend:
+        case 'json':
+            return DbTinyDB(f'{path}/db.json', indexes=DB_INDEXES, storage=DbThreadSafeMiddleware(DbAtomicJsonStorage, write_behind=write_behind))
+        case 'journal':
+            return DbJournalTinyDB(f'{path}/db.json', indexes=DB_INDEXES, storage=DbThreadSafeMiddleware(DbJournalStorage, write_behind=True, flush_interval=60))
+        case 'sqlite':
+            return DbSqlite(f'{path}/db.sqlite', indexes=DB_INDEXES)
+        case 'sharded':
+            return DbSharded(f'{path}/db', DB_SHARDS, indexes=DB_INDEXES, write_behind=write_behind)
+
+    raise ValueError(backend)
+
+
+@pytest.fixture(params=DB_BACKENDS)
+def db(request, tmp_path):
+    db = open_db(request.param, str(tmp_path))
+    yield db
+    db.close()
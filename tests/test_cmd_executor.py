@@ -0,0 +1,104 @@
+import asyncio
+
+from core.cmd_executor import CmdExecutor
+
+
+class Cmds():
+    """
+    Commands that run until released
+    """
+
+    def __init__(self):
+        self.started  = []
+        self.releases = {}
+
+
+    def cmd(self, name: str):
+        async def fn():
+            self.started.append(name)
+            self.releases[name] = asyncio.Event()
+            await self.releases[name].wait()
+
+        return fn
+
+
+    async def release(self, name: str):
+        self.releases[name].set()
+
+        # Let the task finish and the next one start
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_queued_in_order():
+    async def test():
+        executor = CmdExecutor(max_running=2, max_queued=2)
+        cmds = Cmds()
+
+        assert all([ executor.submit(cmds.cmd(name)) for name in 'abcd' ])
+        assert not executor.submit(cmds.cmd('e'))
+
+        await settle()
+        assert cmds.started == [ 'a', 'b' ]
+        assert executor.stats['rejected'] == 1
+
+        await cmds.release('b')
+        assert cmds.started == [ 'a', 'b', 'c' ]
+
+        await cmds.release('a')
+        assert cmds.started == [ 'a', 'b', 'c', 'd' ]
+        assert ( executor.running, executor.queued ) == ( 2, 0 )
+
+        await cmds.release('c')
+        await cmds.release('d')
+        assert executor.running == 0
+
+    asyncio.run(test())
+
+
+def test_class_backlog_doesnt_hold_up_others():
+    async def test():
+        executor = CmdExecutor(max_running=4, max_queued=8, classes={ 'image' : 1 })
+        cmds = Cmds()
+
+        executor.submit(cmds.cmd('img1'), cls='image')
+        executor.submit(cmds.cmd('img2'), cls='image')
+        executor.submit(cmds.cmd('help'))
+
+        await settle()
+        assert cmds.started == [ 'img1', 'help' ]
+        assert executor.stats['classes']['image'] == { 'running' : 1, 'queued' : 1, 'max_running' : 1 }
+
+        await cmds.release('img1')
+        assert cmds.started[-1] == 'img2'
+
+        await cmds.release('img2')
+        await cmds.release('help')
+
+    asyncio.run(test())
+
+
+def test_failed_cmd_frees_its_slot():
+    async def test():
+        executor = CmdExecutor(max_running=1)
+        cmds = Cmds()
+
+        async def failing():
+            raise RuntimeError('failed')
+
+        executor.submit(failing)
+        executor.submit(cmds.cmd('a'))
+
+        await settle()
+        assert cmds.started == [ 'a' ]
+
+        await cmds.release('a')
+        assert executor.running == 0
+        assert executor.stats['started'] == 2
+
+    asyncio.run(test())
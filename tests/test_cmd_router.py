@@ -0,0 +1,95 @@
+import asyncio
+
+from core.cmd_router import CmdRouter
+
+
+def make_router(custom: dict, **kwargs) -> "tuple[CmdRouter, list]":
+    """
+    Router with a `help` built-in and guild id -> custom commands
+    """
+    loads  = []
+    router = CmdRouter(**kwargs)
+    router.add('help', { 'builtin' : 'help' }, aliases=[ 'h', '?' ])
+
+    async def loader(guild_id: int) -> dict:
+        loads.append(guild_id)
+        await asyncio.sleep(0.01)
+        return custom.get(guild_id, {})
+
+    router.set_loader(loader)
+    return router, loads
+
+
+def test_resolve():
+    async def test():
+        router, loads = make_router({ 1 : { 'hi' : { 'custom' : 'hi' }, 'help' : { 'custom' : 'help' } } })
+
+        assert await router.resolve('help', 1) == { 'builtin' : 'help' }
+        assert await router.resolve('h')       == { 'builtin' : 'help' }
+        assert router.name('?') == 'help'
+
+        # Custom commands only in their own guild, and not over built-ins
+        assert await router.resolve('hi', 1) == { 'custom' : 'hi' }
+        assert await router.resolve('hi', 2) is None
+        assert await router.resolve('hi')    is None
+
+        # Each guild loaded once, even without custom commands
+        await router.resolve('nope', 2)
+        assert loads == [ 1, 2 ]
+
+    asyncio.run(test())
+
+
+def test_concurrent_lookups_share_a_load():
+    async def test():
+        router, loads = make_router({ 1 : { 'hi' : { 'custom' : 'hi' } } })
+
+        results = await asyncio.gather(*[ router.resolve('hi', 1) for _ in range(10) ])
+        assert results == [ { 'custom' : 'hi' } ]*10
+        assert loads == [ 1 ]
+
+    asyncio.run(test())
+
+
+def test_invalidate_and_evict():
+    async def test():
+        custom = { 1 : { 'hi' : { 'custom' : 'hi' } } }
+        router, loads = make_router(custom, max_loaded=2)
+
+        await router.resolve('hi', 1)
+        custom[1] = { 'hi' : { 'custom' : 'changed' } }
+        router.invalidate(1)
+        assert await router.resolve('hi', 1) == { 'custom' : 'changed' }
+
+        await router.resolve('x', 2)
+        await router.resolve('x', 3)
+        assert router.stats['loaded']    == 2
+        assert router.stats['evictions'] == 1
+
+        # Guild 1 was dropped and gets loaded again
+        await router.resolve('hi', 1)
+        assert loads == [ 1, 1, 2, 3, 1 ]
+
+    asyncio.run(test())
+
+
+def test_failed_load_is_retried():
+    async def test():
+        router = CmdRouter()
+        fail   = [ True ]
+
+        async def loader(guild_id: int) -> dict:
+            if fail[0]:
+                raise OSError('db is down')
+
+            return { 'hi' : { 'custom' : 'hi' } }
+
+        router.set_loader(loader)
+
+        assert await router.resolve('hi', 1) is None
+        assert router.stats['load_errors'] == 1
+
+        fail[0] = False
+        assert await router.resolve('hi', 1) == { 'custom' : 'hi' }
+
+    asyncio.run(test())
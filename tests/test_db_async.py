@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import pytest
+
+from tinydb.table import Document
+
+from core.db_async import DbAsync
+
+
+def test_ops_run_off_the_loop(db):
+    async def test():
+        adb = DbAsync(db)
+
+        loop_thread = threading.current_thread()
+        assert await adb.run(threading.current_thread) is not loop_thread
+
+        await adb.insert('reminders', Document({ 'server_id' : 1, 'due_at' : 10 }, doc_id=5))
+        await adb.update('reminders', { 'due_at' : 20 }, doc_ids=[ 5 ])
+
+        assert (await adb.get('reminders', doc_id=5))['due_at'] == 20
+        assert await adb.contains('reminders', doc_id=5)
+        assert len(await adb.all('reminders')) == 1
+
+        stats = adb.stats
+        assert stats['queued'] == 0
+        assert stats['ops']['insert']['count'] == 1
+        assert stats['ops']['get']['count']    == 1
+        adb.close()
+
+    asyncio.run(test())
+
+
+def test_ops_keep_their_order(db):
+    async def test():
+        adb = DbAsync(db)
+
+        # Submitted all at once, applied in order
+        await asyncio.gather(*[ adb.upsert('bot_stats', Document({ 'n' : i }, doc_id=1)) for i in range(50) ])
+        assert (await adb.get('bot_stats', doc_id=1))['n'] == 49
+        adb.close()
+
+    asyncio.run(test())
+
+
+def test_queue_is_bounded(db):
+    async def test():
+        adb = DbAsync(db, max_queued=2)
+        release = threading.Event()
+
+        tasks = [ asyncio.create_task(adb.run(release.wait)) for _ in range(5) ]
+        await asyncio.sleep(0.05)
+
+        assert adb.stats['queued']  == 2
+        assert adb.stats['waiting'] == 3
+
+        release.set()
+        await asyncio.gather(*tasks)
+
+        assert adb.stats['queued_max'] == 2
+        adb.close()
+
+    asyncio.run(test())
+
+
+def test_errors_reach_the_caller(db):
+    async def test():
+        adb = DbAsync(db)
+        await adb.insert('reminders', Document({ 'server_id' : 1 }, doc_id=5))
+
+        with pytest.raises(ValueError):
+            await adb.insert('reminders', Document({ 'server_id' : 1 }, doc_id=5))
+
+        # The slot is given back
+        assert adb.stats['queued'] == 0
+        adb.close()
+
+    asyncio.run(test())
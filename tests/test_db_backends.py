@@ -0,0 +1,76 @@
+import tinydb
+import pytest
+
+from tinydb.table import Document
+
+from conftest import DB_BACKENDS, open_db
+
+
+# Every backend is a drop-in for the part of TinyDB the bot uses
+
+def test_insert_get_search(db):
+    table = db.table('self_roles')
+    doc_ids = table.insert_multiple([
+        { 'server' : 1, 'role_name' : 'a', 'role_id' : 10 },
+        { 'server' : 1, 'role_name' : 'b', 'role_id' : 11 },
+        { 'server' : 2, 'role_name' : 'a', 'role_id' : 12 },
+    ])
+
+    assert len(doc_ids) == 3
+    assert table.get(doc_id=doc_ids[1])['role_name'] == 'b'
+    assert table.get(doc_id=999) is None
+
+    results = table.search(tinydb.Query().fragment({ 'server' : 1, 'role_name' : 'a' }))
+    assert [ doc['role_id'] for doc in results ] == [ 10 ]
+
+    # Not a plain field equality
+    results = table.search(tinydb.Query().role_id > 10)
+    assert sorted([ doc['role_id'] for doc in results ]) == [ 11, 12 ]
+
+    assert table.contains(tinydb.Query().fragment({ 'server' : 2 }))
+    assert table.count(tinydb.Query().fragment({ 'role_name' : 'a' })) == 2
+    assert len(table) == 3
+
+
+def test_update_upsert_remove(db):
+    table = db.table('reminders')
+    table.insert(Document({ 'server_id' : 1, 'user_id' : 5, 'due_at' : 10 }, doc_id=100))
+    table.insert(Document({ 'server_id' : 1, 'user_id' : 6, 'due_at' : 20 }, doc_id=101))
+
+    with pytest.raises(ValueError):
+        table.insert(Document({ 'server_id' : 1 }, doc_id=100))
+
+    assert table.update({ 'due_at' : 15 }, doc_ids=[ 100 ]) == [ 100 ]
+    assert table.update(lambda doc: doc.update({ 'done' : True }), tinydb.Query().user_id == 6) == [ 101 ]
+
+    table.upsert(Document({ 'server_id' : 2, 'user_id' : 7, 'due_at' : 30 }, doc_id=102))
+    table.upsert(Document({ 'server_id' : 2, 'user_id' : 7, 'due_at' : 40 }, doc_id=102))
+
+    assert table.get(doc_id=100)['due_at'] == 15
+    assert table.get(doc_id=101)['done']
+    assert table.get(doc_id=102)['due_at'] == 40
+
+    assert table.remove(doc_ids=[ 100 ]) == [ 100 ]
+    assert table.remove(tinydb.Query().fragment({ 'server_id' : 2 })) == [ 102 ]
+    assert [ doc.doc_id for doc in table.all() ] == [ 101 ]
+
+    table.truncate()
+    assert len(table) == 0
+
+
+@pytest.mark.parametrize('backend', DB_BACKENDS)
+@pytest.mark.parametrize('write_behind', [ False, True ])
+def test_persisted(tmp_path, backend: str, write_behind: bool):
+    db = open_db(backend, str(tmp_path), write_behind=write_behind)
+    db.table('bot_stats').insert(Document({ 'total_msgs' : 1 }, doc_id=123))
+    db.table('cmd_stats').insert({ 'cmd' : 'help', 'server' : 123, 'count' : 1 })
+    db.table('bot_en').insert(Document({ 'en' : True }, doc_id=456))
+    db.table('cmd_stats').update({ 'count' : 2 }, doc_ids=[ 1 ])
+    db.table('bot_stats').remove(doc_ids=[ 123 ])
+    db.close()
+
+    db = open_db(backend, str(tmp_path))
+    assert db.table('bot_stats').all() == []
+    assert db.table('cmd_stats').get(doc_id=1) == { 'cmd' : 'help', 'server' : 123, 'count' : 2 }
+    assert db.table('bot_en').get(doc_id=456) == { 'en' : True }
+    db.close()
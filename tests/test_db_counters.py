@@ -0,0 +1,103 @@
+import pytest
+import asyncio
+
+from core.db_async import DbAsync
+from core.db_counters import DbCounters
+
+
+def flush(counters: DbCounters, adb: DbAsync):
+    asyncio.run(counters.flush(adb))
+
+
+@pytest.fixture
+def counters(db):
+    return DbCounters(db, 'bot_stats', 'cmd_stats'), DbAsync(db)
+
+
+def test_counts_roll_up(db, counters):
+    counters, adb = counters
+
+    for guild_id in [ 1, 2, 3 ]:
+        counters.inc_msgs(guild_id, 'total_msgs')
+    counters.inc_msgs(2, 'user_msgs')
+    counters.inc_cmd(1, 'help')
+
+    assert counters.get_bot_stats(2) == { 'total_msgs' : 1, 'user_msgs' : 1, 'total_cmds' : 0 }
+    assert counters.get_bot_stats(9) is None
+    flush(counters, adb)
+
+    for guild_id in [ 3, 1, 4 ]:
+        counters.inc_msgs(guild_id, 'total_msgs')
+    counters.inc_cmd(1, 'help')
+    counters.inc_cmd(2, 'help')
+
+    # Pending and persisted counts together
+    assert counters.get_bot_stats(1)['total_msgs'] == 2
+    assert counters.get_cmd_server_count(1, 'help') == 2
+    flush(counters, adb)
+
+    assert db.table('bot_stats').get(doc_id=1) == { 'total_msgs' : 2, 'user_msgs' : 0, 'total_cmds' : 0 }
+    assert db.table('bot_stats').get(doc_id=4) == { 'total_msgs' : 1, 'user_msgs' : 0, 'total_cmds' : 0 }
+    assert counters.get_cmd_server_count(1, 'help') == 2
+    assert counters.get_cmd_total_count('help') == 3
+    assert len(db.table('cmd_stats').all()) == 2
+
+
+@pytest.mark.parametrize('fail', [ 'bot_stats', 'cmd_stats' ])
+def test_failed_insert_after_update(db, counters, monkeypatch, fail: str):
+    counters, adb = counters
+
+    counters.inc_msgs(1, 'total_msgs')
+    counters.inc_cmd(1, 'help')
+    flush(counters, adb)
+
+    # Existing ones get updated, then the insert of the new ones fails
+    counters.inc_msgs(1, 'total_msgs')
+    counters.inc_msgs(2, 'total_msgs')
+    counters.inc_cmd(1, 'help')
+    counters.inc_cmd(2, 'help')
+
+    table = db.table(fail)
+    insert_multiple = table.insert_multiple
+
+    def failing_insert(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(table, 'insert_multiple', failing_insert)
+    with pytest.raises(OSError):
+        flush(counters, adb)
+
+    # Nothing lost or counted twice, whether it was written or not
+    assert counters.get_bot_stats(1)['total_msgs'] == 2
+    assert counters.get_bot_stats(2)['total_msgs'] == 1
+    assert counters.get_cmd_total_count('help') == 3
+
+    monkeypatch.setattr(table, 'insert_multiple', insert_multiple)
+    flush(counters, adb)
+
+    assert db.table('bot_stats').get(doc_id=1)['total_msgs'] == 2
+    assert db.table('bot_stats').get(doc_id=2)['total_msgs'] == 1
+    assert sorted([ entry['count'] for entry in db.table('cmd_stats').all() ]) == [ 1, 2 ]
+
+
+def test_cmd_flush_uses_index(tmp_path, monkeypatch):
+    from conftest import open_db
+    from core.db_table import DbTable
+
+    db = open_db('json', str(tmp_path))
+    counters, adb = DbCounters(db, 'bot_stats', 'cmd_stats'), DbAsync(db)
+
+    for i in range(50):
+        counters.inc_cmd(i, 'help')
+    flush(counters, adb)
+
+    def no_scan(self):
+        raise AssertionError('cmd_stats was scanned')
+
+    monkeypatch.setattr(DbTable, '__iter__', no_scan)
+
+    counters.inc_cmd(7, 'help')
+    flush(counters, adb)
+
+    assert counters.get_cmd_server_count(7, 'help') == 2
+    db.close()
@@ -0,0 +1,91 @@
+import tinydb
+import pytest
+
+from tinydb.table import Table
+
+from core.db_query import DbQuery
+from conftest import open_db
+
+
+def test_eq_fields():
+    Query = tinydb.Query
+
+    assert DbQuery.eq_fields(Query().fragment({ 'a' : 1, 'b' : 2 })) == { 'a' : 1, 'b' : 2 }
+    assert DbQuery.eq_fields(Query().a == 1) == { 'a' : 1 }
+    assert DbQuery.eq_fields((Query().a == 1) & (Query().b == 2)) == { 'a' : 1, 'b' : 2 }
+
+    assert DbQuery.eq_fields(Query().a > 1) is None
+    assert DbQuery.eq_fields(Query().a.b == 1) is None
+    assert DbQuery.eq_fields((Query().a == 1) | (Query().b == 2)) is None
+    assert DbQuery.eq_fields((Query().a == 1) & (Query().a == 2)) is None
+    assert DbQuery.eq_fields(lambda doc: True) is None
+
+
+@pytest.fixture
+def table(tmp_path):
+    db = open_db('json', str(tmp_path))
+    table = db.table('cmd_stats')
+    table.insert_multiple([ { 'cmd' : f'c{i % 10}', 'server' : i % 7, 'count' : i } for i in range(100) ])
+
+    yield table
+    db.close()
+
+
+def scans(monkeypatch) -> list:
+    calls = []
+    search = Table.search
+
+    def counting_search(self, cond):
+        calls.append(cond)
+        return search(self, cond)
+
+    monkeypatch.setattr(Table, 'search', counting_search)
+    return calls
+
+
+def test_lookup_matches_scan(table, monkeypatch):
+    calls = scans(monkeypatch)
+
+    for cond in [
+        tinydb.Query().fragment({ 'cmd' : 'c3', 'server' : 2 }),
+        tinydb.Query().fragment({ 'cmd' : 'c3' }),
+        tinydb.Query().fragment({ 'cmd' : 'missing' }),
+    ]:
+        expected = [ doc for doc in table.all() if cond(doc) ]
+        assert table.search(cond) == expected
+
+    # None of them needed a scan
+    assert calls == []
+
+    # Not covered by an index, or not only equalities
+    for cond in [
+        tinydb.Query().fragment({ 'server' : 2 }),
+        (tinydb.Query().cmd == 'c4') & (tinydb.Query().count > 50),
+    ]:
+        assert table.search(cond) == [ doc for doc in table.all() if cond(doc) ]
+
+    assert len(calls) == 2
+
+
+def test_kept_up_to_date(table):
+    Query = tinydb.Query
+
+    assert len(table.search(Query().fragment({ 'cmd' : 'c1' }))) == 10
+
+    table.update({ 'cmd' : 'c1' }, Query().fragment({ 'cmd' : 'c2' }))
+    table.remove(Query().fragment({ 'cmd' : 'c1', 'server' : 1 }))
+    table.insert({ 'cmd' : 'c1', 'server' : 99, 'count' : 0 })
+    table.upsert({ 'cmd' : 'c1', 'server' : 98, 'count' : 0 }, Query().fragment({ 'cmd' : 'c1', 'server' : 98 }))
+
+    for cond in [ Query().fragment({ 'cmd' : 'c1' }), Query().fragment({ 'cmd' : 'c2' }), Query().fragment({ 'cmd' : 'c1', 'server' : 99 }) ]:
+        assert table.search(cond) == [ doc for doc in table.all() if cond(doc) ]
+
+    table.truncate()
+    assert table.search(Query().fragment({ 'cmd' : 'c1' })) == []
+
+
+def test_rebuilt_after_reload(table):
+    assert table.get(tinydb.Query().fragment({ 'cmd' : 'c0', 'server' : 0 }))['count'] == 0
+
+    table.storage.reload()
+    assert table.get(tinydb.Query().fragment({ 'cmd' : 'c0', 'server' : 0 }))['count'] == 0
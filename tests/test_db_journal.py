@@ -0,0 +1,100 @@
+import os
+import json
+import shutil
+
+from tinydb.table import Document
+
+from core.db_journal import DbJournalStorage, DbJournalTinyDB
+from core.db_middleware import DbThreadSafeMiddleware
+
+
+def open_journal(path: str) -> DbJournalTinyDB:
+    return DbJournalTinyDB(path, storage=DbThreadSafeMiddleware(DbJournalStorage, write_behind=True, flush_interval=60))
+
+
+def make_changes(db: DbJournalTinyDB):
+    table = db.table('t')
+    table.insert_multiple([ { 'a' : i } for i in range(5) ])
+    table.update({ 'a' : 10 }, doc_ids=[ 1 ])
+    table.remove(doc_ids=[ 2 ])
+    table.upsert(Document({ 'a' : 20 }, doc_id=3))
+
+    db.table('u').insert({ 'b' : 1 })
+    db.table('u').truncate()
+    db.table('u').insert({ 'b' : 2 })
+
+
+EXPECTED = {
+    't' : { '1' : { 'a' : 10 }, '3' : { 'a' : 20 }, '4' : { 'a' : 3 }, '5' : { 'a' : 4 } },
+    'u' : { '1' : { 'b' : 2 } },
+}
+
+
+def segments(path: str) -> "list[str]":
+    return sorted([ name for name in os.listdir(os.path.dirname(path)) if '.journal.' in name ])
+
+
+def read_all(path: str) -> dict:
+    db = open_journal(path)
+    data = { name : { str(doc.doc_id) : dict(doc) for doc in db.table(name).all() } for name in db.tables() }
+    db.close()
+    return data
+
+
+def test_replayed_after_crash(tmp_path):
+    path = str(tmp_path / 'db.json')
+
+    # Never closed or compacted, as if killed
+    db = open_journal(path)
+    make_changes(db)
+
+    assert not os.path.exists(path)
+    assert segments(path) == [ 'db.json.journal.0' ]
+    assert read_all(path) == EXPECTED
+
+
+def test_partial_record_dropped(tmp_path):
+    path = str(tmp_path / 'db.json')
+
+    db = open_journal(path)
+    make_changes(db)
+
+    with open(f'{path}.journal.0', 'ab') as f:
+        f.write(b'{"table": "t", "set": {"9": {"a"')
+
+    assert read_all(path) == EXPECTED
+
+
+def test_compaction(tmp_path):
+    path = str(tmp_path / 'db.json')
+
+    db = open_journal(path)
+    make_changes(db)
+    db.storage.flush()
+
+    assert segments(path) == []
+    with open(path) as f:
+        assert json.load(f) == EXPECTED
+
+    # New records go in a new segment
+    db.table('t').insert({ 'a' : 5 })
+    assert segments(path) == [ 'db.json.journal.1' ]
+    db.close()
+
+    assert segments(path) == []
+    assert read_all(path)['t']['6'] == { 'a' : 5 }
+    assert db.storage.stats['compactions'] == 2
+
+
+def test_replay_after_compaction_is_harmless(tmp_path):
+    path = str(tmp_path / 'db.json')
+
+    db = open_journal(path)
+    make_changes(db)
+    shutil.copy(f'{path}.journal.0', str(tmp_path / 'segment'))
+    db.close()
+
+    # Crashed after writing the snapshot, before the segment was deleted
+    shutil.copy(str(tmp_path / 'segment'), f'{path}.journal.0')
+
+    assert read_all(path) == EXPECTED
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import threading
+
+from core.db_table import DbTinyDB
+from core.db_middleware import DbThreadSafeMiddleware
+from core.db_storage import DbAtomicJsonStorage
+from core.db_serializer import DbJsonSerializer
+
+
+def open_json(path: str, **kwargs) -> DbTinyDB:
+    write_behind   = kwargs.pop('write_behind', False)
+    flush_interval = kwargs.pop('flush_interval', 5.0)
+
+    return DbTinyDB(path, storage=DbThreadSafeMiddleware(DbAtomicJsonStorage, write_behind=write_behind, flush_interval=flush_interval), **kwargs)
+
+
+def test_reads_served_from_snapshot(tmp_path):
+    path = str(tmp_path / 'db.json')
+
+    db = open_json(path)
+    db.table('t').insert({ 'a' : 1 })
+    db.close()
+
+    db = open_json(path)
+    for i in range(20):
+        assert db.table('t').get(doc_id=1) == { 'a' : 1 }
+
+    stats = db.storage.stats
+    assert stats['parses'] == 1
+    assert stats['hits']   >= 19
+    db.close()
+
+
+class InterruptedSerializer(DbJsonSerializer):
+    """
+    Has `write` run on another thread in the middle of serializing, like a
+    serializer that lets go of the GIL would
+    """
+
+    def __init__(self):
+        DbJsonSerializer.__init__(self, indent=2)
+        self.write = None
+
+
+    def dumps(self, data) -> bytes:
+        write, self.write = self.write, None
+        if isinstance(write, type(None)):
+            return DbJsonSerializer.dumps(self, data)
+
+        # Partway through a document
+        fields = iter(data['t']['1'].items())
+        first  = [ next(fields) ]
+
+        thread = threading.Thread(target=write)
+        thread.start()
+
+        # The write can't get in while the snapshot is being serialized
+        thread.join(timeout=0.2)
+
+        data = { 't' : { **data['t'], '1' : dict(first + list(fields)) } }
+        return DbJsonSerializer.dumps(self, data)
+
+
+def test_flush_while_writing(tmp_path):
+    path = str(tmp_path / 'db.json')
+    serializer = InterruptedSerializer()
+
+    db = DbTinyDB(path, storage=DbThreadSafeMiddleware(DbAtomicJsonStorage, write_behind=True, flush_interval=60), serializer=serializer)
+
+    table = db.table('t')
+    table.insert({ f'k{i}' : i for i in range(10) })
+
+    # Documents get changed in place
+    serializer.write = lambda: table.update(lambda doc: doc.update({ 'k10' : 10 }), doc_ids=[ 1 ])
+    db.storage.flush()
+
+    # Serialized as it was when the flush started
+    with open(path) as f:
+        assert len(json.load(f)['t']['1']) == 10
+
+    db.close()
+
+    with open(path) as f:
+        assert len(json.load(f)['t']['1']) == 11
+
+
+def test_failed_flush_is_retried(tmp_path, monkeypatch):
+    path = str(tmp_path / 'db.json')
+    db = open_json(path, write_behind=True, flush_interval=60)
+    db.table('t').insert({ 'a' : 1 })
+
+    finish_write = DbAtomicJsonStorage.finish_write
+
+    def failing_write(self, serialized: bytes) -> int:
+        raise OSError('disk full')
+
+    monkeypatch.setattr(DbAtomicJsonStorage, 'finish_write', failing_write)
+    try: db.storage.flush()
+    except OSError:
+        pass
+
+    monkeypatch.setattr(DbAtomicJsonStorage, 'finish_write', finish_write)
+    db.close()
+
+    with open(path) as f:
+        assert json.load(f) == { 't' : { '1' : { 'a' : 1 } } }
+
+
+def test_write_behind_coalesces(tmp_path):
+    path = str(tmp_path / 'db.json')
+    db = open_json(path, write_behind=True, flush_interval=60)
+
+    table = db.table('t')
+    for i in range(100):
+        table.insert({ 'i' : i })
+
+    assert db.storage.stats['writes']  == 100
+    assert db.storage.stats['flushes'] == 0
+
+    db.storage.flush()
+    db.storage.flush()
+    assert db.storage.stats['flushes'] == 1
+
+    with open(path) as f:
+        assert len(json.load(f)['t']) == 100
+
+    table.insert({ 'i' : 100 })
+    db.close()
+
+    with open(path) as f:
+        assert len(json.load(f)['t']) == 101
+
+
+def test_write_behind_flushes_in_background(tmp_path):
+    path = str(tmp_path / 'db.json')
+    db = open_json(path, write_behind=True, flush_interval=0.05)
+    db.table('t').insert({ 'a' : 1 })
+
+    for _ in range(100):
+        if db.storage.stats['flushes'] != 0:
+            break
+
+        time.sleep(0.02)
+
+    assert db.storage.stats['flushes'] == 1
+    with open(path) as f:
+        assert json.load(f) == { 't' : { '1' : { 'a' : 1 } } }
+
+    db.close()
+
+
+def test_flush_leaves_no_tmp_file(tmp_path):
+    path = str(tmp_path / 'db.json')
+    db = open_json(path)
+    db.table('t').insert({ 'a' : 1 })
+    db.close()
+
+    assert sorted(os.listdir(tmp_path)) == [ 'db.json' ]
@@ -0,0 +1,63 @@
+import json
+import pytest
+
+from tinydb import TinyDB
+from tinydb.storages import JSONStorage
+
+from core.db_serializer import DbSerializer, orjson, msgspec
+from core.db_storage import DbAtomicJsonStorage
+
+
+SERIALIZERS = [
+    'json',
+    pytest.param('orjson',  marks=pytest.mark.skipif(orjson  is None, reason='orjson is not installed')),
+    pytest.param('msgspec', marks=pytest.mark.skipif(msgspec is None, reason='msgspec is not installed')),
+]
+
+DATA = {
+    't' : {
+        '1' : { 'text' : 'héllo ✓', 'n' : 2**40, 'f' : 0.5, 'l' : [ 1, None, True ], 'd' : { 'a' : {} } },
+    },
+}
+
+
+@pytest.mark.parametrize('name', SERIALIZERS)
+def test_round_trip(name: str):
+    serializer = DbSerializer.get(name)
+    assert serializer.name == name
+    assert serializer.loads(serializer.dumps(DATA)) == DATA
+
+    # Plain JSON, readable by anything
+    assert json.loads(serializer.dumps(DATA)) == DATA
+
+
+@pytest.mark.parametrize('name', SERIALIZERS)
+def test_reads_tinydb_files(tmp_path, name: str):
+    path = str(tmp_path / 'db.json')
+
+    db = TinyDB(path, storage=JSONStorage)
+    db.table('t').insert(DATA['t']['1'])
+    db.close()
+
+    assert DbAtomicJsonStorage(path, serializer=DbSerializer.get(name)).read() == DATA
+
+
+@pytest.mark.parametrize('name', SERIALIZERS)
+def test_big_ints_fall_back(name: str):
+    data = { 't' : { '1' : { 'n' : 2**70 } } }
+
+    serializer = DbSerializer.get(name)
+    assert json.loads(serializer.dumps(data)) == data
+
+
+@pytest.mark.parametrize('name', SERIALIZERS)
+def test_bad_data_raises_value_error(name: str):
+    with pytest.raises(ValueError):
+        DbSerializer.get(name).loads(b'{"t": {"1": ')
+
+
+def test_get():
+    assert DbSerializer.get('auto', indent=2).name == 'json'
+
+    with pytest.raises(ValueError):
+        DbSerializer.get('yaml')
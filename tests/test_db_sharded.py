@@ -0,0 +1,131 @@
+import os
+import json
+import tinydb
+
+from tinydb.table import Document
+
+from core.db_sharded import DbSharded
+from conftest import DB_INDEXES, DB_SHARDS
+
+
+def open_sharded(path: str, **kwargs) -> DbSharded:
+    return DbSharded(path, DB_SHARDS, indexes=DB_INDEXES, **kwargs)
+
+
+def add_reminders(db: DbSharded, num_guilds: int = 10, per_guild: int = 5):
+    table = db.table('reminders')
+    for guild_id in range(num_guilds):
+        for i in range(per_guild):
+            table.insert(Document({ 'server_id' : guild_id, 'user_id' : i, 'due_at' : i }, doc_id=1000 + guild_id*100 + i))
+
+
+def test_doc_id_lookup_loads_one_shard(tmp_path):
+    path = str(tmp_path / 'db')
+
+    db = open_sharded(path)
+    add_reminders(db)
+    db.close()
+
+    db = open_sharded(path)
+    assert db.table('reminders').get(doc_id=1302) == { 'server_id' : 3, 'user_id' : 2, 'due_at' : 2 }
+
+    # The doc's `_ids` shard and its guild's shard
+    assert db.stats['loads'] == 2
+
+    # Known to be missing without going through the other guilds
+    assert db.table('reminders').get(doc_id=5) is None
+    assert db.stats['loads'] <= 3
+    db.close()
+
+
+def test_guild_query_loads_one_shard(tmp_path):
+    path = str(tmp_path / 'db')
+
+    db = open_sharded(path)
+    add_reminders(db)
+    db.close()
+
+    db = open_sharded(path)
+    assert len(db.table('reminders').search(tinydb.Query().fragment({ 'server_id' : 4 }))) == 5
+    assert db.stats['loads'] == 1
+    db.close()
+
+
+def test_memory_is_bounded(tmp_path):
+    db = open_sharded(str(tmp_path / 'db'), max_loaded=4)
+    add_reminders(db, num_guilds=50, per_guild=2)
+
+    for doc_id in [ 1000 + guild_id*100 for guild_id in range(50) ]:
+        assert db.table('reminders').get(doc_id=doc_id)['user_id'] == 0
+
+    assert db.stats['loaded']    <= 4
+    assert db.stats['evictions'] >  0
+    db.close()
+
+
+def test_doc_moves_to_another_guild(tmp_path):
+    path = str(tmp_path / 'db')
+
+    db = open_sharded(path)
+    add_reminders(db, num_guilds=2)
+    db.table('reminders').update({ 'server_id' : 7 }, doc_ids=[ 1001 ])
+    db.table('reminders').remove(doc_ids=[ 1002 ])
+    db.close()
+
+    db = open_sharded(path)
+    assert db.table('reminders').get(doc_id=1001)['server_id'] == 7
+    assert db.table('reminders').get(doc_id=1002) is None
+    assert len(db.table('reminders').search(tinydb.Query().fragment({ 'server_id' : 0 }))) == 3
+    db.close()
+
+
+def test_ids_built_for_older_dbs(tmp_path):
+    path = str(tmp_path / 'db')
+
+    db = open_sharded(path)
+    add_reminders(db)
+    db.table('self_roles').insert({ 'server' : 1, 'role_name' : 'a' })
+    db.close()
+
+    # As made before there were `_ids` shards
+    for file_name in os.listdir(os.path.join(path, 'shards')):
+        if file_name.startswith('_ids-'):
+            os.remove(os.path.join(path, 'shards', file_name))
+
+    with open(os.path.join(path, 'core.json')) as f:
+        core = json.load(f)
+
+    del core['_shard_dirs']
+    with open(os.path.join(path, 'core.json'), 'w') as f:
+        json.dump(core, f)
+
+    db = open_sharded(path)
+    assert db.table('reminders').get(doc_id=1904)['server_id'] == 9
+    assert db.table('self_roles').get(doc_id=1)['role_name'] == 'a'
+    db.close()
+
+    # Only built once
+    db = open_sharded(path)
+    assert db.table('reminders').get(doc_id=1904)['server_id'] == 9
+    assert db.stats['loads'] == 2
+    db.close()
+
+
+def test_migrate_from_json(tmp_path):
+    json_path = str(tmp_path / 'db.json')
+    with open(json_path, 'w') as f:
+        json.dump({
+            'reminders' : { '10' : { 'server_id' : 1, 'due_at' : 0 }, '11' : { 'server_id' : 2, 'due_at' : 0 } },
+            'bot_en'    : { '123' : { 'en' : True } },
+            'prefix'    : { '1' : { 'prefix' : '!' } },
+        }, f)
+
+    db = open_sharded(str(tmp_path / 'db'))
+    assert db.migrate_from_json(json_path) == 4
+    db.close()
+
+    db = open_sharded(str(tmp_path / 'db'))
+    assert db.table('reminders').get(doc_id=11)['server_id'] == 2
+    assert db.table('bot_en').get(doc_id=123) == { 'en' : True }
+    assert db.table('prefix').all() == [ { 'prefix' : '!' } ]
+    db.close()
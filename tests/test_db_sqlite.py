@@ -0,0 +1,74 @@
+import json
+import tinydb
+import pytest
+
+from core.db_sqlite import DbSqlite
+from conftest import DB_INDEXES
+
+
+def test_migrate_from_json(tmp_path):
+    json_path = str(tmp_path / 'db.json')
+    with open(json_path, 'w') as f:
+        json.dump({
+            'cmd_stats' : { '1' : { 'cmd' : 'help', 'server' : 1, 'count' : 3 }, '5' : { 'cmd' : 'ping', 'server' : 2, 'count' : 1 } },
+            'prefix'    : { '1' : { 'prefix' : '!' } },
+        }, f)
+
+    db = DbSqlite(str(tmp_path / 'db.sqlite'), indexes=DB_INDEXES)
+    db.table('prefix').insert({ 'prefix' : '?' })
+
+    # Existing documents are overwritten
+    assert db.migrate_from_json(json_path) == 3
+    assert db.table('prefix').all() == [ { 'prefix' : '!' } ]
+    assert db.table('cmd_stats').get(doc_id=5)['cmd'] == 'ping'
+
+    # Doc ids carry on from the imported ones
+    assert db.table('cmd_stats').insert({ 'cmd' : 'roll', 'server' : 1, 'count' : 1 }) == 6
+    db.close()
+
+
+def test_eq_queries_use_index(tmp_path):
+    db = DbSqlite(str(tmp_path / 'db.sqlite'), indexes=DB_INDEXES)
+    table = db.table('cmd_stats')
+    table.insert_multiple([ { 'cmd' : f'c{i % 10}', 'server' : i, 'count' : 1 } for i in range(100) ])
+
+    field_exprs = ' AND '.join([ f'{DbSqlite.field_expr(field)} = ?' for field in ( 'cmd', 'server' ) ])
+    plan = db.execute(f'EXPLAIN QUERY PLAN SELECT doc_id, data FROM {table.sql_name} WHERE {field_exprs}', ( 'c3', 3 )).fetchall()
+    assert 'cmd_stats__cmd__server' in str(plan)
+
+    assert [ doc['server'] for doc in table.search(tinydb.Query().fragment({ 'cmd' : 'c3', 'server' : 13 })) ] == [ 13 ]
+    db.close()
+
+
+def test_same_matches_as_tinydb(tmp_path):
+    docs = [ { 'a' : 1 }, { 'a' : True }, { 'a' : '1' }, { 'a' : 1.0 }, { 'a' : [ 1 ] }, { 'b' : 1 } ]
+
+    db = DbSqlite(str(tmp_path / 'db.sqlite'))
+    db.table('t').insert_multiple(docs)
+
+    mem = tinydb.TinyDB(storage=tinydb.storages.MemoryStorage)
+    mem.table('t').insert_multiple(docs)
+
+    for value in [ 1, True, '1', [ 1 ] ]:
+        cond = tinydb.Query().a == value
+        assert db.table('t').search(cond) == mem.table('t').search(cond)
+
+    db.close()
+
+
+def test_failed_transaction_rolls_back(tmp_path):
+    db = DbSqlite(str(tmp_path / 'db.sqlite'))
+    table = db.table('t')
+    table.insert({ 'a' : 1 })
+
+    def failing_update(doc: dict):
+        raise RuntimeError('failed')
+
+    with pytest.raises(ValueError):
+        table.insert_multiple([ { 'a' : 2 }, tinydb.table.Document({ 'a' : 3 }, doc_id=1) ])
+
+    with pytest.raises(RuntimeError):
+        table.update(failing_update)
+
+    assert table.all() == [ { 'a' : 1 } ]
+    db.close()
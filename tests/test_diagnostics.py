@@ -0,0 +1,68 @@
+import asyncio
+import warnings
+import pytest
+
+from core.diagnostics import Diagnostics
+
+
+@pytest.fixture
+def installed():
+    with warnings.catch_warnings():
+        warnings.simplefilter('always')
+        Diagnostics.install()
+
+        yield
+
+    # The `warnings` module is back to how it was
+    Diagnostics._Diagnostics__showwarning = None
+
+
+async def warn_later(message: str):
+    await asyncio.sleep(0)
+    Diagnostics.warn(message)
+
+
+async def cmd(name: str, num_warnings: int) -> list:
+    with Diagnostics.capture() as records:
+        for i in range(num_warnings):
+            Diagnostics.warn(f'{name} {i}')
+            await asyncio.sleep(0)
+
+        # Library warnings, and ones from tasks made in the capture
+        warnings.warn(f'{name} lib')
+        await asyncio.create_task(warn_later(f'{name} task'))
+
+    return [ str(record.message) for record in records ]
+
+
+def test_concurrent_captures(installed):
+    async def test():
+        return await asyncio.gather(cmd('a', 3), cmd('b', 2))
+
+    a, b = asyncio.run(test())
+    assert a == [ 'a 0', 'a 1', 'a 2', 'a lib', 'a task' ]
+    assert b == [ 'b 0', 'b 1', 'b lib', 'b task' ]
+
+
+def test_outside_capture(installed):
+    with pytest.warns(UserWarning, match='not captured'):
+        Diagnostics.warn('not captured')
+
+    with Diagnostics.capture() as records:
+        pass
+
+    with pytest.warns(UserWarning, match='also not captured'):
+        warnings.warn('also not captured')
+
+    assert records == []
+
+
+def test_location_is_the_caller():
+    def caller():
+        Diagnostics.warn('here', stacklevel=1)
+
+    with Diagnostics.capture() as records:
+        caller()
+
+    assert records[0].filename == __file__
+    assert records[0].category is UserWarning
@@ -0,0 +1,155 @@
+import asyncio
+import pytest
+
+from io import BytesIO
+from PIL import Image
+from aiohttp import web
+
+from cmds.image_modules import fetch
+from cmds.image_modules.fetch import ImageFetcher, ImageFetchError
+
+
+def make_png(width: int, height: int) -> bytes:
+    data = BytesIO()
+    Image.new('RGB', ( width, height ), ( 255, 0, 0 )).save(data, format='png')
+    return data.getvalue()
+
+
+async def serve(routes: dict, test):
+    """
+    Runs `test(base_url)` against a local server with `routes` (path -> handler)
+    """
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_get(path, handler)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+
+    port = runner.addresses[0][1]
+    try: await test(f'http://127.0.0.1:{port}')
+    finally:
+        await runner.cleanup()
+
+
+def fetch_from(routes: dict, path: str, **kwargs) -> bytes:
+    result = {}
+
+    async def test(base_url: str):
+        fetcher = ImageFetcher(**kwargs)
+        try: result['data'] = await fetcher.fetch(f'{base_url}{path}')
+        finally:
+            await fetcher.close()
+
+    asyncio.run(serve(routes, test))
+    return result['data']
+
+
+def test_fetch():
+    png = make_png(32, 32)
+
+    async def image(request):
+        return web.Response(body=png, content_type='image/png')
+
+    assert fetch_from({ '/img' : image }, '/img') == png
+
+
+@pytest.mark.parametrize('path, error', [
+    ( '/missing', 'Unable to fetch image' ),
+    ( '/html',    'Not an image' ),
+    ( '/garbage', 'Not an image' ),
+    ( '/large',   'Image dimensions are too large' ),
+    ( '/big',     'Image is too large' ),
+])
+def test_rejected(path: str, error: str):
+    async def html(request):
+        return web.Response(text='<html></html>', content_type='text/html')
+
+    async def garbage(request):
+        return web.Response(body=b'\0'*1000, content_type='application/octet-stream')
+
+    async def large(request):
+        return web.Response(body=make_png(200, 200), content_type='image/png')
+
+    async def big(request):
+        return web.Response(body=b'\0'*(2*1024*1024), content_type='image/png')
+
+    routes = { '/html' : html, '/garbage' : garbage, '/large' : large, '/big' : big }
+
+    with pytest.raises(ImageFetchError, match=error):
+        fetch_from(routes, path, max_bytes=1024*1024, max_pixels=100*100)
+
+
+def test_over_budget_stops_early():
+    chunks_sent = []
+
+    async def large(request):
+        # The header is in the first chunk, the rest never needs to be read
+        reply = web.StreamResponse(headers={ 'Content-Type' : 'image/png' })
+        await reply.prepare(request)
+
+        data = make_png(200, 200).ljust(64*1024, b'\0')
+        await reply.write(data)
+        chunks_sent.append(len(data))
+
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            await reply.write(b'\0'*64*1024)
+            chunks_sent.append(64*1024)
+
+        return reply
+
+    with pytest.raises(ImageFetchError, match='Image dimensions are too large'):
+        fetch_from({ '/large' : large }, '/large', max_pixels=100*100)
+
+    assert len(chunks_sent) < 100
+
+
+def test_header_parsed_a_few_times(monkeypatch):
+    png = make_png(64, 64)
+
+    # The header only shows up after lots of padding
+    data = b'\0'*(512*1024)
+    opens = []
+
+    async def late(request):
+        reply = web.StreamResponse(headers={ 'Content-Type' : 'application/octet-stream' })
+        await reply.prepare(request)
+
+        for i in range(0, len(data), 16*1024):
+            await reply.write(data[i : i + 16*1024])
+
+        return reply
+
+    image_open = Image.open
+
+    def counting_open(fp, *args, **kwargs):
+        opens.append(1)
+        return image_open(fp, *args, **kwargs)
+
+    monkeypatch.setattr(fetch.Image, 'open', counting_open)
+
+    with pytest.raises(ImageFetchError, match='Not an image'):
+        fetch_from({ '/late' : late }, '/late')
+
+    # 64K, 128K, 256K, 512K, and once at the end; not once per chunk
+    assert len(opens) <= 5
+
+
+def test_total_timeout():
+    async def slow(request):
+        reply = web.StreamResponse(headers={ 'Content-Type' : 'image/png' })
+        await reply.prepare(request)
+
+        # Each read is quick, the whole download isn't
+        for _ in range(50):
+            await reply.write(b'\0')
+            await asyncio.sleep(0.05)
+
+        return reply
+
+    with pytest.raises(ImageFetchError, match='Timed out'):
+        fetch_from({ '/slow' : slow }, '/slow', read_timeout=1, total_timeout=0.5)
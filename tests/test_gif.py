@@ -0,0 +1,94 @@
+import pytest
+
+from io import BytesIO
+from PIL import Image
+
+from cmds.image_modules import ops
+from cmds.image_modules.gif import GifWriter
+
+
+def make_gif(transparent: bool, num_frames: int = 3) -> bytes:
+    frames = []
+    for i in range(num_frames):
+        frame = Image.new('RGBA', ( 16, 16 ), ( 255, 0, 0, 0 if transparent else 255 ))
+        frame.paste(( 0, i*80, 255, 255 ), ( 4, 4, 12, 12 ))
+        frames.append(frame)
+
+    data = BytesIO()
+    frames[0].save(data, format='gif', save_all=True, append_images=frames[1:], duration=50, loop=0, disposal=2)
+    return data.getvalue()
+
+
+def frames_of(data: bytes) -> "list[Image.Image]":
+    img = Image.open(BytesIO(data))
+    assert img.format == 'GIF'
+
+    frames = []
+    for i in range(img.n_frames):
+        img.seek(i)
+        frames.append(img.convert('RGBA'))
+
+    return frames
+
+
+@pytest.mark.parametrize('steps', [
+    [ ( 'channel', 'r' ) ],
+    [ ( 'channel', 'g' ) ],
+    [ ( 'invert', ) ],
+    [ ( 'zoom', 2.0 ), ( 'channel', 'b' ) ],
+])
+def test_transparent_animated_gif(steps: list):
+    data, ext = ops.pipe(make_gif(transparent=True), steps)
+
+    assert ext == 'gif'
+    assert len(frames_of(data)) == 3
+
+
+def test_transparency_is_kept():
+    data, _ = ops.invert(make_gif(transparent=True))
+
+    frames = frames_of(data)
+    assert frames[0].getpixel(( 0, 0 ))[3] == 0
+    assert frames[0].getpixel(( 8, 8 ))[3] == 255
+
+
+def test_channel_values():
+    data, _ = ops.channel(make_gif(transparent=False), 'g')
+
+    for i, frame in enumerate(frames_of(data)):
+        assert frame.getpixel(( 8, 8 ))[:3] == ( i*80, )*3
+
+
+def test_single_frame_gif():
+    data, ext = ops.invert(make_gif(transparent=False, num_frames=1))
+
+    assert ext == 'png'
+    assert Image.open(BytesIO(data)).convert('RGB').getpixel(( 8, 8 )) == ( 255, 255, 0 )
+
+
+def test_same_frames_are_merged():
+    out = BytesIO()
+    writer = GifWriter(out, loop=0)
+
+    frame = Image.new('RGB', ( 8, 8 ), ( 10, 20, 30 ))
+    for i in range(4):
+        writer.add(frame, 50)
+    writer.close()
+
+    img = Image.open(BytesIO(out.getvalue()))
+    assert img.n_frames == 1
+    assert img.info['duration'] == 200
+
+
+def test_band_with_color_transparency():
+    # A band split off an RGB frame keeps the frame's RGB transparent color
+    band = Image.new('L', ( 8, 8 ), 100)
+    band.info['transparency'] = ( 255, 0, 0 )
+
+    out = BytesIO()
+    writer = GifWriter(out)
+    writer.add(band, 50)
+    writer.add(Image.new('L', ( 8, 8 ), 200), 50)
+    writer.close()
+
+    assert len(frames_of(out.getvalue())) == 2
@@ -0,0 +1,91 @@
+import os
+import asyncio
+
+from cmds.image_modules.cache import ImageCache
+
+
+def test_normalize_url():
+    signed = 'https://media.discordapp.net/attachments/1/2/a.png?hm=abc&ex=1&is=2&width=100'
+    assert ImageCache.normalize_url(signed) == 'https://cdn.discordapp.com/attachments/1/2/a.png?width=100'
+
+    # Same names on other hosts could be part of what picks the image
+    other = 'https://example.com/img?is=2&ex=1'
+    assert ImageCache.normalize_url(other) == 'https://example.com/img?ex=1&is=2'
+
+
+def test_put_get(tmp_path):
+    async def test():
+        cache = ImageCache(str(tmp_path), max_age=60)
+
+        assert await cache.get('https://example.com/a.png') == ( None, {} )
+        await cache.put('https://example.com/a.png', b'a', etag='"1"')
+        await cache.put('https://example.com/b.png', b'a')
+
+        assert await cache.get('https://example.com/a.png') == ( b'a', {} )
+        assert cache.stats['images'] == 1
+        assert cache.stats['urls']   == 2
+
+    asyncio.run(test())
+
+
+def test_not_loaded_on_init(tmp_path):
+    async def test():
+        await ImageCache(str(tmp_path)).put('https://example.com/a.png', b'a')
+
+    asyncio.run(test())
+
+    async def test():
+        cache = ImageCache(str(tmp_path))
+        assert cache.stats['images'] == 0
+
+        assert await cache.get('https://example.com/a.png') == ( b'a', {} )
+        assert cache.stats['images'] == 1
+
+    asyncio.run(test())
+
+
+def test_revalidate(tmp_path):
+    async def test():
+        cache = ImageCache(str(tmp_path), max_age=0)
+        await cache.put('https://example.com/a.png', b'a', etag='"1"', last_modified='yesterday')
+
+        data, headers = await cache.get('https://example.com/a.png')
+        assert data is None
+        assert headers == { 'If-None-Match' : '"1"', 'If-Modified-Since' : 'yesterday' }
+
+        assert await cache.revalidated('https://example.com/a.png') == b'a'
+        assert await cache.revalidated('https://example.com/b.png') is None
+
+    asyncio.run(test())
+
+
+def test_evicts_least_recently_used(tmp_path):
+    async def test():
+        cache = ImageCache(str(tmp_path), max_bytes=2, max_age=60)
+        await cache.put('https://example.com/a.png', b'a')
+        await cache.put('https://example.com/b.png', b'b')
+
+        # a is used last, so b goes
+        await cache.get('https://example.com/a.png')
+        await cache.put('https://example.com/c.png', b'c')
+
+        assert (await cache.get('https://example.com/a.png'))[0] == b'a'
+        assert (await cache.get('https://example.com/b.png'))[0] is None
+        assert cache.stats['evictions'] == 1
+
+    asyncio.run(test())
+
+
+def test_blob_deleted_from_under(tmp_path):
+    async def test():
+        cache = ImageCache(str(tmp_path), max_age=60)
+        await cache.put('https://example.com/a.png', b'a')
+
+        for root, dirs, files in os.walk(tmp_path):
+            for name in files:
+                if name != 'index.json':
+                    os.remove(os.path.join(root, name))
+
+        assert await cache.get('https://example.com/a.png') == ( None, {} )
+
+    asyncio.run(test())
@@ -0,0 +1,80 @@
+import pytest
+
+from io import BytesIO
+from PIL import Image, ImageOps
+
+from cmds.image_modules import kernels, ops
+
+
+def noise(mode: str) -> Image.Image:
+    img = Image.effect_noise(( 32, 24 ), 64).convert('RGB')
+    if mode == 'RGBA':
+        img = img.convert('RGBA')
+        img.putalpha(Image.linear_gradient('L').resize(( 32, 24 )))
+
+    return img.convert(mode)
+
+
+@pytest.mark.parametrize('mode', [ 'L', 'RGB', 'RGBA', 'LA' ])
+def test_invert_matches_split(mode: str):
+    img = noise(mode)
+    bands = img.split()
+
+    expected = [ ImageOps.invert(band) for band in bands ]
+    if 'A' in img.getbands():
+        expected[-1] = bands[-1]
+
+    assert kernels.invert(img).tobytes() == Image.merge(mode, expected).tobytes()
+
+
+def test_invert_other_modes():
+    img = noise('RGB').convert('P')
+    assert kernels.invert(img).tobytes() == ImageOps.invert(img.convert('RGB')).tobytes()
+
+
+@pytest.mark.parametrize('mode', [ 'RGB', 'RGBA', 'P' ])
+@pytest.mark.parametrize('ch', [ 'r', 'g', 'b' ])
+def test_channel_matches_split(mode: str, ch: str):
+    img = noise('RGBA' if mode == 'RGBA' else 'RGB').convert(mode)
+    expected = img.convert('RGBA' if mode == 'RGBA' else 'RGB').split()[ 'rgb'.index(ch) ]
+
+    assert kernels.channel(img, ch).tobytes() == expected.tobytes()
+
+
+def test_channel_alpha():
+    img = noise('RGBA')
+    assert kernels.channel(img, 'a').tobytes() == img.split()[3].tobytes()
+
+    with pytest.raises(kernels.KernelError):
+        kernels.channel(noise('RGB'), 'a')
+
+    with pytest.raises(kernels.KernelError):
+        kernels.channel(img, 'x')
+
+
+def test_invert_transparent_color():
+    img = noise('RGB')
+    img.info['transparency'] = ( 255, 0, 10 )
+    assert kernels.invert(img).info['transparency'] == ( 0, 255, 245 )
+
+    img = noise('L')
+    img.info['transparency'] = 5
+    assert kernels.invert(img).info['transparency'] == 250
+
+
+@pytest.mark.parametrize('fmt', [ 'png', 'gif' ])
+@pytest.mark.parametrize('ch', [ 'r', 'g', 'b' ])
+def test_channel_of_transparent_image(fmt: str, ch: str):
+    img = Image.new('RGBA', ( 16, 16 ), ( 255, 0, 0, 0 ))
+    img.paste(( 0, 128, 255, 255 ), ( 4, 4, 12, 12 ))
+
+    data = BytesIO()
+    if fmt == 'png':
+        img.convert('RGB').save(data, format='png', transparency=( 255, 0, 0 ))
+    else:
+        img.save(data, format='gif')
+
+    out, ext = ops.channel(data.getvalue(), ch)
+
+    assert ext == 'png'
+    assert Image.open(BytesIO(out)).getpixel(( 8, 8 )) == ( 0, 128, 255 )[ 'rgb'.index(ch) ]
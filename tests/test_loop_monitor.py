@@ -0,0 +1,46 @@
+import time
+import asyncio
+
+from core.loop_monitor import LoopMonitor
+
+
+def test_stall_attributed_to_task():
+    monitor = LoopMonitor(interval=0.01, threshold=0.1)
+
+    async def blocking():
+        time.sleep(0.3)
+
+    async def test():
+        heartbeat = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.05)
+
+        await asyncio.create_task(blocking(), name='cmd:slow')
+        await asyncio.sleep(0.05)
+
+        heartbeat.cancel()
+
+    asyncio.run(test())
+
+    stats = monitor.stats
+    assert list(stats['stalls']) == [ 'cmd:slow' ]
+    assert stats['stalls']['cmd:slow']['count']  == 1
+    assert stats['stalls']['cmd:slow']['max_ms'] >= 200
+    assert stats['recent'][0]['name'] == 'cmd:slow'
+
+    assert stats['samples'] > 5
+    assert stats['histogram']['>5000ms'] == 0
+    assert stats['lag_max_ms'] >= 200
+
+
+def test_no_stalls_when_idle():
+    monitor = LoopMonitor(interval=0.01, threshold=0.1)
+
+    async def test():
+        heartbeat = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.1)
+        heartbeat.cancel()
+
+    asyncio.run(test())
+
+    assert monitor.stats['stalls'] == {}
+    assert monitor.stats['samples'] > 0
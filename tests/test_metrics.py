@@ -0,0 +1,56 @@
+import math
+
+from core.metrics import Metrics
+
+
+def rendered(name: str) -> "list[str]":
+    return [ line for line in Metrics.render().split('\n') if name in line ]
+
+
+def test_counter():
+    counter = Metrics.counter('test_posts_total', 'Posts', ( 'route', ))
+    counter.inc('a')
+    counter.inc('a')
+    counter.inc('say "hi"\n', amount=0.5)
+
+    assert rendered('test_posts_total') == [
+        '# HELP test_posts_total Posts',
+        '# TYPE test_posts_total counter',
+        'test_posts_total{route="a"} 2',
+        'test_posts_total{route="say \\"hi\\"\\n"} 0.5',
+    ]
+
+    # Made again, ex: module imported twice
+    assert Metrics.counter('test_posts_total', 'Posts', ( 'route', )) is counter
+
+
+def test_gauge():
+    Metrics.gauge('test_queued', 'Queued', fn=lambda: { () : 3 })
+    gauge = Metrics.gauge('test_running', 'Running', ( 'cls', ))
+    gauge.set('image', value=2)
+
+    assert rendered('test_queued')[-1]  == 'test_queued 3'
+    assert rendered('test_running')[-1] == 'test_running{cls="image"} 2'
+
+
+def test_histogram():
+    histogram = Metrics.histogram('test_duration_seconds', 'Duration', ( 'cmd', ), buckets=( 0.1, 1.0 ))
+    for value in [ 0.05, 0.1, 0.5, 2.0 ]:
+        histogram.observe(value, 'help')
+
+    # Buckets are cumulative, a value on a bound counts in that bucket
+    assert rendered('test_duration_seconds')[2:] == [
+        'test_duration_seconds_bucket{cmd="help",le="0.1"} 2',
+        'test_duration_seconds_bucket{cmd="help",le="1.0"} 3',
+        'test_duration_seconds_bucket{cmd="help",le="+Inf"} 4',
+        'test_duration_seconds_sum{cmd="help"} 2.65',
+        'test_duration_seconds_count{cmd="help"} 4',
+    ]
+
+
+def test_format_value():
+    assert Metrics.format_value(math.inf)  == '+Inf'
+    assert Metrics.format_value(-math.inf) == '-Inf'
+    assert Metrics.format_value(math.nan)  == 'NaN'
+    assert Metrics.format_value(3)   == '3'
+    assert Metrics.format_value(0.25) == '0.25'
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from core.msg_history import MsgHistory
+
+
+def make_msg(msg_id: int, channel_id: int, content_types: "list[str]" = ()) -> SimpleNamespace:
+    return SimpleNamespace(
+        id          = msg_id,
+        channel     = SimpleNamespace(id=channel_id),
+        author      = SimpleNamespace(id=msg_id*10),
+        attachments = [
+            SimpleNamespace(url=f'https://cdn/{msg_id}/{i}', proxy_url=f'https://media/{msg_id}/{i}', content_type=content_type)
+            for i, content_type in enumerate(content_types)
+        ],
+    )
+
+
+def test_newest_first_and_bounded():
+    history = MsgHistory(max_msgs=3)
+    for msg_id in range(5):
+        history.add(make_msg(msg_id, 1))
+
+    assert [ record.id for record in history.get(1) ] == [ 4, 3, 2 ]
+    assert history.get(1)[0].author_id == 40
+    assert history.get(2) == []
+
+
+def test_least_recently_active_channel_dropped():
+    history = MsgHistory(max_channels=2)
+    history.add(make_msg(1, 1))
+    history.add(make_msg(2, 2))
+    history.add(make_msg(3, 1))
+    history.add(make_msg(4, 3))
+
+    assert history.get(2) == []
+    assert [ record.id for record in history.get(1) ] == [ 3, 1 ]
+
+
+def test_find_images():
+    history = MsgHistory()
+    history.add(make_msg(1, 1, [ 'image/png', 'image/gif' ]))
+    history.add(make_msg(2, 1, [ 'video/mp4', None ]))
+    history.add(make_msg(3, 1))
+
+    images = history.find_images(1)
+    assert [ image.url for image in images ] == [ 'https://cdn/1/0', 'https://cdn/1/1' ]
+
+    # Not far enough back
+    assert history.find_images(1, max_msgs=2) == []
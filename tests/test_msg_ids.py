@@ -0,0 +1,54 @@
+import datetime
+
+import discord
+
+from core.msg_ids import MsgIdCache
+
+
+def snowflake(seconds: float) -> int:
+    """
+    Id of a message sent `seconds` from now
+    """
+    return discord.utils.time_snowflake(discord.utils.utcnow() + datetime.timedelta(seconds=seconds))
+
+
+def test_contains():
+    cache = MsgIdCache()
+    sent  = snowflake(1)
+    cache.add(sent)
+
+    assert cache.contains(sent) is True
+
+    # Newer than when the cache started and not added, so not the bot's
+    assert cache.contains(snowflake(2)) is False
+
+    # From before, can't tell
+    assert cache.contains(snowflake(-60)) is None
+
+
+def test_evicted_ids_are_unknown():
+    cache = MsgIdCache(max_ids=2)
+    ids = [ snowflake(i) for i in range(1, 4) ]
+    for msg_id in ids:
+        cache.add(msg_id)
+
+    assert cache.contains(ids[0]) is None
+    assert cache.contains(ids[2]) is True
+
+    # Everything after the evicted one was added
+    assert cache.contains(ids[0] + 1) is False
+    assert cache.contains(ids[0] - 1) is None
+
+
+def test_reset(monkeypatch):
+    now = discord.utils.utcnow()
+    monkeypatch.setattr(discord.utils, 'utcnow', lambda: now)
+
+    cache  = MsgIdCache()
+    missed = discord.utils.time_snowflake(now + datetime.timedelta(seconds=10))
+    assert cache.contains(missed) is False
+
+    # Could've been sent while disconnected
+    monkeypatch.setattr(discord.utils, 'utcnow', lambda: now + datetime.timedelta(seconds=20))
+    cache.reset()
+    assert cache.contains(missed) is None
@@ -0,0 +1,87 @@
+import pytest
+
+from io import BytesIO
+from PIL import Image
+
+from cmds.image_modules import ops
+from cmds.image_modules.ops import ImageOpError
+
+
+def encode(img: Image.Image, fmt: str = 'png') -> bytes:
+    data = BytesIO()
+    img.save(data, format=fmt)
+    return data.getvalue()
+
+
+def make_img(mode: str = 'RGB') -> Image.Image:
+    img = Image.new('RGB', ( 8, 8 ), ( 255, 0, 0 ))
+    img.paste(( 0, 0, 255 ), ( 2, 2, 6, 6 ))
+    return img.convert(mode) if mode != 'P' else img.quantize(colors=4)
+
+
+def decoded(data: bytes) -> Image.Image:
+    img = Image.open(BytesIO(data))
+    img.load()
+    return img
+
+
+def test_steps_chain_like_separate_ops():
+    data = encode(make_img())
+
+    chained, ext = ops.pipe(data, [ ( 'zoom', 2.0 ), ( 'invert', ), ( 'channel', 'g' ) ])
+    assert ext == 'png'
+
+    separate, _ = ops.zoom(data, 2.0)
+    separate, _ = ops.invert(separate)
+    separate, _ = ops.channel(separate, 'g')
+
+    assert decoded(chained).tobytes() == decoded(separate).tobytes()
+    assert decoded(chained).size == ( 16, 16 )
+
+
+@pytest.mark.parametrize('mode', [ 'P', 'L', 'LA', 'RGBA' ])
+def test_input_modes(mode: str):
+    data, _ = ops.invert(encode(make_img(mode)))
+    img = decoded(data).convert('RGB')
+
+    expected = make_img(mode).convert('RGB')
+    assert img.getpixel(( 0, 0 )) == tuple([ 255 - value for value in expected.getpixel(( 0, 0 )) ])
+    assert img.getpixel(( 3, 3 )) == tuple([ 255 - value for value in expected.getpixel(( 3, 3 )) ])
+
+
+@pytest.mark.parametrize('fmt', [ 'png', 'gif' ])
+def test_palette_transparency_is_kept(fmt: str):
+    img = Image.new('RGBA', ( 8, 8 ), ( 255, 0, 0, 0 ))
+    img.paste(( 0, 0, 255, 255 ), ( 2, 2, 6, 6 ))
+
+    # Both come out as palette images, the png with a transparent entry per color, the gif with one
+    if fmt == 'png':
+        img = img.quantize(colors=4, method=Image.Quantize.FASTOCTREE)
+
+    data = encode(img, fmt)
+    assert decoded(data).mode == 'P'
+
+    data, _ = ops.invert(data)
+    img = decoded(data).convert('RGBA')
+
+    assert img.getpixel(( 0, 0 ))[3] == 0
+    assert img.getpixel(( 3, 3 )) == ( 255, 255, 0, 255 )
+
+
+def test_palette_gif_single_frame():
+    data, ext = ops.channel(encode(make_img('P'), 'gif'), 'r')
+
+    # One frame isn't animated, comes back as a png
+    assert ext == 'png'
+    assert decoded(data).getpixel(( 0, 0 )) == 255
+    assert decoded(data).getpixel(( 3, 3 )) == 0
+
+
+@pytest.mark.parametrize('data, steps, error', [
+    ( b'not an image',          [ ( 'invert', ) ],      'Not an image' ),
+    ( encode(make_img('L')),    [ ( 'channel', 'a' ) ], 'alpha channel' ),
+    ( encode(make_img()),       [ ( 'channel', 'x' ) ], 'Invalid channel' ),
+])
+def test_errors(data: bytes, steps: list, error: str):
+    with pytest.raises(ImageOpError, match=error):
+        ops.pipe(data, steps)
@@ -0,0 +1,82 @@
+import os
+import time
+import asyncio
+import pytest
+
+from io import BytesIO
+from PIL import Image
+
+from cmds.image_modules import ops
+from cmds.image_modules.ops import ImageOpError
+from cmds.image_modules.pool import ImagePool, resource
+
+
+# Jobs are run in spawned workers, which import them from here
+
+def sleep_job(seconds: float) -> "tuple[bytes, str]":
+    time.sleep(seconds)
+    return b'', 'png'
+
+
+def crash_job() -> "tuple[bytes, str]":
+    os._exit(1)
+
+
+def hog_job() -> "tuple[bytes, str]":
+    data = bytearray(1024*1024*1024)
+    return bytes(data[:1]), 'png'
+
+
+def make_png() -> bytes:
+    data = BytesIO()
+    Image.new('RGB', ( 8, 8 ), ( 255, 0, 0 )).save(data, format='png')
+    return data.getvalue()
+
+
+def run(pool: ImagePool, jobs: list) -> list:
+    async def test():
+        return await asyncio.gather(*[ pool.run(*job) for job in jobs ], return_exceptions=True)
+
+    try: return asyncio.run(test())
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize('workers', [ 0, 1 ])
+def test_runs_ops(workers: int):
+    data, ext = run(ImagePool(workers=workers), [ ( ops.invert, make_png() ) ])[0]
+
+    assert ext == 'png'
+    assert Image.open(BytesIO(data)).getpixel(( 0, 0 )) == ( 0, 255, 255 )
+
+
+@pytest.mark.parametrize('workers', [ 0, 1 ])
+def test_timeout(workers: int):
+    result, = run(ImagePool(workers=workers, timeout=0.5), [ ( sleep_job, 5 ) ])
+
+    assert isinstance(result, ImageOpError)
+    assert 'too long' in str(result)
+
+
+def test_killed_workers_are_replaced():
+    pool = ImagePool(workers=2, timeout=2)
+
+    async def test():
+        # The other job is lost when the crashed worker's pool goes down, and is run again
+        crashed, slept = await asyncio.gather(pool.run(crash_job), pool.run(sleep_job, 0.5), return_exceptions=True)
+        assert isinstance(crashed, ImageOpError)
+        assert slept == ( b'', 'png' )
+
+        assert await pool.run(sleep_job, 0) == ( b'', 'png' )
+
+    try: asyncio.run(test())
+    finally:
+        pool.close()
+
+
+@pytest.mark.skipif(resource is None, reason='no memory cap on this platform')
+def test_memory_cap():
+    result, = run(ImagePool(workers=1, timeout=10, max_memory=256*1024*1024), [ ( hog_job, ) ])
+
+    assert isinstance(result, ImageOpError)
+    assert 'too large' in str(result)
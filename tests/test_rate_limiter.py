@@ -0,0 +1,79 @@
+import time
+
+from core.rate_limiter import RateLimiter
+
+
+class Clock():
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_limiter(monkeypatch, limits: dict, **kwargs) -> "tuple[RateLimiter, Clock]":
+    clock = Clock()
+    monkeypatch.setattr(time, 'monotonic', clock)
+    return RateLimiter(limits, **kwargs), clock
+
+
+def test_burst_then_refill(monkeypatch):
+    limiter, clock = make_limiter(monkeypatch, { 'user' : { 'capacity' : 3, 'per_second' : 1 } })
+
+    assert all(limiter.allow(1, 10, 'cmd') for _ in range(3))
+    assert not limiter.allow(1, 10, 'cmd')
+
+    # Other users have their own bucket
+    assert limiter.allow(2, 10, 'cmd')
+
+    clock.now += 1.0
+    assert limiter.allow(1, 10, 'cmd')
+    assert not limiter.allow(1, 10, 'cmd')
+
+    assert limiter.stats['allowed']  == 5
+    assert limiter.stats['rejected'] == 2
+
+
+def test_rejected_costs_nothing(monkeypatch):
+    limiter, clock = make_limiter(monkeypatch, {
+        'user'  : { 'capacity' : 10, 'per_second' : 1 },
+        'guild' : { 'capacity' : 2,  'per_second' : 1 },
+    })
+
+    assert limiter.allow(1, 10, 'cmd')
+    assert limiter.allow(1, 10, 'cmd')
+
+    # The guild is out, the user's tokens stay put
+    for _ in range(8):
+        assert not limiter.allow(1, 10, 'cmd')
+
+    # 8 left for the user, 2 per guild
+    assert all(limiter.allow(1, guild_id, 'cmd') for guild_id in (20, 20, 30, 30, 40, 40, 50, 50))
+    assert not limiter.allow(1, 60, 'cmd')
+
+
+def test_cost_and_dms(monkeypatch):
+    limiter, clock = make_limiter(monkeypatch, {
+        'guild' : { 'capacity' : 1, 'per_second' : 1 },
+        'cmd'   : { 'capacity' : 5, 'per_second' : 1 },
+    })
+
+    # DMs have no guild bucket
+    assert limiter.allow(1, None, 'gif', cost=4)
+    assert not limiter.allow(1, None, 'gif', cost=4)
+    assert limiter.allow(1, None, 'other', cost=4)
+
+
+def test_full_buckets_are_swept(monkeypatch):
+    limiter, clock = make_limiter(monkeypatch, { 'user' : { 'capacity' : 2, 'per_second' : 1 } }, sweep_interval=10)
+
+    for user_id in range(100):
+        limiter.allow(user_id, None, 'cmd')
+
+    assert limiter.stats['buckets'] == 100
+
+    clock.now += 10.0
+    limiter.allow(0, None, 'cmd')
+
+    assert limiter.stats['buckets'] == 1
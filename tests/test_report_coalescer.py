@@ -0,0 +1,64 @@
+import asyncio
+
+from core.report_coalescer import ReportCoalescer
+
+
+def make_coalescer(**kwargs) -> "tuple[ReportCoalescer, list]":
+    sent = []
+
+    async def send(digest: str):
+        sent.append(digest)
+
+    return ReportCoalescer(send, **kwargs), sent
+
+
+def fail(i: int):
+    raise ValueError(f'failed {i}')
+
+
+def test_repeats_are_counted():
+    coalescer, sent = make_coalescer()
+
+    for i in range(5):
+        try: fail(i)
+        except ValueError as e:
+            coalescer.add(f'error {e}', ReportCoalescer.fingerprint(e))
+
+    coalescer.add('other')
+    asyncio.run(coalescer.flush())
+
+    assert sent == [ 'error failed 0\n(x5 since last report)\nother\n' ]
+    assert coalescer.stats['repeats'] == 4
+    assert coalescer.stats['pending'] == 0
+
+
+def test_split_and_truncated():
+    coalescer, sent = make_coalescer()
+    coalescer.add('a'*1000)
+    coalescer.add('b'*1000)
+    coalescer.add('c'*5000)
+    asyncio.run(coalescer.flush())
+
+    assert len(sent) == 3
+    assert all([ len(digest) <= ReportCoalescer.MAX_MSG_LEN + 1 for digest in sent ])
+    assert sent[2].endswith('... (truncated)\n')
+
+
+def test_over_budget_only_logged():
+    coalescer, sent = make_coalescer(max_per_minute=2, max_pending=3)
+
+    async def test():
+        for i in range(5):
+            coalescer.add(f'report {i}')
+            await coalescer.flush()
+
+    asyncio.run(test())
+
+    assert sent == [ 'report 0\n', 'report 1\n' ]
+    assert coalescer.stats['logged'] == 3
+
+    # Distinct reports past `max_pending` are dropped
+    for i in range(5):
+        coalescer.add(f'more {i}')
+
+    assert coalescer.stats['dropped'] == 2
@@ -0,0 +1,54 @@
+import time
+import asyncio
+
+from core.scheduler import Scheduler
+
+
+def test_pops_in_due_order():
+    scheduler = Scheduler()
+    for key, due_at in [ ( 'c', 30 ), ( 'a', 10 ), ( 'b', 20 ), ( 'd', 40 ) ]:
+        scheduler.add(key, due_at)
+
+    assert scheduler.next_due() == 10
+    assert scheduler.pop_due(now=5)  == []
+    assert scheduler.pop_due(now=25) == [ 'a', 'b' ]
+    assert len(scheduler) == 2
+    assert 'c' in scheduler and 'a' not in scheduler
+
+
+def test_reschedule():
+    scheduler = Scheduler()
+    scheduler.add('a', 10)
+    scheduler.add('b', 20)
+    scheduler.add('a', 30)
+
+    assert len(scheduler) == 2
+    assert scheduler.next_due() == 20
+    assert scheduler.pop_due(now=100) == [ 'b', 'a' ]
+    assert scheduler.next_due() is None
+
+
+def test_replaced_entries_dont_pile_up():
+    scheduler = Scheduler()
+    for due_at in range(10000):
+        scheduler.add('a', due_at)
+
+    assert len(scheduler) == 1
+    assert len(scheduler._Scheduler__heap) < 100
+    assert scheduler.pop_due(now=10000) == [ 'a' ]
+
+
+def test_wakes_for_sooner_entry():
+    async def test():
+        scheduler = Scheduler()
+        scheduler.add('later', time.time() + 60)
+
+        waiter = asyncio.create_task(scheduler.wait_due())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+
+        scheduler.add('now', time.time())
+        assert await asyncio.wait_for(waiter, 1) == [ 'now' ]
+        assert 'later' in scheduler
+
+    asyncio.run(test())